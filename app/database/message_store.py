@@ -0,0 +1,113 @@
+"""
+message_store.py — content-addressed storage for analyzed message text.
+
+Message bodies live once in `message_bodies`, keyed by the sha256 of their
+UTF-8 text and zlib-compressed when that saves space. `AnalyzedMessage` rows
+reference them through `message_hash`, so a campaign text checked by a
+thousand users is stored a single time.
+
+Explanations are stored as a template id; the text is re-rendered on read by
+explanation_engine from the scores and rules already kept on the row.
+"""
+import hashlib
+import zlib
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.database.models import AnalyzedMessage, MessageBody
+from app.services import explanation_engine
+from app.utils.helpers import deserialize_list
+
+_COMPRESS_LEVEL = 6
+
+
+def content_hash(text: str) -> str:
+    """sha256 hex digest used as the message_bodies primary key."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def encode_body(text: str) -> tuple:
+    """Return (payload, compressed) for a message text."""
+    raw = text.encode("utf-8")
+    packed = zlib.compress(raw, _COMPRESS_LEVEL)
+    if len(packed) < len(raw):
+        return packed, True
+    return raw, False
+
+
+def decode_body(payload: bytes, compressed: bool) -> str:
+    return (zlib.decompress(payload) if compressed else payload).decode("utf-8")
+
+
+def _insert_ignore(db: Session, values: dict) -> None:
+    """INSERT the body unless a row with the same hash already exists."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        if db.get(MessageBody, values["content_hash"]) is None:
+            db.execute(insert(MessageBody).values(**values))
+        return
+    db.execute(
+        dialect_insert(MessageBody)
+        .values(**values)
+        .on_conflict_do_nothing(index_elements=["content_hash"])
+    )
+
+
+def store_message(db: Session, text: str) -> str:
+    """Store `text` once (no-op if already present) and return its hash."""
+    digest = content_hash(text)
+    payload, compressed = encode_body(text)
+    _insert_ignore(db, {
+        "content_hash": digest,
+        "body": payload,
+        "compressed": compressed,
+        "length": len(text),
+    })
+    return digest
+
+
+def load_message(record: AnalyzedMessage) -> str:
+    """Return the full message text of an analysis, legacy rows included."""
+    if record.message_hash and record.body is not None:
+        return decode_body(record.body.body, record.body.compressed)
+    return record.message or ""
+
+
+def load_explanation(record: AnalyzedMessage) -> str:
+    """Return the explanation text of an analysis, legacy rows included."""
+    if record.explanation_template:
+        return explanation_engine.render_explanation(
+            record.explanation_template,
+            deserialize_list(record.matched_rules),
+            record.final_score,
+            record.ai_score,
+        )
+    return record.explanation or ""
+
+
+def migrate_legacy_messages(db: Session, batch_size: int = 500) -> int:
+    """
+    Move inline `message` text of pre-existing rows into message_bodies.
+    Runs in batches and is safe to call on every startup. Returns rows moved.
+    """
+    moved = 0
+    while True:
+        rows = (
+            db.query(AnalyzedMessage)
+            .filter(AnalyzedMessage.message_hash.is_(None))
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        for r in rows:
+            r.message_hash = store_message(db, r.message or "")
+            r.message = ""
+        db.commit()
+        moved += len(rows)
+    return moved
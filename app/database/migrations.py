@@ -0,0 +1,42 @@
+"""
+migrations.py — minimal additive schema upgrades.
+
+`Base.metadata.create_all` creates missing tables but never touches existing
+ones, so databases created by an older release would lack newly added
+columns and indexes. `upgrade_schema` adds any model column missing from its
+table (always as a nullable column) and creates any missing index, so existing
+deployments keep working without a migration tool.
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from app.database.db import Base
+
+
+def upgrade_schema(engine: Engine) -> list:
+    """Add missing columns and indexes to existing tables. Returns what was added."""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            present = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(
+                    f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'
+                ))
+                added.append(f"{table.name}.{column.name}")
+
+            present_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in present_indexes:
+                    index.create(bind=conn)
+                    added.append(index.name)
+
+    return added
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, LargeBinary, Boolean, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database.db import Base
@@ -17,12 +17,31 @@ class User(Base):
     analyses = relationship("AnalyzedMessage", back_populates="user", cascade="all, delete-orphan")
 
 
+class MessageBody(Base):
+    """Content-addressed message text, stored once per distinct body."""
+    __tablename__ = "message_bodies"
+
+    content_hash = Column(String(64), primary_key=True)   # sha256 hex of the UTF-8 text
+    body = Column(LargeBinary, nullable=False)
+    compressed = Column(Boolean, default=True)             # zlib when it actually saves space
+    length = Column(Integer, default=0)                    # character count of the original text
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 class AnalyzedMessage(Base):
     __tablename__ = "analyzed_messages"
+    __table_args__ = (
+        # /api/history and its filters: one user's rows, newest first
+        Index("ix_analyzed_messages_user_created", "user_id", "created_at"),
+        Index("ix_analyzed_messages_user_risk_created", "user_id", "risk_level", "created_at"),
+        Index("ix_analyzed_messages_user_scam_created", "user_id", "scam_type", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    message = Column(Text, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    # Legacy inline text; new rows leave this empty and reference message_bodies instead
+    message = Column(Text, nullable=False, default="")
+    message_hash = Column(String(64), ForeignKey("message_bodies.content_hash"), index=True)
     rule_score = Column(Float, default=0.0)
     ai_score = Column(Float, default=0.0)
     final_score = Column(Float, default=0.0)
@@ -30,7 +49,66 @@ class AnalyzedMessage(Base):
     scam_type = Column(String(100), default="Unknown")
     matched_rules = Column(Text, default="[]")
     suspicious_phrases = Column(Text, default="[]")
+    # Legacy rendered text; new rows store a template id and re-render on read
     explanation = Column(Text, default="")
+    explanation_template = Column(String(40))
+    # msgpack of what has no column: contributing words, campaign, tier (see result_blob)
+    result_blob = Column(LargeBinary)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="analyses")
+    body = relationship("MessageBody", lazy="select")
+
+
+class RuleHit(Base):
+    """One matched rule of one analysis: matched_rules, normalized for filtering."""
+    __tablename__ = "rule_hits"
+    __table_args__ = (
+        Index("ix_rule_hits_rule_created", "rule_id", "created_at"),
+        Index("ix_rule_hits_user_rule_created", "user_id", "rule_id", "created_at"),
+    )
+
+    analysis_id = Column(Integer, ForeignKey("analyzed_messages.id"), primary_key=True)
+    rule_id = Column(Integer, primary_key=True)          # rule_engine RULE_IDS
+    # Copied from the analysis so filtered history reads this table's indexes alone
+    user_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime)
+
+
+class Feedback(Base):
+    """A user's verdict on one of their analyses: training data for model_updates."""
+    __tablename__ = "feedback"
+    __table_args__ = (
+        UniqueConstraint("user_id", "analysis_id", name="uq_feedback_user_analysis"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    analysis_id = Column(Integer, nullable=False)         # may live on another shard
+    # Copied: the training example must not depend on the analysis or its shard
+    message = Column(Text, nullable=False)
+    is_scam = Column(Boolean, nullable=False)
+    ai_score = Column(Float)                               # what the model said
+    model_version = Column(String(40))
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ModelUpdate(Base):
+    """One incremental model update attempt; published ones are served by every worker."""
+    __tablename__ = "model_updates"
+    __table_args__ = (
+        Index("ix_model_updates_root_published", "root_version", "published", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    root_version = Column(String(40), nullable=False)      # the MODEL_PATH artifact the chain started from
+    base_version = Column(String(40), nullable=False)      # the model this update was trained from
+    version = Column(String(40))                           # None when validation rejected it
+    feedback_from = Column(Integer, nullable=False)        # feedback ids (from, to]
+    feedback_to = Column(Integer, nullable=False)
+    examples = Column(Integer, default=0)
+    published = Column(Boolean, default=False)
+    artifact = Column(String(500))
+    report = Column(Text, default="{}")                    # JSON: holdout and feedback metrics
+    duration_ms = Column(Float)
+    created_at = Column(DateTime, default=datetime.utcnow)
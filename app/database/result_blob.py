@@ -0,0 +1,74 @@
+"""
+result_blob.py — compact, versioned encoding of the parts of an analysis
+result that have no column of their own.
+
+Scores, rules, phrases and the explanation template already live on the
+AnalyzedMessage row; the message text lives in message_bodies. The
+visualization block is derived from those plus the contributing words:
+
+    risk_meter        final_score, risk_level
+    highlighted_text  ml_model._build_highlighted_text(message, words)
+
+so the blob only has to carry the words and their impacts, the campaign id,
+the degradation tier and the model version that produced the verdict:
+
+    msgpack [BLOB_VERSION, model_version, campaign_id, degradation,
+             [word, ...], impacts]
+
+impacts is a packed little-endian float32 array (4 bytes per word instead
+of a msgpack float64 each); impacts are rounded to 4 decimals at the source,
+which float32 represents exactly enough to restore by rounding again.
+
+Every format version keeps its decoder, so rows written by an older release
+(or under an older model) stay readable. Rows stored before blobs existed
+have no blob and decode to an empty explanation block.
+"""
+from typing import Dict, Optional
+
+import msgpack
+import numpy as np
+
+BLOB_VERSION = 1
+
+_IMPACTS = np.dtype("<f4")
+
+
+def encode_result(result: Dict, model_version: str) -> bytes:
+    """Blob for an analysis_pipeline.analyze() result."""
+    words = result["ml"].get("contributing_words", [])
+    impacts = np.asarray([w["impact"] for w in words], dtype=_IMPACTS)
+    return msgpack.packb([
+        BLOB_VERSION,
+        model_version,
+        result["campaign_id"],
+        result["degradation"],
+        [w["word"] for w in words],
+        impacts.tobytes(),
+    ], use_bin_type=True)
+
+
+def _decode_v1(fields: list) -> Dict:
+    _, model_version, campaign_id, degradation, words, impacts = fields
+    values = np.frombuffer(impacts, dtype=_IMPACTS)
+    return {
+        "model_version": model_version,
+        "campaign_id": campaign_id,
+        "degradation": degradation,
+        "contributing_words": [
+            {"word": word, "impact": round(float(impact), 4)} for word, impact in zip(words, values)
+        ],
+    }
+
+
+_DECODERS = {1: _decode_v1}
+
+
+def decode_result(blob: Optional[bytes]) -> Dict:
+    """Stored result fields; rows without a blob get empty defaults."""
+    if not blob:
+        return {"model_version": None, "campaign_id": None, "degradation": "none", "contributing_words": []}
+    fields = msgpack.unpackb(blob, raw=False)
+    decoder = _DECODERS.get(fields[0])
+    if decoder is None:
+        raise ValueError(f"Unsupported result blob version {fields[0]}")
+    return decoder(fields)
@@ -0,0 +1,95 @@
+"""
+rule_hits.py — matched rules as indexed rows, for filtered history.
+
+Each analysis keeps matched_rules as a JSON list of rule names, which cannot
+be filtered without decoding every row. `rule_hits` holds one row per
+(analysis, matched rule) with the rule's stable id (rule_engine.RULE_IDS),
+the user and the creation time, indexed by (rule_id, created_at) and
+(user_id, rule_id, created_at): "my messages that hit Banking / UPI
+Impersonation, newest first" is a range scan of the second index.
+
+Rows are written on the insert path (analysis_pipeline.save), in the same
+transaction as the analysis. Analyses stored before the table existed are
+filled in by backfill() from a startup thread, in id order and in batches;
+each batch is claimed under the database write lock, so concurrent workers
+never repeat one. Rule names no longer in RULE_IDS are skipped.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import insert, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.database.models import AnalyzedMessage, RuleHit
+from app.services.rule_engine import RULE_IDS
+from app.utils.helpers import deserialize_list
+
+_META = "rule_hits_meta"
+_BACKFILL_BATCH = 1000
+
+
+def create(engine: Engine) -> None:
+    """Note where the backfill stops: the last analysis when the table was created."""
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {_META} (key TEXT PRIMARY KEY, value INTEGER NOT NULL)"))
+        # First writer wins across workers ("WHERE true" lets SQLite parse the upsert)
+        conn.execute(text(
+            f"INSERT INTO {_META} (key, value) "
+            f"SELECT 'backfill_until', COALESCE(MAX(id), 0) FROM analyzed_messages WHERE true "
+            f"ON CONFLICT (key) DO NOTHING"
+        ))
+        conn.execute(text(
+            f"INSERT INTO {_META} (key, value) VALUES ('backfilled_to', 0) ON CONFLICT (key) DO NOTHING"
+        ))
+
+
+def _hit_rows(analysis_id: int, user_id: int, created_at: Optional[datetime],
+              matched_rules: Iterable[str]) -> List[Dict]:
+    return [
+        {"analysis_id": analysis_id, "rule_id": RULE_IDS[name], "user_id": user_id, "created_at": created_at}
+        for name in dict.fromkeys(matched_rules)
+        if name in RULE_IDS
+    ]
+
+
+def record(db: Session, analysis_id: int, user_id: int, created_at: datetime, matched_rules: List[str]) -> None:
+    """Store the rule hits of one analysis; part of the caller's transaction."""
+    rows = _hit_rows(analysis_id, user_id, created_at, matched_rules)
+    if rows:
+        db.execute(insert(RuleHit), rows)
+
+
+def backfill(db: Session, batch_size: int = _BACKFILL_BATCH) -> int:
+    """Add hits for analyses stored before rule_hits existed. Returns analyses read."""
+    done = 0
+    while True:
+        # A no-op UPDATE takes the write lock first, so the batch is this worker's alone
+        low = db.execute(text(
+            f"UPDATE {_META} SET value = value WHERE key = 'backfilled_to' "
+            f"AND value < (SELECT value FROM {_META} WHERE key = 'backfill_until') RETURNING value"
+        )).scalar()
+        if low is None:
+            db.commit()
+            return done
+        until = db.execute(text(f"SELECT value FROM {_META} WHERE key = 'backfill_until'")).scalar()
+        analyses = db.execute(
+            select(AnalyzedMessage.id, AnalyzedMessage.user_id, AnalyzedMessage.created_at,
+                   AnalyzedMessage.matched_rules)
+            .where(AnalyzedMessage.id > low, AnalyzedMessage.id <= until)
+            .order_by(AnalyzedMessage.id)
+            .limit(batch_size)
+        ).all()
+        rows = [
+            hit
+            for id_, user_id, created_at, matched_rules in analyses
+            for hit in _hit_rows(id_, user_id, created_at, deserialize_list(matched_rules))
+        ]
+        if rows:
+            db.execute(insert(RuleHit), rows)
+        db.execute(
+            text(f"UPDATE {_META} SET value = :high WHERE key = 'backfilled_to'"),
+            {"high": analyses[-1].id if analyses else until},
+        )
+        db.commit()
+        done += len(analyses)
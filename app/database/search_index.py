@@ -0,0 +1,395 @@
+"""
+search_index.py — full-text search over analyzed messages (SQLite FTS5).
+
+Message text is stored compressed and content-addressed (message_store), so
+the index is a *contentless* FTS5 table: it holds only the inverted index,
+never a second copy of the text. One row per analysis, with rowid =
+analyzed_messages.id and two columns:
+
+    owner   "u<user_id>" — lets a per-user search intersect posting lists
+            inside FTS5 instead of filtering millions of matches afterwards
+    body    the message text
+
+Rows are written on the insert path (analysis_pipeline.save), in the same
+transaction as the analysis itself; triggers cannot be used because the body
+is zlib-compressed. Analyses that existed before the index was created are
+indexed by backfill() from a startup thread, in batches, up to the highest id
+present when the index was created.
+
+Queries are built from the user's input, never passed through verbatim:
+each whitespace-separated chunk (or "quoted phrase") becomes an FTS5 phrase
+of its tokens, so `sbi-kyc-update.xyz` and `fraud@ybl` match as adjacent
+tokens, and a trailing `*` makes it a prefix query. Snippets are rendered
+here from the decoded bodies of the returned page only, with the text
+HTML-escaped before <mark> tags are added.
+
+With DB_SHARDS > 1 (shards.py) every shard indexes its own rows and
+search_shards() merges the shards' pages for admin-wide queries.
+
+Only available on SQLite builds with FTS5; elsewhere search reports itself
+unavailable and the insert path skips indexing.
+"""
+import base64
+import heapq
+import html
+import itertools
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.database import shards
+from app.database.message_store import decode_body
+
+logger = logging.getLogger(__name__)
+
+_TABLE = "message_search"
+_META = "message_search_meta"
+_BACKFILL_BATCH = 1000
+_MAX_TERMS = 16
+SNIPPET_TOKENS = 24
+
+SORTS = ("rank", "recent")
+
+# unicode61 token characters: letters and digits, underscore is a separator
+_TOKEN_RE = re.compile(r"[^\W_]+")
+_CHUNK_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+_available: Dict[str, bool] = {}
+
+
+class SearchQueryError(ValueError):
+    """The query has no searchable terms, or the cursor is malformed."""
+
+
+# ─── Schema ───────────────────────────────────────────────────────────────────
+
+def create(engine: Engine) -> bool:
+    """Create the FTS5 index if missing. Returns whether search is available."""
+    if engine.dialect.name != "sqlite":
+        return False
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {_TABLE} "
+                f"USING fts5(owner, body, content='', tokenize='unicode61')"
+            ))
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {_META} (key TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            ))
+            # Everything up to the current last id is the backfill's job; newer
+            # rows are indexed on insert. First writer wins across workers.
+            conn.execute(text(
+                f"INSERT OR IGNORE INTO {_META} (key, value) "
+                f"SELECT 'backfill_until', COALESCE(MAX(id), 0) FROM analyzed_messages"
+            ))
+            conn.execute(text(
+                f"INSERT OR IGNORE INTO {_META} (key, value) VALUES ('backfilled_to', 0)"
+            ))
+    except OperationalError:
+        logger.warning("SQLite FTS5 unavailable; full-text search disabled")
+        return False
+    _available.clear()
+    return True
+
+
+def available(db: Session) -> bool:
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _available:
+        _available[key] = bind.dialect.name == "sqlite" and db.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": _TABLE}
+        ).first() is not None
+    return _available[key]
+
+
+# ─── Writes ───────────────────────────────────────────────────────────────────
+
+def _insert(db: Session, rows: List[Dict]) -> None:
+    db.execute(
+        text(f"INSERT INTO {_TABLE} (rowid, owner, body) VALUES (:id, :owner, :body)"),
+        rows,
+    )
+
+
+def index_message(db: Session, analysis_id: int, user_id: int, message: str) -> None:
+    """Index one analysis; part of the caller's transaction."""
+    if available(db):
+        _insert(db, [{"id": analysis_id, "owner": f"u{user_id}", "body": message}])
+
+
+def index_messages(db: Session, entries: List[Tuple[int, int, str]]) -> None:
+    """Index (analysis_id, user_id, message) entries; part of the caller's transaction."""
+    if entries and available(db):
+        _insert(db, [{"id": id_, "owner": f"u{user_id}", "body": message} for id_, user_id, message in entries])
+
+
+def remove_messages(db: Session, entries: List[Tuple[int, int, str]]) -> None:
+    """
+    Drop indexed (analysis_id, user_id, message) entries. A contentless index
+    can only delete what it is told was indexed, so the values must be exactly
+    those indexed, and the rows must have been indexed (backfill complete).
+    """
+    if entries and available(db):
+        db.execute(
+            text(f"INSERT INTO {_TABLE} ({_TABLE}, rowid, owner, body) VALUES ('delete', :id, :owner, :body)"),
+            [{"id": id_, "owner": f"u{user_id}", "body": message} for id_, user_id, message in entries],
+        )
+
+
+def backfill(db: Session, batch_size: int = _BACKFILL_BATCH) -> int:
+    """
+    Index analyses created before the index existed. Each batch takes the
+    write lock (a no-op UPDATE) before reading `backfilled_to` and advances it
+    in the same transaction, so concurrent workers never index the same rows
+    twice. Returns rows indexed.
+    """
+    if not available(db):
+        return 0
+    indexed = 0
+    while True:
+        low = db.execute(text(
+            f"UPDATE {_META} SET value = value WHERE key = 'backfilled_to' "
+            f"AND value < (SELECT value FROM {_META} WHERE key = 'backfill_until') RETURNING value"
+        )).scalar()
+        if low is None:
+            db.commit()
+            return indexed
+        until = db.execute(text(f"SELECT value FROM {_META} WHERE key = 'backfill_until'")).scalar()
+        high = min(low + batch_size, until)
+        rows = db.execute(text(
+            "SELECT a.id, a.user_id, a.message, b.body, b.compressed "
+            "FROM analyzed_messages a "
+            "LEFT JOIN message_bodies b ON b.content_hash = a.message_hash "
+            "WHERE a.id > :low AND a.id <= :high"
+        ), {"low": low, "high": high}).all()
+        if rows:
+            _insert(db, [
+                {"id": id_, "owner": f"u{user_id}",
+                 "body": decode_body(body, compressed) if body is not None else (legacy or "")}
+                for id_, user_id, legacy, body, compressed in rows
+            ])
+        db.execute(text(f"UPDATE {_META} SET value = :high WHERE key = 'backfilled_to'"), {"high": high})
+        db.commit()
+        indexed += len(rows)
+
+
+# ─── Queries ──────────────────────────────────────────────────────────────────
+
+def parse_query(q: str) -> List[Tuple[Tuple[str, ...], bool]]:
+    """User input → [(tokens of one phrase, is_prefix)]."""
+    terms = []
+    for match in _CHUNK_RE.finditer(q):
+        quoted, bare = match.groups()
+        chunk = quoted if quoted is not None else bare
+        tokens = tuple(t.lower() for t in _TOKEN_RE.findall(chunk))
+        if tokens:
+            terms.append((tokens, bare is not None and bare.endswith("*")))
+    if not terms:
+        raise SearchQueryError("Search query has no searchable terms.")
+    return terms[:_MAX_TERMS]
+
+
+def _match_expression(terms, user_id: Optional[int]) -> str:
+    phrases = [f'body : "{" ".join(tokens)}"' + (" *" if prefix else "") for tokens, prefix in terms]
+    if user_id is not None:
+        phrases.insert(0, f"owner : u{int(user_id)}")
+    return " AND ".join(phrases)
+
+
+def encode_cursor(score: float, analysis_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{score!r}:{analysis_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        score, analysis_id = raw.split(":")
+        return float(score), int(analysis_id)
+    except ValueError:
+        raise SearchQueryError("Malformed search cursor.")
+
+
+def snippet(message: str, terms, width: int = SNIPPET_TOKENS) -> str:
+    """Escaped excerpt of `message` around the densest run of hits, hits in <mark>."""
+    words = {t for tokens, _ in terms for t in tokens}
+    prefixes = tuple(tokens[-1] for tokens, prefix in terms if prefix)
+    spans = [(m.start(), m.end(), m.group(0).lower()) for m in _TOKEN_RE.finditer(message)]
+    hits = [t in words or bool(prefixes and t.startswith(prefixes)) for _, _, t in spans]
+    if not spans:
+        return html.escape(message[:200])
+
+    start = 0
+    if len(spans) > width:
+        best = window = sum(hits[:width])
+        for i in range(1, len(spans) - width + 1):
+            window += hits[i + width - 1] - hits[i - 1]
+            if window > best:
+                best, start = window, i
+    chosen = range(start, min(len(spans), start + width))
+
+    lo = spans[start][0] if start else 0
+    hi = spans[chosen[-1]][1] if chosen[-1] < len(spans) - 1 else len(message)
+    parts, pos = [], lo
+    for i in chosen:
+        s, e, _ = spans[i]
+        if hits[i]:
+            parts.append(html.escape(message[pos:s]))
+            parts.append(f"<mark>{html.escape(message[s:e])}</mark>")
+            pos = e
+    parts.append(html.escape(message[pos:hi]))
+    return ("..." if lo else "") + "".join(parts) + ("..." if hi < len(message) else "")
+
+
+def _ranked(db: Session, terms, user_id: Optional[int], limit: int, after, sort: str) -> list:
+    """Up to `limit` (id, score) rows past the keyset position `after` (score, id)."""
+    params = {"match": _match_expression(terms, user_id), "limit": limit}
+    # bm25 weights: owner 0 (a filter, not relevance), body 1; lower is better
+    inner = f"SELECT rowid AS id, bm25({_TABLE}, 0.0, 1.0) AS score FROM {_TABLE} WHERE {_TABLE} MATCH :match"
+    if sort == "recent":
+        where, order = "", "ORDER BY rowid DESC"
+        if after:
+            where = "AND rowid < :after_id"
+            params["after_id"] = after[1]
+        sql = f"{inner} {where} {order} LIMIT :limit"
+    else:
+        where = ""
+        if after:
+            params["after_score"], params["after_id"] = after
+            where = "WHERE score > :after_score OR (score = :after_score AND id > :after_id)"
+        sql = f"SELECT id, score FROM ({inner}) {where} ORDER BY score, id LIMIT :limit"
+    return db.execute(text(sql), params).all()
+
+
+def _hits(db: Session, ranked: list, terms) -> List[Dict]:
+    """Search hits for `ranked` rows, in order, with their unrounded bm25 score as rank."""
+    if not ranked:
+        return []
+    scores = {row.id: row.score for row in ranked}
+    details = db.execute(
+        text(
+            "SELECT a.id, a.user_id, a.risk_level, a.final_score, a.scam_type, a.created_at, "
+            "a.message, b.body, b.compressed "
+            "FROM analyzed_messages a "
+            "LEFT JOIN message_bodies b ON b.content_hash = a.message_hash "
+            f"WHERE a.id IN ({', '.join(str(int(i)) for i in scores)})"
+        )
+    ).mappings().all()
+    by_id = {row["id"]: row for row in details}
+
+    hits = []
+    for analysis_id in scores:
+        row = by_id.get(analysis_id)
+        if row is None:          # analysis deleted since it was indexed
+            continue
+        message = decode_body(row["body"], row["compressed"]) if row["body"] is not None else row["message"]
+        hits.append({
+            "id": analysis_id,
+            "user_id": row["user_id"],
+            "snippet": snippet(message or "", terms),
+            "rank": scores[analysis_id],
+            "risk_level": row["risk_level"],
+            "final_score": row["final_score"],
+            "scam_type": row["scam_type"],
+            "created_at": row["created_at"],
+        })
+    return hits
+
+
+def search(
+    db: Session,
+    q: str,
+    user_id: Optional[int] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    sort: str = "rank",
+) -> Tuple[List[Dict], Optional[str]]:
+    """
+    One page of matches for `q` (restricted to `user_id` unless None), best
+    bm25 rank first or newest first. Returns (hits, next_cursor).
+    """
+    terms = parse_query(q)
+    ranked = _ranked(db, terms, user_id, limit + 1, decode_cursor(cursor) if cursor else None, sort)
+
+    next_cursor = None
+    if len(ranked) > limit:
+        ranked = ranked[:limit]
+        next_cursor = encode_cursor(ranked[-1].score, ranked[-1].id)
+    hits = _hits(db, ranked, terms)
+    for hit in hits:
+        hit["rank"] = round(hit["rank"], 6)
+    return hits, next_cursor
+
+
+def _encode_positions(positions: List[Optional[int]]) -> str:
+    raw = "ids:" + ",".join("" if p is None else str(p) for p in positions)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_positions(cursor: str, count: int) -> List[Optional[int]]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        if not raw.startswith("ids:"):
+            raise ValueError(raw)
+        positions = [int(p) if p else None for p in raw[4:].split(",")]
+    except ValueError:
+        raise SearchQueryError("Malformed search cursor.")
+    if len(positions) != count:
+        raise SearchQueryError("Malformed search cursor.")
+    return positions
+
+
+def search_shards(
+    q: str,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    sort: str = "rank",
+) -> Tuple[List[Dict], Optional[str]]:
+    """
+    search() across every user on every shard: each shard's next page is
+    read in parallel and the pages are merged. A rank cursor is the usual
+    (score, id) position, valid on every shard (bm25 statistics are per
+    shard, so ranks are comparable rather than identical to one database).
+    Ids only order rows within a shard, so recent merges by created_at and
+    its cursor keeps each shard's last id.
+    """
+    terms = parse_query(q)
+    recent = sort == "recent"
+    if recent:
+        positions = _decode_positions(cursor, shards.SHARDS) if cursor else [None] * shards.SHARDS
+    else:
+        after = decode_cursor(cursor) if cursor else None
+
+    def page(shard: int, db: Session) -> List[Dict]:
+        position = (None if positions[shard] is None else (0.0, positions[shard])) if recent else after
+        hits = _hits(db, _ranked(db, terms, None, limit + 1, position, sort), terms)
+        for hit in hits:
+            hit["shard"] = shard
+        return hits
+
+    pages = shards.fan_out(page)
+    # heapq.merge only ever takes from the head of a page, so each shard's
+    # cursor can advance to the last of its hits that made it into this page
+    if recent:
+        merged = heapq.merge(*pages, key=lambda h: (h["created_at"], h["id"]), reverse=True)
+    else:
+        merged = heapq.merge(*pages, key=lambda h: (h["rank"], h["id"]))
+    hits = list(itertools.islice(merged, limit + 1))
+
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        if recent:
+            for hit in hits:
+                positions[hit["shard"]] = hit["id"]
+            next_cursor = _encode_positions(positions)
+        else:
+            next_cursor = encode_cursor(hits[-1]["rank"], hits[-1]["id"])
+    for hit in hits:
+        del hit["shard"]
+        hit["rank"] = round(hit["rank"], 6)
+    return hits, next_cursor
@@ -0,0 +1,173 @@
+"""
+shards.py — optional sharding of analysis storage by user.
+
+Every analysis goes into the one DATABASE_URL file, so all writers in all
+workers queue on a single SQLite lock. With DB_SHARDS=N (N > 1) the
+per-user tables — analyzed_messages, the message_bodies they reference,
+rule_hits and the message_search index — are split over N database files,
+each user living in shard crc32(user_id) % N:
+
+    shard 0       DATABASE_URL itself (also keeps users and every other table)
+    shard k > 0   DB_SHARD_URL_TEMPLATE with {shard} = k; by default the main
+                  SQLite file with ".shard<k>" before its extension
+
+Analysis ids stay unique across shards: shard k allocates from its own
+range (k·ID_SPAN, (k+1)·ID_SPAN] through a counter in shard_meta that never
+moves backwards. Ids that existed before sharding are shard 0's range, and
+rows keep their id when reshard.py moves them to another shard.
+
+Per-user reads and writes (analyze, history, stats, search) touch only the
+caller's shard; admin-wide reads use fan_out() to query every shard in
+parallel and merge the results. With DB_SHARDS unset or 1 everything
+resolves to the main engine and the insert path is unchanged.
+"""
+import os
+import re
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, TypeVar
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.database.db import Base, DATABASE_URL, SessionLocal, engine as main_engine
+
+# ─── Constants ─────────────────────────────────────────────────────────────────
+SHARDS = max(1, int(os.getenv("DB_SHARDS", "1")))
+ENABLED = SHARDS > 1
+URL_TEMPLATE = os.getenv("DB_SHARD_URL_TEMPLATE", "")
+ID_SPAN = 2 ** 40          # ids per shard; k·2^40 stays below 2^53 (exact in JSON clients) for k < 8192
+
+_META = "shard_meta"
+_RANGE_MAX = "SELECT COALESCE(MAX(id), :low) FROM analyzed_messages WHERE id > :low AND id <= :high"
+_SQLITE_PATH_RE = re.compile(r"^(sqlite[^:]*:///)(.+?)(\.[^./]*)?$")
+
+T = TypeVar("T")
+
+_lock = threading.Lock()
+_sessionmakers: Dict[int, sessionmaker] = {0: SessionLocal}
+_engines: Dict[int, Engine] = {0: main_engine}
+_pool = None
+
+
+# ─── Routing ───────────────────────────────────────────────────────────────────
+
+def shard_of(user_id: int, shards: int = SHARDS) -> int:
+    """Shard holding `user_id`'s analyses (stable across processes and restarts)."""
+    return zlib.crc32(str(int(user_id)).encode()) % shards
+
+
+def shard_url(shard: int) -> str:
+    if shard == 0:
+        return DATABASE_URL
+    if URL_TEMPLATE:
+        return URL_TEMPLATE.format(shard=shard)
+    match = _SQLITE_PATH_RE.match(DATABASE_URL)
+    if match is None or match.group(2) == ":memory:":
+        raise RuntimeError("DB_SHARDS > 1 needs a file-based SQLite DATABASE_URL or DB_SHARD_URL_TEMPLATE.")
+    prefix, path, extension = match.groups()
+    return f"{prefix}{path}.shard{shard}{extension or ''}"
+
+
+def engine(shard: int) -> Engine:
+    with _lock:
+        if shard not in _engines:
+            url = shard_url(shard)
+            _engines[shard] = create_engine(
+                url,
+                connect_args={"check_same_thread": False} if "sqlite" in url else {},
+            )
+        return _engines[shard]
+
+
+def session(shard: int) -> Session:
+    """A new session on `shard`; the caller closes it."""
+    maker = _sessionmakers.get(shard)
+    if maker is None:
+        bind = engine(shard)
+        with _lock:
+            maker = _sessionmakers.setdefault(
+                shard, sessionmaker(autocommit=False, autoflush=False, bind=bind)
+            )
+    return maker()
+
+
+def session_for(user_id: int) -> Session:
+    return session(shard_of(user_id))
+
+
+def fan_out(fn: Callable[[int, Session], T]) -> List[T]:
+    """fn(shard, session) on every shard in parallel; results in shard order."""
+    def run(shard: int) -> T:
+        db = session(shard)
+        try:
+            return fn(shard, db)
+        finally:
+            db.close()
+
+    if not ENABLED:
+        return [run(0)]
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=SHARDS, thread_name_prefix="shard")
+    return list(_pool.map(run, range(SHARDS)))
+
+
+# ─── Schema and ids ────────────────────────────────────────────────────────────
+
+def prepare(shard: int) -> None:
+    """
+    Create or upgrade one shard: its share of the tables and search index
+    (shard 0 already has them, being the main database) and its id counter.
+    """
+    from app.database import rule_hits, search_index
+    from app.database.migrations import upgrade_schema
+    from app.database.models import AnalyzedMessage, MessageBody, RuleHit
+
+    bind = engine(shard)
+    if shard:
+        tables = [MessageBody.__table__, AnalyzedMessage.__table__, RuleHit.__table__]
+        try:
+            Base.metadata.create_all(bind=bind, tables=tables)
+        except OperationalError:
+            # Another worker created a table between the check and CREATE; recheck
+            Base.metadata.create_all(bind=bind, tables=tables)
+        upgrade_schema(bind)
+        rule_hits.create(bind)
+        search_index.create(bind)
+    low = shard * ID_SPAN
+    with bind.begin() as conn:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {_META} (key TEXT PRIMARY KEY, value INTEGER NOT NULL)"))
+        conn.execute(text(f"INSERT OR IGNORE INTO {_META} (key, value) VALUES ('next_id', :low)"), {"low": low})
+        conn.execute(
+            text(f"UPDATE {_META} SET value = MAX(value, ({_RANGE_MAX})) WHERE key = 'next_id'"),
+            {"low": low, "high": low + ID_SPAN},
+        )
+
+
+def highest_id(db: Session, id_range: int) -> int:
+    """Highest id from shard `id_range`'s range stored in `db` (the range floor if none)."""
+    low = id_range * ID_SPAN
+    return db.execute(text(_RANGE_MAX), {"low": low, "high": low + ID_SPAN}).scalar()
+
+
+def raise_counter(db: Session, floor: int) -> None:
+    """Make `db`'s shard allocate above `floor` from now on."""
+    db.execute(text(f"UPDATE {_META} SET value = MAX(value, :floor) WHERE key = 'next_id'"), {"floor": floor})
+
+
+def allocate_id(db: Session, shard: int) -> int:
+    """
+    Next analysis id in `shard`'s range, as part of the caller's transaction
+    (whose write lock it takes). The counter also steps over any higher id
+    already in the range, e.g. rows inserted while sharding was off.
+    """
+    low = shard * ID_SPAN
+    return db.execute(
+        text(f"UPDATE {_META} SET value = MAX(value, ({_RANGE_MAX})) + 1 WHERE key = 'next_id' RETURNING value"),
+        {"low": low, "high": low + ID_SPAN},
+    ).scalar()
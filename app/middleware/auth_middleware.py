@@ -7,6 +7,7 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 
+from app.database import shards
 from app.database.db import get_db
 from app.database.models import User
 from dotenv import load_dotenv
@@ -27,26 +28,54 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
-    db: Session = Depends(get_db),
-) -> User:
-    """Decode JWT and return the authenticated User or raise 401."""
-    token = credentials.credentials
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Invalid or expired token. Please log in again.",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def user_from_token(token: str, db: Session) -> Optional[User]:
+    """Return the User a JWT belongs to, or None if it is invalid or expired."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: Optional[int] = payload.get("sub")
         if user_id is None:
-            raise credentials_exception
+            return None
     except JWTError:
-        raise credentials_exception
+        return None
+    return db.query(User).filter(User.id == int(user_id)).first()
 
-    user = db.query(User).filter(User.id == int(user_id)).first()
+
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    db: Session = Depends(get_db),
+) -> User:
+    """Decode JWT and return the authenticated User or raise 401."""
+    user = user_from_token(credentials.credentials, db)
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token. Please log in again.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
+
+
+def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+    """Authenticated user with role "admin", or 403."""
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Administrator access required.",
+        )
+    return current_user
+
+
+def get_user_db(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Session on the caller's analysis shard (the request's own session for shard 0)."""
+    shard = shards.shard_of(current_user.id)
+    if shard == 0:
+        yield db
+        return
+    shard_db = shards.session(shard)
+    try:
+        yield shard_db
+    finally:
+        shard_db.close()
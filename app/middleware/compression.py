@@ -0,0 +1,40 @@
+"""
+compression.py — gzip for large responses.
+
+Starlette's GZipMiddleware compresses any response of at least
+GZIP_MIN_SIZE bytes for clients sending Accept-Encoding: gzip (small ones
+are not worth the CPU). This variant also passes through bodies that are
+already gzip files, such as /api/history/export?gzip=true, instead of
+compressing them a second time.
+"""
+import os
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.types import Message, Receive, Scope, Send
+
+# ─── Constants ─────────────────────────────────────────────────────────────────
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))      # 9 costs far more CPU for a few % smaller bodies
+
+_PRECOMPRESSED = ("application/gzip", "application/x-gzip")
+
+
+class _Responder(GZipResponder):
+    async def send_with_gzip(self, message: Message) -> None:
+        await super().send_with_gzip(message)
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            if content_type.startswith(_PRECOMPRESSED):
+                self.content_encoding_set = True    # the pass-through path
+
+
+class CompressionMiddleware(GZipMiddleware):
+    def __init__(self, app, minimum_size: int = GZIP_MIN_SIZE, compresslevel: int = GZIP_LEVEL) -> None:
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("Accept-Encoding", ""):
+            await _Responder(self.app, self.minimum_size, compresslevel=self.compresslevel)(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
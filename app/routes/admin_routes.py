@@ -0,0 +1,75 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+
+from app.database import shards
+from app.database.db import get_db
+
+from app.database.models import User
+from app.middleware.auth_middleware import get_current_admin
+from app.routes.analysis_routes import run_search
+from app.schemas.admin_schemas import ModelUpdateItem, ModelUpdatesReport, ShadowSummary, ScoreDistributionReport
+from app.schemas.analysis_schemas import SearchResponse
+from app.services import model_updates, score_sketches, shadow
+
+router = APIRouter(prefix="/api/admin", tags=["Admin"])
+
+
+@router.get("/shadow", response_model=ShadowSummary)
+def get_shadow_summary(current_admin: User = Depends(get_current_admin)):
+    """Candidate-vs-serving comparison over the shadow-scored sample so far."""
+    return shadow.summary()
+
+
+@router.get("/score-distribution", response_model=ScoreDistributionReport)
+def get_score_distribution(
+    hours: int = Query(24, ge=1, le=score_sketches.RETENTION_HOURS),
+    by_hour: bool = False,
+    current_admin: User = Depends(get_current_admin),
+):
+    """
+    Quantiles of ai/rule/final score per model version, merged across workers,
+    and the share of traffic within ±near_band of each decision boundary.
+    """
+    return score_sketches.report(hours=hours, by_hour=by_hour)
+
+
+@router.get("/model-updates", response_model=ModelUpdatesReport)
+def get_model_updates(
+    limit: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_admin: User = Depends(get_current_admin),
+):
+    """Serving model version, feedback waiting to be applied and recent update attempts."""
+    return model_updates.summary(db, limit)
+
+
+@router.post("/model-updates", response_model=ModelUpdateItem)
+def run_model_update(current_admin: User = Depends(get_current_admin)):
+    """Apply all pending feedback now, however little, instead of waiting for the updater."""
+    record = model_updates.update(min_feedback=1)
+    if record is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="No update attempted: training is off (MODEL_HOLDOUT_PATH unset), "
+                   "another worker is updating, or no feedback arrived since the last attempt.",
+        )
+    return model_updates.summary_item(record)
+
+
+@router.get("/search", response_model=SearchResponse)
+def search_all_history(
+    q: str = Query(..., min_length=1, max_length=500),
+    user_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    sort: str = Query("rank", pattern="^(rank|recent)$"),
+    db: Session = Depends(get_db),
+    current_admin: User = Depends(get_current_admin),
+):
+    """Full-text search across every user's analyses, optionally narrowed to one user."""
+    if user_id is None or not shards.ENABLED:
+        return run_search(db, q, user_id, limit, cursor, sort, all_shards=shards.ENABLED)
+    with shards.session_for(user_id) as shard_db:
+        return run_search(shard_db, q, user_id, limit, cursor, sort)
@@ -1,140 +1,274 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTasks
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
 
 from app.database.db import get_db
-from app.database.models import User, AnalyzedMessage
-from app.middleware.auth_middleware import get_current_user
+from app.database.models import User, AnalyzedMessage, RuleHit
+from app.database.message_store import load_message
+from app.database import search_index, shards
+from app.middleware.auth_middleware import get_current_user, get_user_db
 from app.schemas.analysis_schemas import (
-    AnalyzeRequest, AnalyzeResponse,
-    HistoryItem, VisualizationBlock, RiskMeterViz, WordImpact,
+    AnalyzeRequest, AnalyzeResponse, FeedbackRequest, FeedbackResponse, HistoryItem, SearchResponse,
 )
-from app.services import ml_model, rule_engine, fusion_engine, explanation_engine
-from app.utils.helpers import sanitize_input, serialize_list, deserialize_list
+from app.services import admission, analysis_pipeline, model_updates, shadow, traffic_capture
+from app.services.rule_engine import RULE_IDS
+from app.utils.helpers import sanitize_input, deserialize_list
+from app.utils import etag_cache
+from app.utils.response_encoder import analyze_response, select_fields
+from app.utils.history_export import FORMATS, stream_history
 
 router = APIRouter(prefix="/api", tags=["Analysis"])
 
+# ?compact=true: what bulk and machine clients read
+_COMPACT_ANALYZE = ("risk_level", "final_score", "analysis_id")
+_COMPACT_HISTORY = ("id", "risk_level", "final_score", "created_at")
+_FIELDS_DESCRIPTION = "comma-separated response fields to return (overrides compact)"
 
-def _build_visualization(
-    final_score: float,
-    risk_level: str,
-    contributing_words: list,
-    highlighted_text: str,
-) -> VisualizationBlock:
-    """Build the visualization block from computed analysis results."""
-    color_map = {"HIGH": "red", "MEDIUM": "orange", "LOW": "green"}
-    return VisualizationBlock(
-        risk_meter=RiskMeterViz(
-            score_percentage=round(final_score * 100, 1),
-            meter_color=color_map.get(risk_level, "green"),
-        ),
-        feature_importance=[
-            WordImpact(word=w["word"], impact=w["impact"])
-            for w in contributing_words
-        ],
-        highlighted_text=highlighted_text,
-    )
+
+def _selected_fields(model, fields: Optional[str], compact: bool, compact_fields: tuple) -> Optional[tuple]:
+    try:
+        return select_fields(model, fields, compact, compact_fields)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
 @router.post("/analyze", response_model=AnalyzeResponse)
 def analyze_message(
     payload: AnalyzeRequest,
-    db: Session = Depends(get_db),
+    fields: Optional[str] = Query(None, description=_FIELDS_DESCRIPTION),
+    compact: bool = False,
+    ticket: admission.Ticket = Depends(admission.admit),   # first: may reject with 503
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_user),
 ):
+    """
+    Analyze a message. fields / compact trim the response; unless the
+    visualization block is requested its word impacts and highlighting are
+    not computed at all.
+    """
+    received = datetime.now().timestamp()
+    selected = _selected_fields(AnalyzeResponse, fields, compact, _COMPACT_ANALYZE)
     message = sanitize_input(payload.message)
+    explain = selected is None or "visualization" in selected
+    result = analysis_pipeline.analyze(message, tier=ticket.start(), explain=explain)
+    record = analysis_pipeline.save(db, current_user.id, message, result)
 
-    # ── Step 1: Rule-based analysis
-    rule_result = rule_engine.analyze_rules(message)
+    # Encoded directly (same JSON as AnalyzeResponse) to skip double validation
+    response = analyze_response(analysis_pipeline.response_values(result, record.id), selected)
+    if analysis_pipeline.SERVER_TIMING:
+        response.headers["Server-Timing"] = analysis_pipeline.server_timing(result, queue_ms=ticket.wait * 1000)
+    # Queued after the response is sent; dropped if the shadow / capture queue is full
+    background = BackgroundTasks()
+    if shadow.comparable(result) and shadow.sampled():
+        background.add_task(shadow.enqueue, message, result)
+    if traffic_capture.sampled():
+        background.add_task(traffic_capture.enqueue, received, message, fields, compact)
+    if background.tasks:
+        response.background = background
+    return response
 
-    # ── Step 2: ML prediction (Pipeline inference + feature importance)
-    ml_result = ml_model.predict(message)
 
-    # ── Step 3: Fuse scores → final_score + risk_level
-    fusion_result = fusion_engine.fuse_scores(
-        rule_score=rule_result["rule_score"],
-        scam_probability=ml_result["scam_probability"],
+def _load_analysis(db: Session, analysis_id: int) -> Optional[AnalyzedMessage]:
+    return (
+        db.query(AnalyzedMessage)
+        .options(selectinload(AnalyzedMessage.body))
+        .filter(AnalyzedMessage.id == analysis_id)
+        .first()
     )
 
-    # ── Step 4: Human-readable explanation (risk-level aware)
-    explanation_result = explanation_engine.generate_explanation(
-        matched_rules=rule_result["matched_rules"],
-        scam_type=ml_result["scam_type"],
-        risk_level=fusion_result["risk_level"],
-        final_score=fusion_result["final_score"],
-        scam_probability=ml_result["scam_probability"],
-    )
 
-    # ── Step 5: Build visualization block
-    viz = _build_visualization(
-        final_score=fusion_result["final_score"],
-        risk_level=fusion_result["risk_level"],
-        contributing_words=ml_result.get("contributing_words", []),
-        highlighted_text=ml_result.get("highlighted_text", message),
-    )
+@router.get("/analysis/{analysis_id}", response_model=AnalyzeResponse)
+def get_analysis(
+    analysis_id: int,
+    db: Session = Depends(get_user_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    A stored analysis in the same shape /api/analyze returned, decoded from
+    the database without rerunning inference. X-Model-Version names the model
+    that produced it (absent for analyses stored before versioning).
+    """
+    record = _load_analysis(db, analysis_id)
+    if record is None and current_user.role == "admin" and shards.ENABLED:
+        # Someone else's analysis: look in every shard
+        record = next(filter(None, shards.fan_out(lambda shard, s: _load_analysis(s, analysis_id))), None)
+    if record is None or (record.user_id != current_user.id and current_user.role != "admin"):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Analysis not found.")
+    values, model_version = analysis_pipeline.stored_response_values(record)
+    response = analyze_response(values)
+    if model_version:
+        response.headers["X-Model-Version"] = model_version
+    return response
 
-    # ── Step 6: Persist to DB
-    record = AnalyzedMessage(
-        user_id=current_user.id,
-        message=message,
-        rule_score=rule_result["rule_score"],
-        ai_score=ml_result["scam_probability"],
-        final_score=fusion_result["final_score"],
-        risk_level=fusion_result["risk_level"],
-        scam_type=ml_result["scam_type"],
-        matched_rules=serialize_list(rule_result["matched_rules"]),
-        suspicious_phrases=serialize_list(rule_result["suspicious_phrases"]),
-        explanation=explanation_result["explanation"],
-    )
-    db.add(record)
-    db.commit()
-    db.refresh(record)
-
-    return AnalyzeResponse(
-        # ── preserved existing fields ──
-        risk_level=fusion_result["risk_level"],
-        final_score=fusion_result["final_score"],
-        rule_score=rule_result["rule_score"],
-        ai_score=ml_result["scam_probability"],
-        scam_type=ml_result["scam_type"],
-        matched_rules=rule_result["matched_rules"],
-        suspicious_phrases=rule_result["suspicious_phrases"],
-        explanation=explanation_result["explanation"],
-        scam_type_info=explanation_result["scam_type_info"],
-        safety_advice=explanation_result["safety_advice"],
-        analysis_id=record.id,
-        # ── new visualization block ──
-        visualization=viz,
-    )
+
+@router.post("/feedback", response_model=FeedbackResponse, status_code=status.HTTP_201_CREATED)
+def submit_feedback(
+    payload: FeedbackRequest,
+    db: Session = Depends(get_db),
+    user_db: Session = Depends(get_user_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Report whether one of your analyses really was a scam. Feedback trains
+    the model incrementally (model_updates); one verdict per analysis.
+    """
+    record = _load_analysis(user_db, payload.analysis_id)
+    if record is None or record.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Analysis not found.")
+    try:
+        return model_updates.add_feedback(db, current_user.id, record, payload.is_scam)
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Feedback for this analysis was already recorded.",
+        )
+
+
+def _preview(record: AnalyzedMessage) -> str:
+    text = load_message(record)
+    return text[:200] + ("..." if len(text) > 200 else "")
+
+
+# HistoryItem field → its value for a stored analysis, computed only when selected
+_HISTORY_VALUES = {
+    "id": lambda r: r.id,
+    "message": _preview,
+    "risk_level": lambda r: r.risk_level,
+    "final_score": lambda r: r.final_score,
+    "rule_score": lambda r: r.rule_score,
+    "ai_score": lambda r: r.ai_score,
+    "scam_type": lambda r: r.scam_type,
+    "matched_rules": lambda r: deserialize_list(r.matched_rules),
+    "suspicious_phrases": lambda r: deserialize_list(r.suspicious_phrases),
+    "created_at": lambda r: r.created_at,
+}
 
 
 @router.get("/history", response_model=list[HistoryItem])
 def get_history(
-    skip: int = 0,
-    limit: int = 20,
-    db: Session = Depends(get_db),
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    risk_level: Optional[str] = Query(None, pattern="^(LOW|MEDIUM|HIGH)$"),
+    rule: Optional[str] = Query(None, description="matched rule name, e.g. OTP Request"),
+    scam_type: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = Query(None, description="inclusive"),
+    fields: Optional[str] = Query(None, description=_FIELDS_DESCRIPTION),
+    compact: bool = False,
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_user),
 ):
-    records = (
-        db.query(AnalyzedMessage)
-        .filter(AnalyzedMessage.user_id == current_user.id)
-        .order_by(AnalyzedMessage.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
+    """
+    Conditional GET: ETag per history version, 304 on If-None-Match.
+    fields / compact trim each item; message bodies are only loaded when
+    `message` is among them.
+
+    Every filter is served by an index: a rule filter scans rule_hits by
+    (user, rule, time), the others analyzed_messages by (user[, risk level
+    or scam type], time).
+    """
+    if rule is not None and rule not in RULE_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown rule. Choose from: {', '.join(RULE_IDS)}.",
+        )
+    selected = _selected_fields(HistoryItem, fields, compact, _COMPACT_HISTORY) or tuple(HistoryItem.model_fields)
 
-    return [
-        HistoryItem(
-            id=r.id,
-            message=r.message[:200] + ("..." if len(r.message) > 200 else ""),
-            risk_level=r.risk_level,
-            final_score=r.final_score,
-            rule_score=r.rule_score,
-            ai_score=r.ai_score,
-            scam_type=r.scam_type,
-            matched_rules=deserialize_list(r.matched_rules),
-            suspicious_phrases=deserialize_list(r.suspicious_phrases),
-            created_at=r.created_at,
+    def render() -> bytes:
+        query = db.query(AnalyzedMessage)
+        if "message" in selected:
+            query = query.options(selectinload(AnalyzedMessage.body))
+        if rule is None:
+            created_at = AnalyzedMessage.created_at
+            query = query.filter(AnalyzedMessage.user_id == current_user.id)
+        else:
+            created_at = RuleHit.created_at
+            query = query.join(RuleHit, RuleHit.analysis_id == AnalyzedMessage.id).filter(
+                RuleHit.user_id == current_user.id, RuleHit.rule_id == RULE_IDS[rule]
+            )
+        if risk_level is not None:
+            query = query.filter(AnalyzedMessage.risk_level == risk_level)
+        if scam_type is not None:
+            query = query.filter(AnalyzedMessage.scam_type == scam_type)
+        if date_from is not None:
+            query = query.filter(created_at >= datetime.combine(date_from, time.min))
+        if date_to is not None:
+            query = query.filter(created_at < datetime.combine(date_to + timedelta(days=1), time.min))
+        records = query.order_by(created_at.desc()).offset(skip).limit(limit).all()
+
+        items = [{name: _HISTORY_VALUES[name](r) for name in selected} for r in records]
+        return JSONResponse(jsonable_encoder(items)).body
+
+    params = (skip, limit, risk_level, rule, scam_type, date_from, date_to, selected)
+    return etag_cache.conditional_response(request, db, current_user.id, "history", params, render)
+
+
+def run_search(
+    db: Session, q: str, user_id: Optional[int], limit: int, cursor: Optional[str], sort: str,
+    all_shards: bool = False,
+) -> dict:
+    """Shared by the user and admin search endpoints; all_shards searches every shard, not `db`."""
+    if not search_index.available(db):
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Full-text search requires SQLite with FTS5.",
         )
-        for r in records
-    ]
+    try:
+        if all_shards:
+            items, next_cursor = search_index.search_shards(q, limit=limit, cursor=cursor, sort=sort)
+        else:
+            items, next_cursor = search_index.search(db, q, user_id=user_id, limit=limit, cursor=cursor, sort=sort)
+    except search_index.SearchQueryError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("/history/search", response_model=SearchResponse)
+def search_history(
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    sort: str = Query("rank", pattern="^(rank|recent)$"),
+    db: Session = Depends(get_user_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Full-text search over the caller's analyses: best match first (bm25) or
+    newest first. Quote a phrase, end a term with * for prefix matching.
+    """
+    return run_search(db, q, current_user.id, limit, cursor, sort)
+
+
+@router.get("/history/export")
+def export_history(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    all_users: bool = False,
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Stream the full analysis history as CSV or NDJSON (optionally gzipped).
+    all_users=true exports every user's history and requires the admin role.
+    """
+    if all_users and current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Administrator access required.",
+        )
+    media_type, extension = FORMATS[format]
+    filename = f"fraudshield-history.{extension}"
+    if gzip:
+        media_type, filename = "application/gzip", filename + ".gz"
+    return StreamingResponse(
+        stream_history(format, None if all_users else current_user.id, compress=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -2,26 +2,40 @@ from datetime import datetime, timedelta
 from collections import defaultdict
 import json
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 
-from app.database.db import get_db
 from app.database.models import User, AnalyzedMessage
-from app.middleware.auth_middleware import get_current_user
-from app.schemas.analysis_schemas import StatsResponse
+from app.middleware.auth_middleware import get_current_user, get_user_db
+from app.schemas.analysis_schemas import StatsResponse, CampaignIndexStats, ResultCacheStats
+from app.services import campaign_index, result_cache
+from app.utils import etag_cache
 
 router = APIRouter(prefix="/api", tags=["Dashboard"])
 
 
 @router.get("/stats", response_model=StatsResponse)
 def get_stats(
-    db: Session = Depends(get_db),
+    request: Request,
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_user),
 ):
+    """Conditional GET: ETag per history version and day, 304 on If-None-Match."""
+    # The 14-day trend depends on today's date as well as on the rows
+    today = datetime.utcnow().date()
+    return etag_cache.conditional_response(
+        request, db, current_user.id, "stats", (today.isoformat(),),
+        lambda: JSONResponse(jsonable_encoder(_compute_stats(db, current_user.id, today))).body,
+    )
+
+
+def _compute_stats(db: Session, user_id: int, today) -> StatsResponse:
     records = (
         db.query(AnalyzedMessage)
-        .filter(AnalyzedMessage.user_id == current_user.id)
+        .filter(AnalyzedMessage.user_id == user_id)
         .all()
     )
 
@@ -50,7 +64,6 @@ def get_stats(
 
     # Daily trend: last 14 days
     daily_trend = []
-    today = datetime.utcnow().date()
     for i in range(13, -1, -1):
         day = (today - timedelta(days=i)).strftime("%Y-%m-%d")
         scores = daily.get(day, [])
@@ -67,3 +80,15 @@ def get_stats(
         daily_trend=daily_trend,
         average_score=round(total_score / total, 4),
     )
+
+
+@router.get("/campaigns/stats", response_model=CampaignIndexStats)
+def get_campaign_index_stats(current_user: User = Depends(get_current_user)):
+    """Size and hit rate of the near-duplicate campaign index in this worker."""
+    return CampaignIndexStats(**campaign_index.stats())
+
+
+@router.get("/result-cache/stats", response_model=ResultCacheStats)
+def get_result_cache_stats(current_user: User = Depends(get_current_user)):
+    """Size of the shared result cache and its hit rate in this worker and across the host."""
+    return ResultCacheStats(**result_cache.stats())
@@ -0,0 +1,103 @@
+from typing import List
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+from fastapi.responses import StreamingResponse
+
+from app.database.models import User
+from app.middleware.auth_middleware import get_current_user
+from app.schemas.job_schemas import JobStatus, JobResultsPage
+from app.services import job_queue
+from app.utils.job_files import RESULT_FORMATS, UploadFormatError, encode_results, iter_messages
+
+router = APIRouter(prefix="/api/jobs", tags=["Jobs"])
+
+
+def _status(job: dict) -> JobStatus:
+    return JobStatus(progress=round(job["processed"] / job["total"], 4) if job["total"] else 0.0, **job)
+
+
+def _owned_job(job_id: str, user: User) -> dict:
+    job = job_queue.get(job_queue.connection(), job_id)
+    if job is None or (job["user_id"] != user.id and user.role != "admin"):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found.")
+    return job
+
+
+@router.post("", response_model=JobStatus, status_code=status.HTTP_202_ACCEPTED)
+def submit_job(
+    file: UploadFile = File(..., description=".txt (one message per line), .csv or .jsonl"),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Queue every message of an uploaded file for analysis by the job workers
+    (job_worker.py). Poll GET /api/jobs/{id} for progress.
+    """
+    conn = job_queue.connection()
+    try:
+        job_id = job_queue.submit(conn, current_user.id, iter_messages(file.file, file.filename), file.filename)
+    except UploadFormatError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except job_queue.JobLimitError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    return _status(job_queue.get(conn, job_id))
+
+
+@router.get("", response_model=List[JobStatus])
+def list_jobs(
+    limit: int = Query(50, ge=1, le=200),
+    current_user: User = Depends(get_current_user),
+):
+    return [_status(job) for job in job_queue.list_jobs(job_queue.connection(), current_user.id, limit)]
+
+
+@router.get("/{job_id}", response_model=JobStatus)
+def get_job(job_id: str, current_user: User = Depends(get_current_user)):
+    return _status(_owned_job(job_id, current_user))
+
+
+@router.post("/{job_id}/cancel", response_model=JobStatus)
+def cancel_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """Stop processing; results committed so far remain available."""
+    _owned_job(job_id, current_user)
+    conn = job_queue.connection()
+    if not job_queue.cancel(conn, job_id):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Job has already finished.")
+    return _status(job_queue.get(conn, job_id))
+
+
+@router.get("/{job_id}/results", response_model=JobResultsPage)
+def get_job_results(
+    job_id: str,
+    after: int = Query(-1, ge=-1),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_user),
+):
+    """Results committed so far, in upload order; page with ?after=next_after."""
+    _owned_job(job_id, current_user)
+    items = job_queue.results_page(job_queue.connection(), job_id, after, limit)
+    return {"items": items, "next_after": items[-1]["seq"] if len(items) == limit else None}
+
+
+@router.get("/{job_id}/results/export")
+def export_job_results(
+    job_id: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    current_user: User = Depends(get_current_user),
+):
+    """Stream every result committed so far as NDJSON or CSV."""
+    _owned_job(job_id, current_user)
+
+    def body():
+        # A connection of its own: the generator runs after the request's thread moves on
+        conn = job_queue.connect()
+        try:
+            yield from encode_results(job_queue.iter_results(conn, job_id), format)
+        finally:
+            conn.close()
+
+    media_type, extension = RESULT_FORMATS[format]
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="fraudshield-job-{job_id}.{extension}"'},
+    )
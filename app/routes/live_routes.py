@@ -0,0 +1,171 @@
+"""
+Live analysis over a WebSocket: /ws/analyze
+
+The connection is authenticated once, with ?token=<jwt> or a first message
+{"type": "auth", "token": "<jwt>"}; the server answers {"type": "ready"}.
+
+Client → server:
+  {"type": "edit",   "seq": 7, "text": "..."}   current contents of the input
+  {"type": "submit", "seq": 8, "text": "..."}   final message, analyzed and saved
+
+Server → client:
+  {"type": "score",  "seq": 7, "risk_level": ..., "final_score": ..., ...}
+  {"type": "result", "seq": 8, "analysis": <AnalyzeResponse>}
+  {"type": "error",  "seq": ..., "detail": "...", ["retry_after": <seconds>]}
+
+Edits are debounced (LIVE_DEBOUNCE_MS); an edit or submit that arrives
+while an earlier edit is still waiting or being scored supersedes it, and
+only the newest evaluation's score is sent.
+
+Submits go through the same admission control as /api/analyze: when the
+server is overloaded the client gets an error frame with retry_after
+instead of a result, and an admitted submit is degraded like a request.
+A submit that fails is reported as an error frame; the connection stays up.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+
+from app.database import shards
+from app.database.db import SessionLocal
+from app.middleware.auth_middleware import user_from_token
+from app.schemas.analysis_schemas import AnalyzeRequest
+from app.services import admission, analysis_pipeline
+from app.services.live_scoring import LiveSession
+from app.utils.helpers import sanitize_input
+from app.utils.response_encoder import encode_analyze_response
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["Live Analysis"])
+
+DEBOUNCE_SECONDS = int(os.getenv("LIVE_DEBOUNCE_MS", "250")) / 1000
+AUTH_TIMEOUT_SECONDS = 10
+
+
+def _authenticated_user_id(token: str) -> Optional[int]:
+    db = SessionLocal()
+    try:
+        user = user_from_token(token, db)
+        return user.id if user else None
+    finally:
+        db.close()
+
+
+def _analyze_and_save(user_id: int, message: str, ticket: admission.Ticket) -> bytes:
+    db = shards.session_for(user_id)
+    try:
+        result = analysis_pipeline.analyze(message, tier=ticket.start())
+        record = analysis_pipeline.save(db, user_id, message, result)
+        return encode_analyze_response(analysis_pipeline.response_values(result, record.id))
+    finally:
+        db.close()
+
+
+def _log_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Live evaluation failed", exc_info=task.exception())
+
+
+class _LiveConnection:
+    def __init__(self, websocket: WebSocket, user_id: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.session = LiveSession()
+        self.generation = 0                  # bumped by every edit/submit
+        self.pending: Optional[asyncio.Task] = None
+        self.send_lock = asyncio.Lock()
+
+    async def send(self, payload: dict) -> None:
+        async with self.send_lock:
+            await self.websocket.send_json(payload)
+
+    def supersede(self) -> int:
+        """Invalidate any scheduled or running evaluation; returns the new generation."""
+        self.generation += 1
+        if self.pending is not None and not self.pending.done():
+            self.pending.cancel()
+        self.pending = None
+        return self.generation
+
+    async def _evaluate(self, generation: int, seq, text: str) -> None:
+        await asyncio.sleep(DEBOUNCE_SECONDS)
+        score = await run_in_threadpool(self.session.update, text)
+        if generation == self.generation:    # otherwise a newer edit arrived meanwhile
+            await self.send({"type": "score", "seq": seq, **score})
+
+    async def on_edit(self, seq, text: str) -> None:
+        generation = self.supersede()
+        self.pending = asyncio.create_task(self._evaluate(generation, seq, sanitize_input(text)))
+        self.pending.add_done_callback(_log_failure)
+
+    async def on_submit(self, seq, text: str) -> None:
+        self.supersede()
+        try:
+            message = sanitize_input(AnalyzeRequest(message=text).message)
+        except ValidationError:
+            await self.send({"type": "error", "seq": seq, "detail": "Message must be 5-5000 characters."})
+            return
+        try:
+            with admission.admitted() as ticket:
+                body = await run_in_threadpool(_analyze_and_save, self.user_id, message, ticket)
+        except HTTPException as e:          # overloaded: rejected at admission
+            await self.send({"type": "error", "seq": seq, "detail": e.detail,
+                             "retry_after": int(e.headers["Retry-After"])})
+            return
+        except Exception:
+            logger.exception("Live submit failed")
+            await self.send({"type": "error", "seq": seq, "detail": "Analysis failed. Please retry."})
+            return
+        async with self.send_lock:
+            await self.websocket.send_text(
+                '{"type":"result","seq":%s,"analysis":%s}' % (json.dumps(seq), body.decode())
+            )
+
+
+async def _receive(websocket: WebSocket) -> dict:
+    try:
+        data = json.loads(await websocket.receive_text())
+    except json.JSONDecodeError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+@router.websocket("/ws/analyze")
+async def live_analysis(websocket: WebSocket, token: Optional[str] = None):
+    await websocket.accept()
+    try:
+        if token is None:
+            first = await asyncio.wait_for(_receive(websocket), timeout=AUTH_TIMEOUT_SECONDS)
+            token = first.get("token") if first.get("type") == "auth" else None
+        user_id = await run_in_threadpool(_authenticated_user_id, token) if token else None
+    except asyncio.TimeoutError:
+        user_id = None
+    except WebSocketDisconnect:
+        return
+    if user_id is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid or expired token.")
+        return
+
+    conn = _LiveConnection(websocket, user_id)
+    await conn.send({"type": "ready"})
+    try:
+        while True:
+            data = await _receive(websocket)
+            kind, seq, text = data.get("type"), data.get("seq"), data.get("text")
+            if kind not in ("edit", "submit") or not isinstance(text, str):
+                await conn.send({"type": "error", "seq": seq, "detail": "Expected an edit or submit with text."})
+            elif kind == "edit":
+                await conn.on_edit(seq, text)
+            else:
+                await conn.on_submit(seq, text)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        conn.supersede()
@@ -0,0 +1,68 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from app.database.models import User
+from app.middleware.auth_middleware import get_current_user
+from app.schemas.analysis_schemas import ThreadMessageRequest, ThreadPoint, ThreadResponse
+from app.services import thread_scoring
+from app.utils.helpers import sanitize_input
+
+router = APIRouter(prefix="/api/threads", tags=["Threads"])
+
+
+def _not_found() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Thread not found or expired.",
+    )
+
+
+def _get_thread_or_404(thread_id: str, user: User) -> thread_scoring.ThreadState:
+    state = thread_scoring.get_thread(thread_id, user.id)
+    if state is None:
+        raise _not_found()
+    return state
+
+
+def _thread_response(state: thread_scoring.ThreadState) -> ThreadResponse:
+    return ThreadResponse(
+        thread_id=state.thread_id,
+        message_count=len(state.trajectory),
+        trajectory=state.trajectory,
+    )
+
+
+@router.post("", response_model=ThreadResponse, status_code=status.HTTP_201_CREATED)
+def create_thread(current_user: User = Depends(get_current_user)):
+    state = thread_scoring.create_thread(current_user.id)
+    return _thread_response(state)
+
+
+@router.post("/{thread_id}/messages", response_model=ThreadPoint)
+def append_message(
+    thread_id: str,
+    payload: ThreadMessageRequest,
+    current_user: User = Depends(get_current_user),
+):
+    """Score the next message and the thread so far; only the new message is featurized."""
+    message = sanitize_input(payload.message)
+    try:
+        point = thread_scoring.append_message(thread_id, current_user.id, message)
+    except thread_scoring.ThreadFullError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Thread has reached the maximum number of messages.",
+        )
+    if point is None:
+        raise _not_found()
+    return point
+
+
+@router.get("/{thread_id}", response_model=ThreadResponse)
+def get_thread(thread_id: str, current_user: User = Depends(get_current_user)):
+    return _thread_response(_get_thread_or_404(thread_id, current_user))
+
+
+@router.delete("/{thread_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_thread(thread_id: str, current_user: User = Depends(get_current_user)):
+    if not thread_scoring.delete_thread(thread_id, current_user.id):
+        raise _not_found()
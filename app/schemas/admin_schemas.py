@@ -0,0 +1,54 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Any, Optional, Dict, List
+
+
+class LatencyPercentiles(BaseModel):
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+
+
+class ShadowSummary(BaseModel):
+    enabled: bool
+    primary_version: str
+    candidate_version: Optional[str] = None
+    sample_rate: float
+    queue_depth: int
+    enqueued: int
+    dropped: int
+    scored: int
+    error: Optional[str] = None
+    compared: int = 0
+    mean_delta: Optional[float] = None
+    mean_abs_delta: Optional[float] = None
+    risk_disagreement_rate: Optional[float] = None
+    latency_ms: Dict[str, LatencyPercentiles] = {}
+
+
+class ScoreDistributionReport(BaseModel):
+    hours: int
+    near_band: float
+    # {version: {score: summary}} or, by hour, {version: {hour: {score: summary}}};
+    # summary = {"count", "quantiles": {"p01".."p99"}, "near_boundaries": {boundary: share}}
+    versions: Dict[str, Dict[str, Any]]
+
+
+class ModelUpdateItem(BaseModel):
+    id: int
+    created_at: datetime
+    base_version: str
+    version: Optional[str] = None       # None when validation rejected the update
+    examples: int
+    published: bool
+    duration_ms: float
+    # {"before" | "after": {"holdout" | "feedback": {"auc", "f1", "accuracy"}}}
+    report: Dict[str, Any]
+
+
+class ModelUpdatesReport(BaseModel):
+    serving_version: str
+    root_version: str
+    training_enabled: bool
+    pending_feedback: int
+    min_feedback: int
+    updates: List[ModelUpdateItem]
@@ -36,6 +36,8 @@ class AnalyzeResponse(BaseModel):
     scam_type_info: str
     safety_advice: List[str]
     analysis_id: Optional[int] = None
+    campaign_id: Optional[str] = None   # set when a near-duplicate of a known campaign
+    degradation: str = "none"           # "none" | "reduced" | "rules_only" (load shedding)
     # ── new visualization block ──
     visualization: Optional[VisualizationBlock] = None
 
@@ -57,9 +59,91 @@ class HistoryItem(BaseModel):
         from_attributes = True
 
 
+class FeedbackRequest(BaseModel):
+    analysis_id: int
+    is_scam: bool             # the user's verdict: true = scam, false = legitimate
+
+
+class FeedbackResponse(BaseModel):
+    id: int
+    analysis_id: int
+    is_scam: bool
+    ai_score: Optional[float] = None
+    model_version: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+        protected_namespaces = ()
+
+
+class SearchHit(BaseModel):
+    id: int
+    user_id: int
+    snippet: str              # HTML-escaped excerpt, matches wrapped in <mark>
+    rank: float               # bm25; lower is a better match
+    risk_level: str
+    final_score: float
+    scam_type: str
+    created_at: datetime
+
+
+class SearchResponse(BaseModel):
+    items: List[SearchHit]
+    next_cursor: Optional[str] = None   # pass back as ?cursor= for the next page
+
+
 class StatsResponse(BaseModel):
     total_analyses: int
     risk_distribution: dict
     scam_type_distribution: dict
     daily_trend: List[dict]
     average_score: float
+
+
+class CampaignIndexStats(BaseModel):
+    size: int
+    capacity: int
+    campaigns: int
+    lookups: int
+    hits: int
+    hit_rate: float
+
+
+class ResultCacheStats(BaseModel):
+    enabled: bool
+    entries: int
+    max_entries: int
+    ttl_seconds: float
+    lookups: int
+    hits: int
+    hit_rate: float
+    host_lookups: int
+    host_hits: int
+    host_hit_rate: float
+
+
+# ── Thread (conversation) scoring ────────────────────────────────────────────
+class ThreadMessageRequest(BaseModel):
+    message: str = Field(..., min_length=1, max_length=5000, description="Next message in the thread")
+
+
+class ThreadScore(BaseModel):
+    risk_level: str
+    final_score: float
+    rule_score: float
+    ai_score: float
+    scam_type: str
+    matched_rules: List[str]
+
+
+class ThreadPoint(BaseModel):
+    index: int
+    message: ThreadScore       # this message on its own
+    cumulative: ThreadScore    # the whole thread up to and including it
+
+
+class ThreadResponse(BaseModel):
+    thread_id: str
+    message_count: int
+    trajectory: List[ThreadPoint]
@@ -0,0 +1,36 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+
+
+class JobStatus(BaseModel):
+    id: str
+    status: str               # "submitting" | "queued" | "running" | "done" | "cancelled" | "failed"
+    filename: Optional[str] = None
+    total: int
+    processed: int
+    progress: float           # processed / total
+    chunks: int
+    chunks_done: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+
+class JobResult(BaseModel):
+    seq: int                  # 0-based position in the upload
+    message: str
+    risk_level: Optional[str] = None
+    final_score: Optional[float] = None
+    rule_score: Optional[float] = None
+    ai_score: Optional[float] = None
+    scam_type: Optional[str] = None
+    matched_rules: List[str] = []
+    suspicious_phrases: List[str] = []
+    error: Optional[str] = None   # set instead of scores when the message was rejected
+
+
+class JobResultsPage(BaseModel):
+    items: List[JobResult]
+    next_after: Optional[int] = None   # pass back as ?after= for the next page
@@ -2,10 +2,16 @@ from . import ml_model
 from . import rule_engine
 from . import fusion_engine
 from . import explanation_engine
+from . import campaign_index
+from . import thread_scoring
+from . import live_scoring
 
 __all__ = [
     "ml_model",
     "rule_engine",
     "fusion_engine",
     "explanation_engine",
+    "campaign_index",
+    "thread_scoring",
+    "live_scoring",
 ]
\ No newline at end of file
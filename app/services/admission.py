@@ -0,0 +1,160 @@
+"""
+admission.py — admission control and load shedding for /api/analyze
+
+Analyze requests are CPU-bound and run on the server's worker threadpool,
+so under a spike they queue there until clients time out. The controller
+tracks two load signals:
+
+  • in-flight requests: admitted and not finished yet, queued ones included
+  • queue wait: time from admission until the handler starts inference,
+    as a moving average that decays while no new samples arrive (so it
+    recovers once traffic stops being admitted)
+
+and maps each to a degradation tier; the worse of the two wins:
+
+  none        full analysis
+  reduced     no contributing words / highlighting (explain step skipped)
+  rules_only  rule engine + linear-head score; no campaign lookup
+  reject      503 with Retry-After, decided before the request queues
+
+Rejection happens at admission so it costs nothing; a request that was
+admitted but then waited long is never rejected, only degraded.
+"""
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, Iterator
+
+from fastapi import HTTPException, status
+
+# ─── Constants ─────────────────────────────────────────────────────────────────
+TIERS = ("none", "reduced", "rules_only", "reject")
+
+# Thresholds for reduced / rules_only / reject
+INFLIGHT_LIMITS = (
+    int(os.getenv("ADMISSION_REDUCED_INFLIGHT", "16")),
+    int(os.getenv("ADMISSION_RULES_ONLY_INFLIGHT", "32")),
+    int(os.getenv("ADMISSION_REJECT_INFLIGHT", "64")),
+)
+WAIT_LIMITS = (
+    float(os.getenv("ADMISSION_REDUCED_WAIT_MS", "50")) / 1000,
+    float(os.getenv("ADMISSION_RULES_ONLY_WAIT_MS", "250")) / 1000,
+    float(os.getenv("ADMISSION_REJECT_WAIT_MS", "1000")) / 1000,
+)
+WAIT_HALF_LIFE = float(os.getenv("ADMISSION_WAIT_HALF_LIFE_SECONDS", "1.0"))
+_WAIT_SMOOTHING = 0.2
+
+
+def _tier_index(value: float, limits) -> int:
+    tier = 0
+    for i, limit in enumerate(limits):
+        if value >= limit:
+            tier = i + 1
+    return tier
+
+
+class Ticket:
+    """One admitted request; start() is called when inference begins."""
+
+    def __init__(self, controller: "AdmissionController", tier: int):
+        self.controller = controller
+        self.admitted_at = time.perf_counter()
+        self.tier = tier
+        self.started = False
+        self.wait = 0.0
+
+    def start(self) -> str:
+        """Record queue wait and return the tier to serve (never "reject")."""
+        wait = self.wait = time.perf_counter() - self.admitted_at
+        self.started = True
+        self.tier = min(max(self.tier, self.controller.record_wait(wait)), TIERS.index("rules_only"))
+        return TIERS[self.tier]
+
+
+class AdmissionController:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self._wait = 0.0
+        self._wait_at = time.perf_counter()
+        self.rejected = 0
+        self.served: Dict[str, int] = dict.fromkeys(TIERS[:-1], 0)
+
+    def _current_wait(self, now: float) -> float:
+        return self._wait * math.pow(0.5, (now - self._wait_at) / WAIT_HALF_LIFE)
+
+    def record_wait(self, wait: float) -> int:
+        """Fold one queue-wait sample in; returns the tier that wait alone implies."""
+        now = time.perf_counter()
+        with self._lock:
+            current = self._current_wait(now)
+            self._wait = current + _WAIT_SMOOTHING * (wait - current)
+            self._wait_at = now
+        return _tier_index(wait, WAIT_LIMITS)
+
+    def admit(self) -> Ticket:
+        """Admit a request or raise 503; the caller must release() the ticket."""
+        now = time.perf_counter()
+        with self._lock:
+            wait = self._current_wait(now)
+            tier = max(_tier_index(self.in_flight + 1, INFLIGHT_LIMITS), _tier_index(wait, WAIT_LIMITS))
+            if TIERS[tier] == "reject":
+                self.rejected += 1
+                retry_after = max(1, math.ceil(wait))
+            else:
+                self.in_flight += 1
+        if TIERS[tier] == "reject":
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is overloaded. Please retry shortly.",
+                headers={"Retry-After": str(retry_after)},
+            )
+        return Ticket(self, tier)
+
+    def release(self, ticket: Ticket) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            if ticket.started:
+                self.served[TIERS[ticket.tier]] += 1
+
+    def stats(self) -> Dict:
+        now = time.perf_counter()
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "queue_wait_ms": round(self._current_wait(now) * 1000, 1),
+                "served": dict(self.served),
+                "rejected": self.rejected,
+            }
+
+
+_controller = AdmissionController()
+
+
+async def admit() -> AsyncIterator[Ticket]:
+    """
+    FastAPI dependency. Being async, it runs on the event loop as soon as the
+    request arrives, before the route's threadpool work is queued; declare it
+    ahead of sync dependencies so queue wait includes them.
+    """
+    ticket = _controller.admit()
+    try:
+        yield ticket
+    finally:
+        _controller.release(ticket)
+
+
+@contextmanager
+def admitted() -> Iterator[Ticket]:
+    """admit() for work that is not a route dependency (WebSocket submits)."""
+    ticket = _controller.admit()
+    try:
+        yield ticket
+    finally:
+        _controller.release(ticket)
+
+
+def stats() -> Dict:
+    return _controller.stats()
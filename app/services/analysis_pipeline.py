@@ -0,0 +1,257 @@
+"""
+analysis_pipeline.py — the full /api/analyze chain as reusable steps
+
+rules → ML (campaign-aware) → fusion → explanation → visualization, then
+persistence of the result. Shared by the HTTP route and the live-analysis
+WebSocket's final "submit", so both produce the same record and response.
+
+Under load (see admission.py) analyze() can run a degraded tier:
+  reduced     ML without contributing words / highlighting
+  rules_only  rules + the linear-head score (same ensemble, without the
+              sklearn/pandas overhead), no campaign lookup
+
+Clients that do not want the visualization block (analyze(explain=False),
+e.g. ?compact=true) skip contributing-word extraction, highlighting and the
+visualization stage; their stored result has no contributing words.
+
+Every stage is timed into result["timings"] (ms). With SERVER_TIMING=1 the
+analyze route reports them in a Server-Timing header, which the load-test
+harness (loadtest.py) aggregates into a per-stage breakdown.
+"""
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.database.models import AnalyzedMessage
+from app.database.message_store import store_message, load_message, load_explanation
+from app.database.result_blob import encode_result, decode_result
+from app.database import rule_hits, search_index, shards
+from app.services import (
+    ml_model, rule_engine, fusion_engine, explanation_engine, campaign_index, result_cache, score_sketches,
+)
+from app.services.features import MessageFeatures, build_features
+from app.services.linear_head import get_head
+from app.utils import etag_cache
+from app.utils.helpers import serialize_list, deserialize_list
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+
+
+def _build_visualization(
+    final_score: float,
+    risk_level: str,
+    contributing_words: list,
+    highlighted_text: str,
+) -> dict:
+    """Build the visualization block (VisualizationBlock shape) from computed analysis results."""
+    color_map = {"HIGH": "red", "MEDIUM": "orange", "LOW": "green"}
+    return {
+        "risk_meter": {
+            "score_percentage": round(final_score * 100, 1),
+            "meter_color": color_map.get(risk_level, "green"),
+        },
+        "feature_importance": [
+            {"word": w["word"], "impact": w["impact"]}
+            for w in contributing_words
+        ],
+        "highlighted_text": highlighted_text,
+    }
+
+
+def _linear_verdict(message: str, features: MessageFeatures) -> Dict:
+    """ml_model.predict-shaped result from the linear head, without explanation."""
+    head = get_head()
+    scam_probability = head.score_counts(head.ngram_counts(features.clean_text), features.numeric_row().values())
+    return {
+        "scam_probability":   round(scam_probability, 4),
+        "scam_type":          ml_model._detect_scam_type(message, scam_probability, features.lower),
+        "contributing_words": [],
+        "highlighted_text":   ml_model._build_highlighted_text(message, []),
+    }
+
+
+def analyze(message: str, features: Optional[MessageFeatures] = None, tier: str = "none",
+            explain: bool = True) -> Dict:
+    """
+    Run every analysis stage on a sanitized message; nothing is persisted.
+    With explain=False result["visualization"] is None.
+    """
+    timings = {}
+    mark = time.perf_counter()
+
+    def lap(stage: str) -> None:
+        nonlocal mark
+        now = time.perf_counter()
+        timings[stage] = (now - mark) * 1000
+        mark = now
+
+    features = features or build_features(message)   # normalized once, shared by every stage
+    lap("features")
+
+    # ── Step 1: Rule-based analysis
+    rule_result = rule_engine.analyze_rules(message, features)
+    lap("rules")
+
+    # ── Step 2: ML prediction (reused from a near-duplicate campaign when possible)
+    if tier == "rules_only":
+        ml_result, campaign_id = _linear_verdict(message, features), None
+    else:
+        ml_result, campaign_id = campaign_index.predict(message, features, explain=(explain and tier == "none"))
+    lap("ml")
+
+    # ── Step 3: Fuse scores → final_score + risk_level
+    fusion_result = fusion_engine.fuse_scores(
+        rule_score=rule_result["rule_score"],
+        scam_probability=ml_result["scam_probability"],
+    )
+    lap("fusion")
+
+    # ── Step 4: Human-readable explanation (risk-level aware)
+    explanation_result = explanation_engine.generate_explanation(
+        matched_rules=rule_result["matched_rules"],
+        scam_type=ml_result["scam_type"],
+        risk_level=fusion_result["risk_level"],
+        final_score=fusion_result["final_score"],
+        scam_probability=ml_result["scam_probability"],
+    )
+    lap("explanation")
+
+    # ── Step 5: Build visualization block
+    viz = None
+    if explain:
+        viz = _build_visualization(
+            final_score=fusion_result["final_score"],
+            risk_level=fusion_result["risk_level"],
+            contributing_words=ml_result.get("contributing_words", []),
+            highlighted_text=ml_result.get("highlighted_text", message),
+        )
+        lap("visualization")
+
+    return {
+        "rules":       rule_result,
+        "ml":          ml_result,
+        "campaign_id": campaign_id,
+        "fusion":      fusion_result,
+        "explanation": explanation_result,
+        "visualization": viz,
+        "degradation": tier,
+        "timings":     timings,
+    }
+
+
+def analyze_batch(messages: List[str]) -> List[Dict]:
+    """
+    Rules → ML → fusion for many sanitized messages, with the ML step
+    vectorized over the whole batch. Returns one score row per message;
+    no explanation, visualization or campaign lookup.
+    """
+    features = [build_features(m) for m in messages]
+    verdicts = result_cache.predict_batch(messages, features)
+    rows = []
+    for message, f, verdict in zip(messages, features, verdicts):
+        rules = rule_engine.analyze_rules(message, f)
+        fusion = fusion_engine.fuse_scores(rules["rule_score"], verdict["scam_probability"])
+        rows.append({
+            "risk_level":         fusion["risk_level"],
+            "final_score":        fusion["final_score"],
+            "rule_score":         rules["rule_score"],
+            "ai_score":           verdict["scam_probability"],
+            "scam_type":          verdict["scam_type"],
+            "matched_rules":      rules["matched_rules"],
+            "suspicious_phrases": rules["suspicious_phrases"],
+        })
+    return rows
+
+
+def save(db: Session, user_id: int, message: str, result: Dict) -> AnalyzedMessage:
+    """
+    Persist an analyze() result (body stored once by content hash, rule hits
+    as rule_hits rows) and index it for search. `db` must be a session on the user's shard (shards.session_for).
+    """
+    start = time.perf_counter()
+    rule_result, ml_result, fusion_result = result["rules"], result["ml"], result["fusion"]
+    record = AnalyzedMessage(
+        user_id=user_id,
+        message_hash=store_message(db, message),
+        rule_score=rule_result["rule_score"],
+        ai_score=ml_result["scam_probability"],
+        final_score=fusion_result["final_score"],
+        risk_level=fusion_result["risk_level"],
+        scam_type=ml_result["scam_type"],
+        matched_rules=serialize_list(rule_result["matched_rules"]),
+        suspicious_phrases=serialize_list(rule_result["suspicious_phrases"]),
+        explanation_template=result["explanation"]["template_id"],
+        result_blob=encode_result(result, ml_model.MODEL_VERSION),
+    )
+    if shards.ENABLED:
+        record.id = shards.allocate_id(db, shards.shard_of(user_id))
+    db.add(record)
+    db.flush()
+    rule_hits.record(db, record.id, user_id, record.created_at, rule_result["matched_rules"])
+    search_index.index_message(db, record.id, user_id, message)
+    db.commit()
+    db.refresh(record)
+    etag_cache.bump(user_id, record.id)
+    score_sketches.record(record.ai_score, record.rule_score, record.final_score)
+    result["timings"]["persist"] = (time.perf_counter() - start) * 1000
+    return record
+
+
+def stored_response_values(record: AnalyzedMessage) -> Tuple[Dict, Optional[str]]:
+    """
+    response_values() for a persisted analysis, rebuilt from its row, body and
+    result blob without running any inference. Returns the values plus the
+    model version that produced them (None for rows stored before blobs).
+    """
+    stored = decode_result(record.result_blob)
+    message = load_message(record)
+    words = stored["contributing_words"]
+    return {
+        "risk_level": record.risk_level,
+        "final_score": record.final_score,
+        "rule_score": record.rule_score,
+        "ai_score": record.ai_score,
+        "scam_type": record.scam_type,
+        "matched_rules": deserialize_list(record.matched_rules),
+        "suspicious_phrases": deserialize_list(record.suspicious_phrases),
+        "explanation": load_explanation(record),
+        "analysis_id": record.id,
+        "campaign_id": stored["campaign_id"],
+        "degradation": stored["degradation"],
+        "visualization": _build_visualization(
+            final_score=record.final_score,
+            risk_level=record.risk_level,
+            contributing_words=words,
+            highlighted_text=ml_model._build_highlighted_text(message, words),
+        ),
+    }, stored["model_version"]
+
+
+def server_timing(result: Dict, queue_ms: Optional[float] = None) -> str:
+    """Server-Timing header value for an analyze() result."""
+    stages = dict(queue=queue_ms) if queue_ms is not None else {}
+    stages.update(result["timings"])
+    return ", ".join(f"{stage};dur={ms:.3f}" for stage, ms in stages.items())
+
+
+def response_values(result: Dict, analysis_id: Optional[int]) -> Dict:
+    """AnalyzeResponse fields as plain values, for utils.response_encoder."""
+    rule_result, ml_result, fusion_result = result["rules"], result["ml"], result["fusion"]
+    return {
+        # ── preserved existing fields ──
+        "risk_level": fusion_result["risk_level"],
+        "final_score": fusion_result["final_score"],
+        "rule_score": rule_result["rule_score"],
+        "ai_score": ml_result["scam_probability"],
+        "scam_type": ml_result["scam_type"],
+        "matched_rules": rule_result["matched_rules"],
+        "suspicious_phrases": rule_result["suspicious_phrases"],
+        "explanation": result["explanation"]["explanation"],
+        "analysis_id": analysis_id,
+        "campaign_id": result["campaign_id"],
+        "degradation": result["degradation"],
+        # ── new visualization block ──
+        "visualization": result["visualization"],
+    }
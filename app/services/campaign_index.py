@@ -0,0 +1,273 @@
+"""
+campaign_index.py — near-duplicate campaign detection (MinHash + LSH)
+
+Scam campaigns re-send the same template with different numbers, names and
+links. `_clean_text` already folds digits to `numtoken` and URLs to
+`urltoken`, so word 3-shingles of the cleaned text are almost identical
+across a campaign.
+
+Every fully-scored message is added to an in-memory MinHash/LSH index
+(64 permutations, 16 bands × 4 rows). An incoming message whose estimated
+Jaccard similarity to an indexed one is ≥ CAMPAIGN_SIMILARITY reuses that
+cluster's ML verdict and is tagged with its campaign id; only misses run
+full pipeline inference (through the shared result_cache, which answers
+exact repeats scored by any worker).
+
+The index keeps the most recent CAMPAIGN_INDEX_SIZE messages (LRU) and is
+rebuilt from analyzed_messages at startup. Like predict(), the rebuild only
+indexes full verdicts: rows scored by the model being served, without
+degradation and with their contributing words (from the result blob).
+"""
+import os
+import html
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session, joinedload
+
+from app.services import ml_model, result_cache
+from app.services.features import MessageFeatures, build_features
+
+# ─── Constants ─────────────────────────────────────────────────────────────────
+INDEX_SIZE = int(os.getenv("CAMPAIGN_INDEX_SIZE", "50000"))
+SIMILARITY = float(os.getenv("CAMPAIGN_SIMILARITY", "0.85"))
+
+_NUM_PERM = 64
+_BANDS = 16
+_ROWS = _NUM_PERM // _BANDS
+_SHINGLE_SIZE = 3
+_MIN_SHINGLES = 4          # shorter messages are too ambiguous to cluster
+_PRIME = np.uint64(4294967311)  # smallest prime > 2**32; a·x + b fits in uint64
+
+_rng = np.random.RandomState(1337)
+_PERM_A = _rng.randint(1, 2**32 - 1, size=_NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 2**32 - 1, size=_NUM_PERM, dtype=np.uint64)
+
+
+# ─── MinHash ───────────────────────────────────────────────────────────────────
+
+def _shingles(tokens: List[str]) -> List[str]:
+    if len(tokens) < _SHINGLE_SIZE:
+        return []
+    return [" ".join(tokens[i:i + _SHINGLE_SIZE]) for i in range(len(tokens) - _SHINGLE_SIZE + 1)]
+
+
+def signature(text: str, features: Optional[MessageFeatures] = None) -> Optional[np.ndarray]:
+    """MinHash signature of a raw message, or None if it is too short to cluster."""
+    tokens = (features or build_features(text)).tokens
+    shingles = set(_shingles(tokens))
+    if len(shingles) < _MIN_SHINGLES:
+        return None
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles),
+                         dtype=np.uint64, count=len(shingles))
+    return ((_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _PRIME).min(axis=1)
+
+
+def _band_keys(sig: np.ndarray) -> List[Tuple[int, bytes]]:
+    return [(b, sig[b * _ROWS:(b + 1) * _ROWS].tobytes()) for b in range(_BANDS)]
+
+
+# ─── Index ─────────────────────────────────────────────────────────────────────
+
+class CampaignIndex:
+    """Bounded LSH index of recent messages grouped into campaigns."""
+
+    def __init__(self, capacity: int = INDEX_SIZE, similarity: float = SIMILARITY):
+        self.capacity = capacity
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Tuple[np.ndarray, str]]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, bytes], set] = {}
+        self._campaigns: Dict[str, Dict] = {}
+        self._next_id = 0
+        self.last_db_ids: Dict[str, int] = {}   # database url → newest id loaded
+        self.lookups = 0
+        self.hits = 0
+
+    # ── internal (caller holds the lock) ──
+    def _best_match(self, sig: np.ndarray) -> Optional[Tuple[int, float]]:
+        candidates = set()
+        for key in _band_keys(sig):
+            bucket = self._buckets.get(key)
+            if bucket:
+                candidates |= bucket
+        best = None
+        for entry_id in candidates:
+            score = float(np.count_nonzero(self._entries[entry_id][0] == sig)) / _NUM_PERM
+            if score >= self.similarity and (best is None or score > best[1]):
+                best = (entry_id, score)
+        return best
+
+    def _insert(self, sig: np.ndarray, campaign_id: str) -> None:
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (sig, campaign_id)
+        for key in _band_keys(sig):
+            self._buckets.setdefault(key, set()).add(entry_id)
+        self._campaigns[campaign_id]["entries"] += 1
+
+        while len(self._entries) > self.capacity:
+            old_id, (old_sig, old_campaign) = self._entries.popitem(last=False)
+            for key in _band_keys(old_sig):
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(old_id)
+                    if not bucket:
+                        del self._buckets[key]
+            campaign = self._campaigns[old_campaign]
+            campaign["entries"] -= 1
+            if campaign["entries"] == 0:
+                del self._campaigns[old_campaign]
+
+    # ── public API ──
+    def lookup(self, sig: np.ndarray) -> Optional[Dict]:
+        """Return {"campaign_id", "similarity", "verdict"} for a near-duplicate, else None."""
+        with self._lock:
+            self.lookups += 1
+            match = self._best_match(sig)
+            if match is None:
+                return None
+            entry_id, score = match
+            self._entries.move_to_end(entry_id)
+            campaign_id = self._entries[entry_id][1]
+            campaign = self._campaigns[campaign_id]
+            campaign["members"] += 1
+            self.hits += 1
+            return {"campaign_id": campaign_id, "similarity": score, "verdict": campaign["verdict"]}
+
+    def add(self, sig: np.ndarray, verdict: Dict, seed_text: str) -> str:
+        """Index a scored message; joins an existing campaign if one is close enough."""
+        with self._lock:
+            match = self._best_match(sig)
+            if match is not None:
+                campaign_id = self._entries[match[0]][1]
+                self._campaigns[campaign_id]["members"] += 1
+                self._entries.move_to_end(match[0])
+                return campaign_id
+            campaign_id = "cmp-" + hashlib.sha1(seed_text.encode("utf-8")).hexdigest()[:12]
+            if campaign_id not in self._campaigns:
+                self._campaigns[campaign_id] = {"verdict": verdict, "members": 0, "entries": 0}
+            self._campaigns[campaign_id]["members"] += 1
+            self._insert(sig, campaign_id)
+            return campaign_id
+
+    def clear(self) -> None:
+        """Forget every entry and campaign (their verdicts), keeping counters and load positions."""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._campaigns.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "capacity": self.capacity,
+                "campaigns": len(self._campaigns),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            }
+
+
+_index = CampaignIndex()
+
+
+# ─── Scoring entry point ───────────────────────────────────────────────────────
+
+def _verdict(ml_result: Dict) -> Dict:
+    return {
+        "scam_probability":   ml_result["scam_probability"],
+        "scam_type":          ml_result["scam_type"],
+        "contributing_words": ml_result.get("contributing_words", []),
+    }
+
+
+def predict(text: str, features: Optional[MessageFeatures] = None,
+            explain: bool = True) -> Tuple[Dict, Optional[str]]:
+    """
+    ML verdict for `text`, reusing a near-duplicate campaign's verdict when
+    one exists. Returns (ml_result, campaign_id); campaign_id is None on a miss.
+    explain=False is passed through to ml_model.predict; such verdicts lack
+    contributing words and are not added to the index.
+    """
+    f = features or build_features(text)
+    sig = signature(text, f)
+    if sig is None:
+        return result_cache.predict(text, f, explain), None
+
+    hit = _index.lookup(sig)
+    if hit is not None:
+        verdict = hit["verdict"]
+        result = dict(verdict)
+        if explain:
+            result["highlighted_text"] = ml_model._build_highlighted_text(text, result["contributing_words"])
+        else:
+            result["contributing_words"] = []
+            result["highlighted_text"] = html.escape(text)
+        return result, hit["campaign_id"]
+
+    result = result_cache.predict(text, f, explain)
+    if explain:
+        _index.add(sig, _verdict(result), text)
+    return result, None
+
+
+def rebuild_from_db(db: Session, batch_size: int = 500, limit: Optional[int] = None) -> int:
+    """
+    Index analyses newer than the last one loaded from this database, oldest
+    first, limited to its most recent `limit` rows (default INDEX_SIZE; each
+    shard contributes its share). Safe to call repeatedly; returns rows read.
+    """
+    from app.database.models import AnalyzedMessage
+    from app.database.message_store import load_message
+    from app.database.result_blob import decode_result
+
+    database = str(db.get_bind().url)
+    newest = (
+        db.query(AnalyzedMessage.id)
+        .order_by(AnalyzedMessage.id.desc())
+        .offset((limit or _index.capacity) - 1)
+        .limit(1)
+        .scalar()
+    )
+    start_id = max(_index.last_db_ids.get(database, 0), (newest or 1) - 1)
+
+    query = (
+        db.query(AnalyzedMessage)
+        .options(joinedload(AnalyzedMessage.body))
+        .filter(AnalyzedMessage.id > start_id)
+        .order_by(AnalyzedMessage.id.asc())
+        .yield_per(batch_size)
+    )
+    count = 0
+    for r in query:
+        _index.last_db_ids[database] = r.id
+        count += 1
+        stored = decode_result(r.result_blob)
+        # Degraded, unexplained or other-model verdicts cannot answer an explain=True lookup
+        if (stored["degradation"] != "none" or stored["model_version"] != ml_model.MODEL_VERSION
+                or not stored["contributing_words"]):
+            continue
+        text = load_message(r)
+        sig = signature(text)
+        if sig is not None:
+            _index.add(sig, {
+                "scam_probability":   r.ai_score,
+                "scam_type":          r.scam_type,
+                "contributing_words": stored["contributing_words"],
+            }, text)
+    return count
+
+
+def clear() -> None:
+    """Drop cached verdicts, e.g. once a different model is served."""
+    _index.clear()
+
+
+def stats() -> Dict:
+    return _index.stats()
@@ -1,5 +1,7 @@
 from typing import List, Dict
 
+import orjson
+
 # ─── Per-rule human-readable fragments ────────────────────────────────────────
 _RULE_EXPLANATIONS = {
     "OTP Request":                    "requests your one-time password (OTP) in a suspicious context — legitimate services never ask you to share an OTP",
@@ -9,6 +11,7 @@ _RULE_EXPLANATIONS = {
     "Financial Reward / Lottery":     "promises financial rewards or lottery winnings — a classic social-engineering tactic",
     "Government / Legal Impersonation": "falsely claims to be from a government agency or legal authority to intimidate the recipient",
     "Personal Info Request":          "requests sensitive personal information such as Aadhaar, PAN, or account details",
+    "Known Malicious Indicator":      "contains a link, phone number, or UPI ID that appears on a known-fraud blocklist",
 }
 
 # ─── Safety advice per risk level ─────────────────────────────────────────────
@@ -51,6 +54,103 @@ _SCAM_TYPE_INFO = {
 }
 
 
+# ─── Pre-encoded static fragments ─────────────────────────────────────────────
+# safety_advice and scam_type_info only depend on risk_level / scam_type, so
+# their JSON is encoded once here and spliced into analyze responses as-is.
+_SAFETY_ADVICE_JSON = {level: orjson.dumps(advice) for level, advice in _SAFETY_ADVICE.items()}
+_SCAM_TYPE_INFO_JSON = {name: orjson.dumps(info) for name, info in _SCAM_TYPE_INFO.items()}
+
+
+def encoded_safety_advice(risk_level: str) -> bytes:
+    """JSON of the safety_advice list generate_explanation returns for risk_level."""
+    return _SAFETY_ADVICE_JSON.get(risk_level, _SAFETY_ADVICE_JSON["LOW"])
+
+
+def encoded_scam_type_info(scam_type: str) -> bytes:
+    """JSON of the scam_type_info string generate_explanation returns for scam_type."""
+    return _SCAM_TYPE_INFO_JSON.get(scam_type, _SCAM_TYPE_INFO_JSON["General Scam"])
+
+
+def explanation_template_id(risk_level: str, matched_rules: List[str]) -> str:
+    """
+    Return the id of the explanation template for a result, e.g. "HIGH_RULES".
+
+    Together with matched_rules, final_score and scam_probability (all of which
+    are stored on AnalyzedMessage anyway) the id is enough to re-render the
+    exact explanation text, so only the id needs to be persisted.
+    """
+    level = risk_level if risk_level in ("HIGH", "MEDIUM") else "LOW"
+    return f"{level}_{'RULES' if matched_rules else 'MODEL'}"
+
+
+def render_explanation(
+    template_id: str,
+    matched_rules: List[str],
+    final_score: float,
+    scam_probability: float,
+) -> str:
+    """Render the explanation text for a template id and its parameters."""
+    score_pct = f"{scam_probability:.0%}"
+    total_pct = f"{final_score:.0%}"
+
+    if template_id == "HIGH_RULES":
+        rule_parts = [_RULE_EXPLANATIONS.get(r, r.lower()) for r in matched_rules]
+        if len(rule_parts) == 1:
+            rules_str = rule_parts[0]
+        elif len(rule_parts) == 2:
+            rules_str = f"{rule_parts[0]} and {rule_parts[1]}"
+        else:
+            rules_str = ", ".join(rule_parts[:-1]) + f", and {rule_parts[-1]}"
+        return (
+            f"⚠️ HIGH RISK: This message {rules_str}. "
+            f"The AI model assigned a fraud confidence of {score_pct}, "
+            f"resulting in an overall risk score of {total_pct}. "
+            f"This is very likely a scam — do not engage."
+        )
+
+    if template_id == "HIGH_MODEL":
+        return (
+            f"⚠️ HIGH RISK: The AI model assigned a fraud confidence of {score_pct}. "
+            f"Although no specific rule patterns were triggered, the overall message "
+            f"structure strongly resembles known fraudulent communications. "
+            f"Do not respond or share any personal information."
+        )
+
+    if template_id == "MEDIUM_RULES":
+        rules_str = ", ".join(matched_rules)
+        return (
+            f"⚠️ MEDIUM RISK: This message shows suspicious characteristics and should be treated carefully. "
+            f"The following patterns were detected: {rules_str}. "
+            f"The AI confidence is {score_pct} with an overall risk score of {total_pct}. "
+            f"Verify the sender before taking any action."
+        )
+
+    if template_id == "MEDIUM_MODEL":
+        return (
+            f"⚠️ MEDIUM RISK: This message shows suspicious characteristics based on the AI model "
+            f"(confidence: {score_pct}, risk score: {total_pct}). "
+            f"No specific rule patterns were triggered, but treat this message carefully "
+            f"and verify the sender's identity before responding."
+        )
+
+    if template_id == "LOW_RULES":
+        rules_str = ", ".join(matched_rules)
+        return (
+            f"ℹ️ LOW RISK: This message contains limited risk indicators. "
+            f"The following mild patterns were noted: {rules_str}. "
+            f"The AI model assigned a fraud confidence of only {score_pct} "
+            f"(risk score: {total_pct}). "
+            f"The message is likely safe, but always remain vigilant."
+        )
+
+    return (
+        f"✅ LOW RISK: This message appears safe. "
+        f"No suspicious rule patterns were detected and the AI model assigned "
+        f"a low fraud confidence of {score_pct} (risk score: {total_pct}). "
+        f"Always stay cautious with unsolicited messages."
+    )
+
+
 def generate_explanation(
     matched_rules: List[str],
     scam_type: str,
@@ -69,73 +169,15 @@ def generate_explanation(
     Returns:
         {
             "explanation": str,
+            "template_id": str,
             "scam_type_info": str,
             "safety_advice": List[str]
         }
     """
-    score_pct = f"{scam_probability:.0%}"
-    total_pct = f"{final_score:.0%}"
-
-    if risk_level == "HIGH":
-        if matched_rules:
-            rule_parts = [_RULE_EXPLANATIONS.get(r, r.lower()) for r in matched_rules]
-            if len(rule_parts) == 1:
-                rules_str = rule_parts[0]
-            elif len(rule_parts) == 2:
-                rules_str = f"{rule_parts[0]} and {rule_parts[1]}"
-            else:
-                rules_str = ", ".join(rule_parts[:-1]) + f", and {rule_parts[-1]}"
-            explanation = (
-                f"⚠️ HIGH RISK: This message {rules_str}. "
-                f"The AI model assigned a fraud confidence of {score_pct}, "
-                f"resulting in an overall risk score of {total_pct}. "
-                f"This is very likely a scam — do not engage."
-            )
-        else:
-            explanation = (
-                f"⚠️ HIGH RISK: The AI model assigned a fraud confidence of {score_pct}. "
-                f"Although no specific rule patterns were triggered, the overall message "
-                f"structure strongly resembles known fraudulent communications. "
-                f"Do not respond or share any personal information."
-            )
-
-    elif risk_level == "MEDIUM":
-        if matched_rules:
-            rules_str = ", ".join(matched_rules)
-            explanation = (
-                f"⚠️ MEDIUM RISK: This message shows suspicious characteristics and should be treated carefully. "
-                f"The following patterns were detected: {rules_str}. "
-                f"The AI confidence is {score_pct} with an overall risk score of {total_pct}. "
-                f"Verify the sender before taking any action."
-            )
-        else:
-            explanation = (
-                f"⚠️ MEDIUM RISK: This message shows suspicious characteristics based on the AI model "
-                f"(confidence: {score_pct}, risk score: {total_pct}). "
-                f"No specific rule patterns were triggered, but treat this message carefully "
-                f"and verify the sender's identity before responding."
-            )
-
-    else:  # LOW
-        if matched_rules:
-            rules_str = ", ".join(matched_rules)
-            explanation = (
-                f"ℹ️ LOW RISK: This message contains limited risk indicators. "
-                f"The following mild patterns were noted: {rules_str}. "
-                f"The AI model assigned a fraud confidence of only {score_pct} "
-                f"(risk score: {total_pct}). "
-                f"The message is likely safe, but always remain vigilant."
-            )
-        else:
-            explanation = (
-                f"✅ LOW RISK: This message appears safe. "
-                f"No suspicious rule patterns were detected and the AI model assigned "
-                f"a low fraud confidence of {score_pct} (risk score: {total_pct}). "
-                f"Always stay cautious with unsolicited messages."
-            )
-
+    template_id = explanation_template_id(risk_level, matched_rules)
     return {
-        "explanation":    explanation,
+        "explanation":    render_explanation(template_id, matched_rules, final_score, scam_probability),
+        "template_id":    template_id,
         "scam_type_info": _SCAM_TYPE_INFO.get(scam_type, _SCAM_TYPE_INFO["General Scam"]),
         "safety_advice":  _SAFETY_ADVICE.get(risk_level, _SAFETY_ADVICE["LOW"]),
     }
@@ -0,0 +1,101 @@
+"""
+features.py — shared normalized representation of one message
+
+Every stage used to re-derive its own view of the raw text: the rule engine,
+keyword scoring, phishing patterns and scam-type detection each lowercased
+it, `_clean_text` ran four `re.sub` passes (and ran again for contributing
+words and the campaign index), and `_build_dataframe` re-scanned for digits,
+URLs and uppercase words.
+
+`build_features` does that work once per request and every stage consumes
+the resulting `MessageFeatures`. Values are defined exactly as the notebook
+preprocessing defines them, so model inputs are byte-identical.
+"""
+import re
+from typing import List, Tuple
+
+# Keyword list used for keyword_score feature (mirrors notebook)
+FRAUD_KEYWORDS = [
+    "urgent", "immediately", "verify", "click", "otp", "kyc",
+    "suspend", "block", "account", "password", "credentials",
+    "bank", "upi", "won", "prize", "lottery", "free", "offer",
+    "confirm", "update", "expires", "limited", "act now",
+]
+
+# Phishing-pattern signals used for phishing_pattern feature
+PHISHING_PATTERNS = [
+    r"http[s]?://(?!(?:www\.)?(google|amazon|flipkart|irctc|sbi|hdfc|icici)\.)",
+    r"bit\.ly",
+    r"tinyurl",
+    r"\bclick here\b",
+    r"\bverify.*account\b",
+    r"\blog.?in.*link\b",
+]
+_PHISHING_RES = [re.compile(p) for p in PHISHING_PATTERNS]
+
+# clean_text in two passes instead of four:
+#   1. "http\S+" → urltoken and "\d+" → numtoken in one alternation (a URL
+#      always starts with "h", so neither branch can steal the other's match)
+#   2. any run of punctuation/whitespace → one space (same result as mapping
+#      punctuation to spaces and then collapsing whitespace runs)
+_URL_OR_NUM_RE = re.compile(r"(http\S+)|\d+")
+_SEPARATOR_RE = re.compile(r"(?:[^\w\s]|\s)+")
+_DIGIT_RE = re.compile(r"\d")
+_RAW_URL_RE = re.compile(r"http[s]?://\S+")
+
+
+def _url_or_num(m: "re.Match") -> str:
+    return " urltoken " if m.group(1) else " numtoken "
+
+
+def clean_lowered(text_lower: str) -> str:
+    """Notebook clean_text() applied to already-lowercased text."""
+    return _SEPARATOR_RE.sub(" ", _URL_OR_NUM_RE.sub(_url_or_num, text_lower)).strip()
+
+
+class MessageFeatures:
+    """Everything the rule, ML and scam-type stages read from a message."""
+
+    __slots__ = (
+        "text", "lower", "clean_text", "tokens",
+        "length", "num_digits", "num_exclaim", "num_upper", "num_urls",
+        "url_spans", "keyword_hits", "phishing_pattern",
+    )
+
+    def __init__(self, text: str):
+        text = str(text)
+        self.text = text
+        self.lower = text.lower()
+        self.clean_text = clean_lowered(self.lower)
+        self.tokens: List[str] = self.clean_text.split()
+
+        self.length = len(text)
+        self.num_digits = len(_DIGIT_RE.findall(text))
+        self.num_exclaim = text.count("!")
+        self.num_upper = sum(1 for w in text.split() if w.isupper())
+        self.url_spans: List[Tuple[int, int]] = [m.span() for m in _RAW_URL_RE.finditer(text)]
+        self.num_urls = len(self.url_spans)
+
+        lower = self.lower
+        self.keyword_hits: Tuple[str, ...] = tuple(kw for kw in FRAUD_KEYWORDS if kw in lower)
+        self.phishing_pattern = 1 if any(p.search(lower) for p in _PHISHING_RES) else 0
+
+    @property
+    def keyword_score(self) -> int:
+        return len(self.keyword_hits)
+
+    def numeric_row(self) -> dict:
+        """The seven numeric pipeline columns, in pipeline order."""
+        return {
+            "length":           self.length,
+            "num_digits":       self.num_digits,
+            "num_exclaim":      self.num_exclaim,
+            "num_upper":        self.num_upper,
+            "num_urls":         self.num_urls,
+            "keyword_score":    self.keyword_score,
+            "phishing_pattern": self.phishing_pattern,
+        }
+
+
+def build_features(text: str) -> MessageFeatures:
+    return MessageFeatures(text)
@@ -0,0 +1,56 @@
+"""
+indicators.py — extract URLs/domains, phone numbers and UPI handles from a
+message in a single regex scan, normalized for reputation lookups.
+"""
+import re
+from typing import Dict, List
+
+# One alternation, scanned once over the lowercased text. The lookahead on
+# the UPI branch keeps e-mail addresses ("name@bank.com") out of UPI handles.
+_INDICATOR_RE = re.compile(
+    r"(?P<url>\bhttps?://[^\s<>\"']+"
+    r"|\bwww\.[^\s<>\"']+"
+    r"|\b(?:[a-z0-9-]+\.)+(?:com|in|net|org|co|info|xyz|top|ly|me|io|app|online|site|link|click|help|live|shop|cc|tk)\b(?:/[^\s<>\"']*)?)"
+    r"|(?P<upi>\b[a-z0-9._-]{2,256}@[a-z]{2,64}\b(?!\.[a-z]))"
+    r"|(?P<phone>(?<![\d+])(?:\+?91[\s-]?|0)?[6-9]\d{4}[\s-]?\d{5}(?!\d))"
+)
+
+_URL_TRAILING = ".,;:!?)]}'\""
+
+
+def _domain(url: str) -> str:
+    host = url.split("://", 1)[-1]
+    for sep in "/?#":
+        host = host.split(sep, 1)[0]
+    host = host.rsplit("@", 1)[-1].split(":", 1)[0].strip(".")
+    return host[4:] if host.startswith("www.") else host
+
+
+def extract(text: str) -> Dict[str, List[str]]:
+    """
+    Return de-duplicated indicators found in `text`:
+        {"urls": [...], "domains": [...], "phones": [...], "upi": [...]}
+    Phones are normalized to their last 10 digits.
+    """
+    return extract_lower(text.lower())
+
+
+def extract_lower(text_lower: str) -> Dict[str, List[str]]:
+    """extract() for text that is already lowercased (e.g. MessageFeatures.lower)."""
+    found: Dict[str, List[str]] = {"urls": [], "domains": [], "phones": [], "upi": []}
+    seen = set()
+    for m in _INDICATOR_RE.finditer(text_lower):
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == "url":
+            value = value.rstrip(_URL_TRAILING)
+            pairs = [("urls", value), ("domains", _domain(value))]
+        elif kind == "phone":
+            pairs = [("phones", re.sub(r"\D", "", value)[-10:])]
+        else:
+            pairs = [("upi", value)]
+        for bucket, v in pairs:
+            if v and (bucket, v) not in seen:
+                seen.add((bucket, v))
+                found[bucket].append(v)
+    return found
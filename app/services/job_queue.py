@@ -0,0 +1,340 @@
+"""
+job_queue.py — durable local queue for bulk analysis jobs
+
+A job is an uploaded file of messages, too large for a synchronous request.
+Everything lives in its own SQLite file (JOBS_DB_PATH, WAL mode), so job
+traffic never contends with the main database and no broker is needed:
+
+    jobs          one row per job: owner, status, progress counters
+    job_messages  the input, (job_id, seq) → message
+    job_chunks    JOB_CHUNK_SIZE consecutive messages each, with a lease
+    job_results   one score row per message, written with its chunk
+
+Workers (job_worker.py, one or more processes) claim a chunk by leasing it
+for JOB_LEASE_SECONDS, score it through analysis_pipeline.analyze_batch and
+commit its results, the chunk's "done" mark and the job's progress in one
+transaction. A worker that dies mid-chunk commits nothing; its lease
+expires and the chunk is claimed again, so a crashed job resumes from its
+last committed chunk. A chunk whose lease keeps expiring (JOB_MAX_ATTEMPTS)
+fails its job instead of looping forever.
+
+Cancelling a job stops further chunks from being claimed; results already
+committed stay readable. Finished jobs are purged after JOB_RETENTION_HOURS.
+
+Status: submitting → queued → running → done | cancelled | failed
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# ─── Constants ─────────────────────────────────────────────────────────────────
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "./jobs.db")
+CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", "500"))
+LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+MAX_MESSAGES = int(os.getenv("JOB_MAX_MESSAGES", "1000000"))
+RETENTION_HOURS = int(os.getenv("JOB_RETENTION_HOURS", "168"))
+
+RESULT_COLUMNS = ("seq", "message", "risk_level", "final_score", "rule_score", "ai_score",
+                  "scam_type", "matched_rules", "suspicious_phrases", "error")
+_INSERT_BATCH = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT    PRIMARY KEY,
+    user_id     INTEGER NOT NULL,
+    filename    TEXT,
+    status      TEXT    NOT NULL,
+    total       INTEGER NOT NULL DEFAULT 0,
+    processed   INTEGER NOT NULL DEFAULT 0,
+    chunks      INTEGER NOT NULL DEFAULT 0,
+    chunks_done INTEGER NOT NULL DEFAULT 0,
+    created_at  TEXT    NOT NULL,
+    started_at  TEXT,
+    finished_at TEXT,
+    error       TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_user ON jobs (user_id, created_at);
+CREATE TABLE IF NOT EXISTS job_messages (
+    job_id  TEXT    NOT NULL,
+    seq     INTEGER NOT NULL,
+    message TEXT    NOT NULL,
+    PRIMARY KEY (job_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS job_chunks (
+    job_id        TEXT    NOT NULL,
+    chunk         INTEGER NOT NULL,
+    status        TEXT    NOT NULL DEFAULT 'pending',
+    lease_owner   TEXT,
+    lease_expires REAL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (job_id, chunk)
+);
+CREATE INDEX IF NOT EXISTS ix_job_chunks_status ON job_chunks (status, lease_expires);
+CREATE TABLE IF NOT EXISTS job_results (
+    job_id             TEXT    NOT NULL,
+    seq                INTEGER NOT NULL,
+    risk_level         TEXT,
+    final_score        REAL,
+    rule_score         REAL,
+    ai_score           REAL,
+    scam_type          TEXT,
+    matched_rules      TEXT,
+    suspicious_phrases TEXT,
+    error              TEXT,
+    PRIMARY KEY (job_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+class JobLimitError(ValueError):
+    """The upload exceeds JOB_MAX_MESSAGES or contains no messages."""
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+
+def connect(path: str = JOBS_DB_PATH) -> sqlite3.Connection:
+    """Connection in autocommit mode; transactions are explicit BEGIN IMMEDIATE."""
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+_local = threading.local()
+
+
+def connection() -> sqlite3.Connection:
+    """This thread's connection to JOBS_DB_PATH (created on first use)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = connect()
+    return conn
+
+
+class _Transaction:
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+# ─── Submission & status (API side) ───────────────────────────────────────────
+
+def submit(conn: sqlite3.Connection, user_id: int, messages: Iterable[str],
+           filename: Optional[str] = None) -> str:
+    """Store the messages and queue their chunks. Returns the job id."""
+    job_id = uuid.uuid4().hex
+    with _Transaction(conn):
+        conn.execute(
+            "INSERT INTO jobs (id, user_id, filename, status, created_at) VALUES (?, ?, ?, 'submitting', ?)",
+            (job_id, user_id, filename, _now()),
+        )
+    total, batch = 0, []
+    try:
+        for message in messages:
+            total += 1
+            if total > MAX_MESSAGES:
+                raise JobLimitError(f"A job may contain at most {MAX_MESSAGES} messages.")
+            batch.append((job_id, total - 1, message))
+            if len(batch) >= _INSERT_BATCH:
+                with _Transaction(conn):
+                    conn.executemany("INSERT INTO job_messages (job_id, seq, message) VALUES (?, ?, ?)", batch)
+                batch = []
+        if not total:
+            raise JobLimitError("The upload contains no messages.")
+        chunks = -(-total // CHUNK_SIZE)
+        with _Transaction(conn):
+            if batch:
+                conn.executemany("INSERT INTO job_messages (job_id, seq, message) VALUES (?, ?, ?)", batch)
+            conn.executemany(
+                "INSERT INTO job_chunks (job_id, chunk) VALUES (?, ?)",
+                ((job_id, n) for n in range(chunks)),
+            )
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', total = ?, chunks = ? WHERE id = ? AND status = 'submitting'",
+                (total, chunks, job_id),
+            )
+    except BaseException:
+        _delete(conn, [job_id])
+        raise
+    return job_id
+
+
+def get(conn: sqlite3.Connection, job_id: str) -> Optional[Dict]:
+    row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def list_jobs(conn: sqlite3.Connection, user_id: int, limit: int = 50) -> List[Dict]:
+    rows = conn.execute(
+        "SELECT * FROM jobs WHERE user_id = ? ORDER BY created_at DESC LIMIT ?", (user_id, limit)
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def cancel(conn: sqlite3.Connection, job_id: str) -> bool:
+    """Stop claiming the job's remaining chunks. False if it had already finished."""
+    with _Transaction(conn):
+        cur = conn.execute(
+            "UPDATE jobs SET status = 'cancelled', finished_at = ? "
+            "WHERE id = ? AND status IN ('submitting', 'queued', 'running')",
+            (_now(), job_id),
+        )
+    return cur.rowcount > 0
+
+
+def _result_row(row: sqlite3.Row) -> Dict:
+    out = dict(row)
+    out["matched_rules"] = json.loads(out["matched_rules"]) if out["matched_rules"] else []
+    out["suspicious_phrases"] = json.loads(out["suspicious_phrases"]) if out["suspicious_phrases"] else []
+    return out
+
+
+_RESULTS_SQL = (
+    "SELECT r.seq, m.message, r.risk_level, r.final_score, r.rule_score, r.ai_score, r.scam_type, "
+    "r.matched_rules, r.suspicious_phrases, r.error "
+    "FROM job_results r JOIN job_messages m ON m.job_id = r.job_id AND m.seq = r.seq "
+    "WHERE r.job_id = ? AND r.seq > ? ORDER BY r.seq LIMIT ?"
+)
+
+
+def results_page(conn: sqlite3.Connection, job_id: str, after: int = -1, limit: int = 100) -> List[Dict]:
+    """Results with seq > after, in input order (keyset pagination)."""
+    return [_result_row(r) for r in conn.execute(_RESULTS_SQL, (job_id, after, limit))]
+
+
+def iter_results(conn: sqlite3.Connection, job_id: str, batch: int = 1000) -> Iterator[Dict]:
+    """Every result committed so far, in input order, read batch by batch."""
+    after = -1
+    while True:
+        page = results_page(conn, job_id, after, batch)
+        yield from page
+        if len(page) < batch:
+            return
+        after = page[-1]["seq"]
+
+
+# ─── Worker side ──────────────────────────────────────────────────────────────
+
+def claim(conn: sqlite3.Connection, worker_id: str) -> Optional[Tuple[str, int, List[Tuple[int, str]]]]:
+    """
+    Lease the oldest claimable chunk: pending, or leased with an expired
+    lease. Returns (job_id, chunk, [(seq, message)]) or None when idle.
+    """
+    now = time.time()
+    with _Transaction(conn):
+        row = conn.execute(
+            "SELECT c.job_id, c.chunk, c.attempts FROM job_chunks c JOIN jobs j ON j.id = c.job_id "
+            "WHERE j.status IN ('queued', 'running') "
+            "AND (c.status = 'pending' OR (c.status = 'leased' AND c.lease_expires < ?)) "
+            "ORDER BY j.created_at, c.chunk LIMIT 1",
+            (now,),
+        ).fetchone()
+        if row is None:
+            return None
+        job_id, chunk, attempts = row["job_id"], row["chunk"], row["attempts"]
+        if attempts >= MAX_ATTEMPTS:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', finished_at = ?, error = ? WHERE id = ?",
+                (_now(), f"chunk {chunk} did not complete after {attempts} attempts", job_id),
+            )
+            return None
+        conn.execute(
+            "UPDATE job_chunks SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+            "attempts = attempts + 1 WHERE job_id = ? AND chunk = ?",
+            (worker_id, now + LEASE_SECONDS, job_id, chunk),
+        )
+        conn.execute(
+            "UPDATE jobs SET status = 'running', started_at = COALESCE(started_at, ?) "
+            "WHERE id = ? AND status = 'queued'",
+            (_now(), job_id),
+        )
+        messages = conn.execute(
+            "SELECT seq, message FROM job_messages WHERE job_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+            (job_id, chunk * CHUNK_SIZE, (chunk + 1) * CHUNK_SIZE),
+        ).fetchall()
+    return job_id, chunk, [(m["seq"], m["message"]) for m in messages]
+
+
+def complete(conn: sqlite3.Connection, worker_id: str, job_id: str, chunk: int,
+             results: List[Tuple[int, Dict]]) -> bool:
+    """
+    Commit a chunk's results atomically with its progress. Returns False (and
+    writes nothing) if the lease was lost or the job is no longer running.
+    """
+    with _Transaction(conn):
+        owned = conn.execute(
+            "SELECT 1 FROM job_chunks c JOIN jobs j ON j.id = c.job_id "
+            "WHERE c.job_id = ? AND c.chunk = ? AND c.status = 'leased' AND c.lease_owner = ? "
+            "AND j.status = 'running'",
+            (job_id, chunk, worker_id),
+        ).fetchone()
+        if owned is None:
+            return False
+        conn.executemany(
+            "INSERT OR REPLACE INTO job_results (job_id, seq, risk_level, final_score, rule_score, ai_score, "
+            "scam_type, matched_rules, suspicious_phrases, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (job_id, seq, r.get("risk_level"), r.get("final_score"), r.get("rule_score"), r.get("ai_score"),
+                 r.get("scam_type"), json.dumps(r.get("matched_rules", []), ensure_ascii=False),
+                 json.dumps(r.get("suspicious_phrases", []), ensure_ascii=False), r.get("error"))
+                for seq, r in results
+            ],
+        )
+        conn.execute(
+            "UPDATE job_chunks SET status = 'done', lease_owner = NULL, lease_expires = NULL "
+            "WHERE job_id = ? AND chunk = ?",
+            (job_id, chunk),
+        )
+        conn.execute(
+            "UPDATE jobs SET processed = processed + ?, chunks_done = chunks_done + 1 WHERE id = ?",
+            (len(results), job_id),
+        )
+        conn.execute(
+            "UPDATE jobs SET status = 'done', finished_at = ? WHERE id = ? AND chunks_done = chunks",
+            (_now(), job_id),
+        )
+    return True
+
+
+def release(conn: sqlite3.Connection, worker_id: str, job_id: str, chunk: int) -> None:
+    """Give a chunk back after a processing error (counts as an attempt)."""
+    with _Transaction(conn):
+        conn.execute(
+            "UPDATE job_chunks SET status = 'pending', lease_owner = NULL, lease_expires = NULL "
+            "WHERE job_id = ? AND chunk = ? AND lease_owner = ?",
+            (job_id, chunk, worker_id),
+        )
+
+
+def _delete(conn: sqlite3.Connection, job_ids: List[str]) -> None:
+    with _Transaction(conn):
+        for table in ("job_results", "job_chunks", "job_messages", "jobs"):
+            column = "id" if table == "jobs" else "job_id"
+            conn.executemany(f"DELETE FROM {table} WHERE {column} = ?", [(j,) for j in job_ids])
+
+
+def purge(conn: sqlite3.Connection, hours: int = RETENTION_HOURS) -> int:
+    """Delete finished jobs older than `hours`. Returns jobs deleted."""
+    cutoff = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
+    job_ids = [r["id"] for r in conn.execute(
+        "SELECT id FROM jobs WHERE status IN ('done', 'cancelled', 'failed') AND finished_at < ?", (cutoff,)
+    )]
+    if job_ids:
+        _delete(conn, job_ids)
+    return len(job_ids)
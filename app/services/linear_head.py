@@ -0,0 +1,202 @@
+"""
+linear_head.py — the loaded Pipeline viewed as plain linear algebra
+
+Every ensemble member in model.pkl is linear over the ColumnTransformer
+output x = [tfidf(clean_text) | standardized numerics]:
+
+    lr   : p = expit(w·x + b)
+    svm  : CalibratedClassifierCV over LinearSVC folds,
+           p = mean_k calibrator_k(w_k·x + b_k)
+    final: soft vote, p = average(p_lr, p_svm)
+
+Exposing the coefficients lets callers keep running dot products instead
+of re-featurizing whole documents (thread scoring, live re-scoring) and
+score cheaply when sklearn's generic path is too heavy.
+
+The TF-IDF row is sublinear tf × idf, L2-normalized, so for a document with
+n-gram counts c_t:
+
+    weight_t = (1 + ln c_t) · idf_t
+    w·x_text = Σ_t coef_t · weight_t / sqrt(Σ_t weight_t²)
+
+`get_head()` returns the head for the currently loaded pipeline and rebuilds
+it if ml_model swaps the pipeline.
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy.special import expit
+
+from app.services import ml_model, ngram_vectorizer
+
+
+class LinearHead:
+    """Coefficients and preprocessing constants extracted from a fitted Pipeline."""
+
+    def __init__(self, pipeline):
+        pre = pipeline.named_steps.get("preprocessor") or pipeline.steps[0][1]
+        tfidf = pre.named_transformers_["text"]
+        scaler = pre.named_transformers_["num"]
+        if not getattr(tfidf, "sublinear_tf", False) or tfidf.norm != "l2":
+            raise ValueError("linear head expects a sublinear, L2-normalized TfidfVectorizer")
+
+        self.pipeline = pipeline
+        self.tfidf = tfidf
+        self.analyzer = tfidf.build_analyzer()
+        self.preprocess = tfidf.build_preprocessor()
+        self.tokenize = tfidf.build_tokenizer()
+        self.stop_words = tfidf.get_stop_words()
+        self.ngram_range: Tuple[int, int] = tfidf.ngram_range
+        self.vocabulary: Dict[str, int] = tfidf.vocabulary_
+        self.idf = np.asarray(tfidf.idf_, dtype=np.float64)
+        self.n_text = len(self.idf)
+        self.mean = np.asarray(scaler.mean_, dtype=np.float64)
+        self.scale = np.asarray(scaler.scale_, dtype=np.float64)
+        fast = ngram_vectorizer.for_pipeline(pipeline)
+        self.ngrams = fast.text if fast is not None else None
+
+        # Flatten every linear model into rows of one coefficient matrix and
+        # remember how their probabilities are combined.
+        clf = pipeline.steps[-1][1]
+        estimators = getattr(clf, "estimators_", [clf])
+        coefs, intercepts = [], []
+        self.voters: List[Tuple[List[int], List]] = []   # (row ids, calibrators or [None])
+        for est in estimators:
+            rows, calibrators = [], []
+            if hasattr(est, "calibrated_classifiers_"):
+                for cc in est.calibrated_classifiers_:
+                    coefs.append(np.ravel(cc.estimator.coef_))
+                    intercepts.append(float(np.ravel(cc.estimator.intercept_)[0]))
+                    rows.append(len(coefs) - 1)
+                    calibrators.append(cc.calibrators[0])
+            elif hasattr(est, "coef_"):
+                coefs.append(np.ravel(est.coef_))
+                intercepts.append(float(np.ravel(est.intercept_)[0]))
+                rows.append(len(coefs) - 1)
+                calibrators.append(None)
+            else:
+                raise ValueError(f"unsupported ensemble member: {type(est).__name__}")
+            self.voters.append((rows, calibrators))
+
+        weights = getattr(clf, "weights", None)
+        self.voter_weights = None if weights is None else np.asarray(weights, dtype=np.float64)
+
+        coef = np.vstack(coefs).astype(np.float64)
+        # (n_text, n_members), row-major so one n-gram's coefficients are contiguous
+        self.text_coef = np.ascontiguousarray(coef[:, :self.n_text].T)
+        self.num_coef = coef[:, self.n_text:]
+        self.intercept = np.asarray(intercepts, dtype=np.float64)
+        self.n_members = coef.shape[0]
+
+    # ── featurization ──
+    def ngram_counts(self, clean_text: str) -> Dict[int, int]:
+        """In-vocabulary n-gram counts of a cleaned text, keyed by feature index."""
+        if self.ngrams is not None:
+            return self.ngrams.counts(clean_text)
+        counts: Dict[int, int] = {}
+        vocab = self.vocabulary
+        for gram in self.analyzer(clean_text):
+            idx = vocab.get(gram)
+            if idx is not None:
+                counts[idx] = counts.get(idx, 0) + 1
+        return counts
+
+    def tokens(self, clean_text: str) -> List[str]:
+        """The word tokens analyzer() builds its n-grams from."""
+        tokens = self.tokenize(self.preprocess(clean_text))
+        if self.stop_words is not None:
+            tokens = [t for t in tokens if t not in self.stop_words]
+        return tokens
+
+    def term_weight(self, idx: int, count: int) -> float:
+        """Un-normalized sublinear tf·idf weight of one feature."""
+        return (1.0 + np.log(count)) * self.idf[idx] if count > 0 else 0.0
+
+    def scale_numeric(self, numeric: Iterable[float]) -> np.ndarray:
+        return (np.asarray(list(numeric), dtype=np.float64) - self.mean) / self.scale
+
+    # ── scoring ──
+    def text_dots(self, counts: Dict[int, int]) -> Tuple[np.ndarray, float]:
+        """(Σ coef·weight per member, Σ weight²) of a count vector, un-normalized."""
+        if not counts:
+            return np.zeros(self.n_members), 0.0
+        idx = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        cnt = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        weights = (1.0 + np.log(cnt)) * self.idf[idx]
+        return weights @ self.text_coef[idx], float(weights @ weights)
+
+    def probability(self, dots: np.ndarray, sq_norm: float, scaled_numeric: np.ndarray) -> float:
+        """Ensemble scam probability from running text dot products and numerics."""
+        text_part = dots / np.sqrt(sq_norm) if sq_norm > 0 else np.zeros(self.n_members)
+        decision = text_part + self.num_coef @ scaled_numeric + self.intercept
+
+        voter_probs = []
+        for rows, calibrators in self.voters:
+            probs = []
+            for row, calibrator in zip(rows, calibrators):
+                if calibrator is None:
+                    probs.append(float(expit(decision[row])))
+                else:
+                    probs.append(float(calibrator.predict(decision[row:row + 1])[0]))
+            voter_probs.append(sum(probs) / len(probs))
+        return float(np.average(voter_probs, weights=self.voter_weights))
+
+    def score_counts(self, counts: Dict[int, int], numeric: Iterable[float]) -> float:
+        dots, sq_norm = self.text_dots(counts)
+        return self.probability(dots, sq_norm, self.scale_numeric(numeric))
+
+
+class RunningVector:
+    """
+    An n-gram count vector with its per-member dot products and squared norm
+    kept up to date, so adding or removing n-grams costs O(changed terms).
+    """
+
+    def __init__(self, head: LinearHead):
+        self.head = head
+        self.counts: Dict[int, int] = {}
+        self.dots = np.zeros(head.n_members)
+        self.sq_norm = 0.0
+        self.terms = 0          # non-zero counts (also right when only some counts are loaded)
+
+    def add(self, idx: int, delta: int) -> None:
+        head = self.head
+        old = self.counts.get(idx, 0)
+        new = old + delta
+        old_w = head.term_weight(idx, old)
+        new_w = head.term_weight(idx, new)
+        self.dots += head.text_coef[idx] * (new_w - old_w)
+        self.sq_norm += new_w * new_w - old_w * old_w
+        if new:
+            self.counts[idx] = new
+        else:
+            del self.counts[idx]
+        self.terms += bool(new) - bool(old)
+
+    def resync(self) -> None:
+        """Recompute dots and sq_norm from the counts, discarding accumulated rounding."""
+        self.dots, self.sq_norm = self.head.text_dots(self.counts)
+        self.terms = len(self.counts)
+
+    def probability(self, numeric: Iterable[float]) -> float:
+        if not self.terms:
+            self.sq_norm = 0.0   # drop accumulated rounding once the vector is empty
+        return self.head.probability(self.dots, max(self.sq_norm, 0.0), self.head.scale_numeric(numeric))
+
+
+_head: Optional[LinearHead] = None
+_head_lock = threading.Lock()
+
+
+def get_head() -> LinearHead:
+    """Linear head of the pipeline ml_model is currently serving."""
+    global _head
+    pipeline = ml_model._pipeline
+    head = _head
+    if head is None or head.pipeline is not pipeline:
+        with _head_lock:
+            if _head is None or _head.pipeline is not pipeline:
+                _head = LinearHead(pipeline)
+            head = _head
+    return head
@@ -0,0 +1,107 @@
+"""
+live_scoring.py — re-scoring a message while it is being typed or edited
+
+A LiveSession belongs to one WebSocket connection and remembers the token
+list of the last text it scored together with that text's TF-IDF count
+vector (linear_head.RunningVector). An edit usually changes a small window
+in the middle of the text, so on update:
+
+  1. the new text is tokenized and compared with the previous tokens to find
+     the common prefix and suffix
+  2. only n-grams that are not entirely inside the unchanged prefix or suffix
+     are removed (old tokens) and added (new tokens) — roughly the edited
+     window plus (max_n - 1) tokens on each side
+  3. the ensemble probability comes from the running dot products
+
+Rules, numeric features and fusion are recomputed on the whole text (they
+are linear regex scans and cheap next to the model). No campaign lookup,
+contributing words, explanation or persistence happen here; the client's
+final submit goes through the normal analysis pipeline.
+"""
+import os
+import threading
+from typing import Dict, List, Optional
+
+from app.services import ml_model, rule_engine, fusion_engine
+from app.services.features import build_features
+from app.services.linear_head import RunningVector, get_head
+
+# ─── Constants ─────────────────────────────────────────────────────────────────
+# Recompute the running vector from its counts every N updates so rounding
+# from many add/remove steps cannot drift the score.
+RESYNC_EVERY = int(os.getenv("LIVE_RESYNC_EVERY", "200"))
+
+
+def _common_affixes(old: List[str], new: List[str]):
+    """Lengths of the common prefix and (non-overlapping) common suffix."""
+    limit = min(len(old), len(new))
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    limit -= prefix
+    while suffix < limit and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    return prefix, suffix
+
+
+class LiveSession:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.head = get_head()
+        self.vector = RunningVector(self.head)
+        self.tokens: List[str] = []
+        self.text: Optional[str] = None
+        self.result: Optional[Dict] = None
+        self.updates = 0
+
+    def _apply(self, tokens: List[str], start: int, stop: int, delta: int) -> None:
+        # n-grams of `tokens` overlapping [start, stop) or spanning its edges
+        vocab = self.head.vocabulary
+        min_n, max_n = self.head.ngram_range
+        for n in range(min_n, max_n + 1):
+            for i in range(max(0, start - n + 1), min(stop, len(tokens) - n + 1)):
+                idx = vocab.get(" ".join(tokens[i:i + n]))
+                if idx is not None:
+                    self.vector.add(idx, delta)
+
+    def update(self, text: str) -> Dict:
+        """Score the current text, reusing n-gram counts of the unchanged parts."""
+        with self.lock:
+            if text == self.text:
+                return self.result
+            if self.head is not get_head():   # model was reloaded
+                self._reset()
+
+            f = build_features(text)
+            tokens = self.head.tokens(f.clean_text)
+            old = self.tokens
+            prefix, suffix = _common_affixes(old, tokens)
+            self._apply(old, prefix, len(old) - suffix, -1)
+            self._apply(tokens, prefix, len(tokens) - suffix, +1)
+            self.tokens = tokens
+
+            self.updates += 1
+            if self.updates % RESYNC_EVERY == 0:
+                self.vector.resync()
+
+            scam_probability = self.vector.probability(f.numeric_row().values())
+            rule_result = rule_engine.analyze_rules(text, f)
+            ai_score = round(scam_probability, 4)   # fused exactly as ml_model.predict reports it
+            fusion_result = fusion_engine.fuse_scores(
+                rule_score=rule_result["rule_score"],
+                scam_probability=ai_score,
+            )
+            self.text = text
+            self.result = {
+                "risk_level":    fusion_result["risk_level"],
+                "final_score":   fusion_result["final_score"],
+                "rule_score":    rule_result["rule_score"],
+                "ai_score":      ai_score,
+                "scam_type":     ml_model._detect_scam_type(text, scam_probability, f.lower),
+                "matched_rules": rule_result["matched_rules"],
+            }
+            return self.result
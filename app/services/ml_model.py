@@ -7,44 +7,56 @@ Loads the sklearn Pipeline (model.pkl) which contains:
   - VotingClassifier (Logistic Regression + SVM ensemble)
 
 Input to predict_proba() must be a pandas DataFrame with ALL 8 columns above.
+predict() and predict_batch() build the preprocessor's output directly
+(ngram_vectorizer, bit-for-bit the same matrix) and call the classifier.
 """
 import os
 import re
 import html
+import time
+import hashlib
+import logging
 import joblib
 import numpy as np
 import pandas as pd
-from typing import List, Dict
+from scipy import sparse
+from typing import List, Dict, Optional
+
+from app.services import ngram_vectorizer
+from app.services.features import (
+    MessageFeatures, build_features, clean_lowered, FRAUD_KEYWORDS, PHISHING_PATTERNS,
+)
+
+logger = logging.getLogger(__name__)
 
 # ─── Constants ─────────────────────────────────────────────────────────────────
 BEST_THRESHOLD = 0.4052312960713096  # calibrated threshold from notebook training
 
 BASE_DIR   = os.path.dirname(os.path.abspath(__file__))
-MODEL_PATH = os.path.abspath(os.path.join(BASE_DIR, "..", "models", "model.pkl"))
-
-# Keyword list used for keyword_score feature (mirrors notebook)
-_FRAUD_KEYWORDS = [
-    "urgent", "immediately", "verify", "click", "otp", "kyc",
-    "suspend", "block", "account", "password", "credentials",
-    "bank", "upi", "won", "prize", "lottery", "free", "offer",
-    "confirm", "update", "expires", "limited", "act now",
-]
+MODEL_PATH = os.getenv("MODEL_PATH") or os.path.abspath(os.path.join(BASE_DIR, "..", "models", "model.pkl"))
 
-# Phishing-pattern signals used for phishing_pattern feature
-_PHISHING_PATTERNS = [
-    r"http[s]?://(?!(?:www\.)?(google|amazon|flipkart|irctc|sbi|hdfc|icici)\.)",
-    r"bit\.ly",
-    r"tinyurl",
-    r"\bclick here\b",
-    r"\bverify.*account\b",
-    r"\blog.?in.*link\b",
-]
+
+def artifact_version(path: str) -> str:
+    """Short content hash identifying a model artifact."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+# Keyword and phishing-pattern definitions live with the shared message features
+_FRAUD_KEYWORDS = FRAUD_KEYWORDS
+_PHISHING_PATTERNS = PHISHING_PATTERNS
 
 # ─── Pipeline load ─────────────────────────────────────────────────────────────
+_load_start = time.perf_counter()
 try:
     _pipeline = joblib.load(MODEL_PATH)
-    print(f"[FraudShield] ✅ Pipeline loaded : {MODEL_PATH}")
-    print(f"[FraudShield] ✅ Best threshold  : {BEST_THRESHOLD}")
+    logger.info("Pipeline loaded in %.1f ms: %s", (time.perf_counter() - _load_start) * 1000, MODEL_PATH)
+    logger.info("Best threshold: %s", BEST_THRESHOLD)
+    MODEL_VERSION = os.getenv("MODEL_VERSION") or artifact_version(MODEL_PATH)
+    logger.info("Model version: %s", MODEL_VERSION)
 except Exception as e:
     raise RuntimeError(
         f"\n[FraudShield] FATAL: Cannot load model.pkl\n"
@@ -53,16 +65,21 @@ except Exception as e:
     ) from e
 
 
+def swap_pipeline(pipeline, version: str) -> None:
+    """
+    Serve `pipeline` as model `version` from now on (model_updates hot reload).
+    Predictions already running finish on the previous pipeline.
+    """
+    global _pipeline, MODEL_VERSION
+    _pipeline, MODEL_VERSION = pipeline, version
+    logger.info("Now serving model version %s", version)
+
+
 # ─── Feature engineering (must EXACTLY mirror notebook preprocessing) ──────────
 
 def _clean_text(text: str) -> str:
     """Identical to the notebook's clean_text() function."""
-    text = str(text).lower()
-    text = re.sub(r"http\S+", " urltoken ", text)
-    text = re.sub(r"\d+", " numtoken ", text)
-    text = re.sub(r"[^\w\s]", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+    return clean_lowered(str(text).lower())
 
 
 def _phishing_pattern(text: str) -> int:
@@ -80,51 +97,72 @@ def _keyword_score(text: str) -> int:
     return sum(1 for kw in _FRAUD_KEYWORDS if kw in text_lower)
 
 
-def _build_dataframe(text: str) -> pd.DataFrame:
+def _build_dataframe(text: str, features: Optional[MessageFeatures] = None) -> pd.DataFrame:
     """
     Build the 8-column DataFrame expected by the pipeline's ColumnTransformer.
     Columns:
       clean_text, length, num_digits, num_exclaim, num_upper,
       num_urls, keyword_score, phishing_pattern
     """
-    clean = _clean_text(text)
-    return pd.DataFrame([{
-        "clean_text":       clean,
-        "length":           len(text),
-        "num_digits":       len(re.findall(r"\d", text)),
-        "num_exclaim":      text.count("!"),
-        "num_upper":        sum(1 for w in text.split() if w.isupper()),
-        "num_urls":         len(re.findall(r"http[s]?://\S+", text)),
-        "keyword_score":    _keyword_score(text),
-        "phishing_pattern": _phishing_pattern(text),
-    }])
+    return _build_batch_dataframe([features or build_features(text)])
+
+
+def _build_batch_dataframe(features: List[MessageFeatures]) -> pd.DataFrame:
+    """_build_dataframe for many messages, one row each."""
+    rows = []
+    for f in features:
+        row = {"clean_text": f.clean_text}
+        row.update(f.numeric_row())
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def classifier_input(features: List[MessageFeatures], pipeline=None) -> sparse.csr_matrix:
+    """
+    What `pipeline`'s preprocessor (default: the one being served) outputs for
+    these messages: the classifier's input rows, as CSR.
+    """
+    pipeline = pipeline or _pipeline
+    fast = ngram_vectorizer.for_pipeline(pipeline)
+    if fast is not None:
+        return fast.transform(features)
+    pre = pipeline.named_steps.get("preprocessor") or pipeline.steps[0][1]
+    return sparse.csr_matrix(pre.transform(_build_batch_dataframe(features)))
 
 
 # ─── Feature importance extraction (TF-IDF + classifier coefficients) ─────────
 
-def _get_contributing_words(text: str, top_n: int = 10) -> List[Dict]:
+def _get_contributing_words(text: str, top_n: int = 10, clean: Optional[str] = None) -> List[Dict]:
     """
     Extract the top-N words with highest impact on the fraud score.
-    Works by accessing the TF-IDF step inside the ColumnTransformer.
+    Works by accessing the fitted TF-IDF step inside the ColumnTransformer
+    (through ngram_vectorizer when the pipeline supports it).
     Falls back to an empty list if the pipeline structure can't be probed.
     """
     try:
-        # Navigate into: pipeline → preprocessor (ColumnTransformer) → 'text' transformer
-        pre = _pipeline.named_steps.get("preprocessor") or _pipeline.steps[0][1]
-        tfidf = None
-        for t_name, t_obj, t_cols in pre.transformers:
-            if "clean_text" in (t_cols if isinstance(t_cols, list) else [t_cols]):
-                # t_obj may be a bare TfidfVectorizer or a Pipeline with one
-                tfidf = t_obj if hasattr(t_obj, "transform") else None
-                break
-        if tfidf is None:
-            return []
-
-        clean = _clean_text(text)
-        tfidf_mat = tfidf.transform([clean])
+        pipeline = _pipeline
+        if clean is None:
+            clean = _clean_text(text)
+        fast = ngram_vectorizer.for_pipeline(pipeline)
+        if fast is not None:
+            tfidf_mat = fast.text.transform([clean])
+            feature_names = fast.text.feature_names
+        else:
+            # Navigate into: pipeline → preprocessor (ColumnTransformer) → fitted 'text' transformer
+            pre = pipeline.named_steps.get("preprocessor") or pipeline.steps[0][1]
+            tfidf = None
+            for t_name, t_obj, t_cols in pre.transformers_:
+                if "clean_text" in (t_cols if isinstance(t_cols, list) else [t_cols]):
+                    # t_obj may be a bare TfidfVectorizer or a Pipeline with one
+                    tfidf = t_obj if hasattr(t_obj, "transform") else None
+                    break
+            if tfidf is None:
+                return []
+            tfidf_mat = tfidf.transform([clean])
+            feature_names = tfidf.get_feature_names_out()
 
         # Retrieve classifier coefficients (LR inside VotingClassifier)
-        clf_step = _pipeline.steps[-1][1]
+        clf_step = pipeline.steps[-1][1]
         coef = None
         if hasattr(clf_step, "estimators_"):
             for est in clf_step.estimators_:
@@ -137,13 +175,12 @@ def _get_contributing_words(text: str, top_n: int = 10) -> List[Dict]:
         if coef is None:
             return []
 
-        feature_names = np.array(tfidf.get_feature_names_out())
-        present_idx = tfidf_mat.nonzero()[1]
+        present_idx = tfidf_mat.indices
         n_text_features = len(feature_names)
 
         # Only use coefficients for the TF-IDF feature range
         text_coef = coef[:n_text_features] if len(coef) > n_text_features else coef
-        impacts = np.abs(text_coef[present_idx] * tfidf_mat[0, present_idx].toarray()[0])
+        impacts = np.abs(text_coef[present_idx] * tfidf_mat.data)
 
         top_idx = np.argsort(impacts)[::-1][:top_n]
         return [
@@ -165,14 +202,23 @@ def _build_highlighted_text(raw_text: str, contributing_words: List[Dict]) -> st
         [w["word"] for w in contributing_words[:8] if len(w["word"]) > 2],
         key=len, reverse=True,
     )
-    escaped = html.escape(raw_text)
-    for word in top_words:
-        ew = html.escape(word)
-        escaped = re.compile(re.escape(ew), re.IGNORECASE).sub(
-            lambda m: f'<mark class="highlight-word">{m.group(0)}</mark>',
-            escaped, count=5,
-        )
-    return escaped
+    if not top_words:
+        return html.escape(raw_text)
+    # One pass over the escaped text, longest word first at each position, so
+    # marks never nest and never match inside an entity or an earlier tag
+    pattern = re.compile(
+        r"(&#?\w+;)|" + "|".join(re.escape(html.escape(w)) for w in top_words), re.IGNORECASE
+    )
+    marked: Dict[str, int] = {}
+
+    def mark(m: re.Match) -> str:
+        key = m.group(0).lower()
+        if m.group(1) or marked.get(key, 0) >= 5:     # entities stay whole; at most 5 marks per word
+            return m.group(0)
+        marked[key] = marked.get(key, 0) + 1
+        return f'<mark class="highlight-word">{m.group(0)}</mark>'
+
+    return pattern.sub(mark, html.escape(raw_text))
 
 
 # ─── Scam type detection (rule-based fallback) ────────────────────────────────
@@ -186,24 +232,40 @@ _SCAM_TYPE_MAP = {
     "Job / Work-from-Home Scam":  [r"job offer", r"work from home"],
     "Courier Scam":               [r"\bparcel\b", r"\bcourier\b"],
 }
+_SCAM_TYPE_RES = [
+    (scam_type, [re.compile(p) for p in patterns])
+    for scam_type, patterns in _SCAM_TYPE_MAP.items()
+]
 
-def _detect_scam_type(text: str, scam_probability: float) -> str:
+def _detect_scam_type(text: str, scam_probability: float, text_lower: Optional[str] = None) -> str:
     # If ML says it's safe, always label as legitimate — no keyword override
     if scam_probability < BEST_THRESHOLD:
         return "Legitimate Message"
-    text_lower = text.lower()
-    for scam_type, patterns in _SCAM_TYPE_MAP.items():
+    if text_lower is None:
+        text_lower = text.lower()
+    for scam_type, patterns in _SCAM_TYPE_RES:
         for p in patterns:
-            if re.search(p, text_lower):
+            if p.search(text_lower):
                 return scam_type
     return "Fraudulent Message"
 
 
+def _scam_types_present(text_lower: str) -> List[str]:
+    """All scam types whose patterns match, in _SCAM_TYPE_MAP priority order."""
+    return [
+        scam_type for scam_type, patterns in _SCAM_TYPE_RES
+        if any(p.search(text_lower) for p in patterns)
+    ]
+
+
 # ─── Public predict function ───────────────────────────────────────────────────
 
-def predict(text: str) -> Dict:
+def predict(text: str, features: Optional[MessageFeatures] = None, explain: bool = True) -> Dict:
     """
-    Run full pipeline inference on a raw message string.
+    Run full pipeline inference on a raw message string. Pass the request's
+    MessageFeatures to reuse its normalized text instead of re-deriving it.
+    With explain=False the contributing-word extraction is skipped (empty
+    list, highlighted_text is the escaped message).
 
     Returns:
         {
@@ -213,15 +275,35 @@ def predict(text: str) -> Dict:
             "highlighted_text"  : str  (safe HTML),
         }
     """
-    df = _build_dataframe(text)
-    scam_probability = float(_pipeline.predict_proba(df)[0][1])
-    scam_type = _detect_scam_type(text, scam_probability)
-    contributing_words = _get_contributing_words(text)
-    highlighted_text = _build_highlighted_text(text, contributing_words)
+    f = features or build_features(text)
+    pipeline = _pipeline
+    scam_probability = float(pipeline.steps[-1][1].predict_proba(classifier_input([f], pipeline))[0][1])
+    scam_type = _detect_scam_type(text, scam_probability, f.lower)
+    contributing_words = _get_contributing_words(text, clean=f.clean_text) if explain else []
+    highlighted_text = _build_highlighted_text(text, contributing_words) if explain else html.escape(text)
 
     return {
         "scam_probability":   round(scam_probability, 4),
         "scam_type":          scam_type,
         "contributing_words": contributing_words,
         "highlighted_text":   highlighted_text,
-    }
\ No newline at end of file
+    }
+
+
+def predict_batch(texts: List[str], features: Optional[List[MessageFeatures]] = None) -> List[Dict]:
+    """
+    scam_probability and scam_type for many messages with one predict_proba
+    call (same values as predict(); no explanation). For bulk jobs.
+    """
+    if not texts:
+        return []
+    features = features or [build_features(t) for t in texts]
+    pipeline = _pipeline
+    probabilities = pipeline.steps[-1][1].predict_proba(classifier_input(features, pipeline))[:, 1]
+    return [
+        {
+            "scam_probability": round(float(p), 4),
+            "scam_type":        _detect_scam_type(t, float(p), f.lower),
+        }
+        for t, f, p in zip(texts, features, probabilities)
+    ]
@@ -0,0 +1,406 @@
+"""
+model_updates.py — incremental model updates from user feedback
+
+POST /api/feedback stores a user's verdict on one of their analyses, with
+the message copied into `feedback`. Instead of waiting for an offline
+retrain of the whole pipeline, a background thread folds new feedback into
+the served model:
+
+  1. Copy the serving pipeline and fine-tune the TF-IDF coefficients of its
+     logistic-regression member with a few epochs of mini-batch SGD on log
+     loss over the feedback rows (weighted, see below), pulled back towards
+     their current values by an L2 anchor, so a handful of examples nudge
+     the model rather than retrain it. The numeric-feature weights and the
+     intercept stay fixed: they move every message, whereas a text weight
+     only moves messages containing that n-gram. Vocabulary, IDF, scaler,
+     the SVM member and the soft vote are untouched: same features, same
+     coefficient shapes, same inference cost.
+  2. Score the copy and the serving model on the held-out corpus
+     (MODEL_HOLDOUT_PATH: CSV with `text` and 0/1 `label` columns) and on
+     the feedback batch. The copy is published only if holdout AUC and F1
+     drop by at most MODEL_UPDATE_MAX_DROP and (weighted) feedback accuracy
+     does not drop.
+  3. Publishing writes MODEL_UPDATES_DIR/model-<version>.pkl (version = the
+     artifact's content hash, as for MODEL_VERSION) and a published
+     model_updates row.
+
+Any user can send feedback, so no single account can steer the model: in
+an attempt, each non-admin user's rows together weigh at most
+MODEL_UPDATE_MAX_PER_USER examples (each row weighs min(1, cap / rows of
+that user)); admins' rows weigh 1. The weights apply to training, to the
+feedback metrics and to MODEL_UPDATE_MIN_FEEDBACK, so one account alone
+cannot trigger an attempt when the cap is below the minimum.
+
+Every attempt is logged in model_updates with its metrics. A published one
+consumes its feedback. A rejected one does not: its window is attempted
+again once MODEL_UPDATE_MIN_FEEDBACK more (weighted) feedback has arrived,
+up to MODEL_UPDATE_MAX_RETRIES attempts or until the window holds
+MODEL_UPDATE_MAX_FEEDBACK rows, after which it is consumed without being
+applied. Consumed rows stay in `feedback` for the next offline retrain.
+One attempt takes a few seconds.
+
+Each worker polls model_updates every MODEL_UPDATE_INTERVAL seconds and
+hot-swaps to the newest published version built on its own MODEL_PATH
+artifact (ml_model.swap_pipeline), dropping the campaign index's cached
+verdicts. Only one worker trains at a time: an attempt is claimed with a
+lease in model_update_meta. Training stays off until MODEL_HOLDOUT_PATH is
+set; reloading is always on.
+"""
+import copy
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy.special import expit
+from sklearn.metrics import f1_score, roc_auc_score
+from sqlalchemy import func, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.database.db import SessionLocal
+from app.database.message_store import load_message
+from app.database.models import AnalyzedMessage, Feedback, ModelUpdate, User
+from app.services import campaign_index, ml_model
+from app.services.features import build_features
+
+logger = logging.getLogger(__name__)
+
+# ─── Constants ─────────────────────────────────────────────────────────────────
+MODEL_UPDATES_DIR = os.getenv("MODEL_UPDATES_DIR", "./model_updates")
+HOLDOUT_PATH = os.getenv("MODEL_HOLDOUT_PATH", "")
+UPDATE_INTERVAL = float(os.getenv("MODEL_UPDATE_INTERVAL", "60"))
+MIN_FEEDBACK = int(os.getenv("MODEL_UPDATE_MIN_FEEDBACK", "20"))
+MAX_FEEDBACK = int(os.getenv("MODEL_UPDATE_MAX_FEEDBACK", "5000"))      # per attempt
+LEARNING_RATE = float(os.getenv("MODEL_UPDATE_LEARNING_RATE", "1.0"))
+EPOCHS = int(os.getenv("MODEL_UPDATE_EPOCHS", "10"))
+ANCHOR = float(os.getenv("MODEL_UPDATE_ANCHOR", "0.01"))
+MAX_DROP = float(os.getenv("MODEL_UPDATE_MAX_DROP", "0.005"))
+MAX_PER_USER = float(os.getenv("MODEL_UPDATE_MAX_PER_USER", "10"))      # weight per user per attempt
+MAX_RETRIES = int(os.getenv("MODEL_UPDATE_MAX_RETRIES", "3"))           # attempts per rejected window
+
+ROOT_VERSION = ml_model.MODEL_VERSION      # the MODEL_PATH artifact every update chains from
+
+_META = "model_update_meta"
+_BATCH = 32
+_LEASE_SECONDS = 600
+
+_holdout: Optional[Tuple] = None           # (features, labels), featurized once
+_holdout_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+
+
+def create(engine: Engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {_META} (key TEXT PRIMARY KEY, value INTEGER NOT NULL)"))
+        conn.execute(text(f"INSERT OR IGNORE INTO {_META} (key, value) VALUES ('applied_to', 0), ('lease_until', 0)"))
+
+
+# ─── Feedback ──────────────────────────────────────────────────────────────────
+
+def add_feedback(db: Session, user_id: int, analysis: AnalyzedMessage, is_scam: bool) -> Feedback:
+    """Store a verdict on `analysis` (IntegrityError if the user already gave one)."""
+    feedback = Feedback(
+        user_id=user_id,
+        analysis_id=analysis.id,
+        message=load_message(analysis),
+        is_scam=is_scam,
+        ai_score=analysis.ai_score,
+        model_version=ml_model.MODEL_VERSION,
+    )
+    db.add(feedback)
+    db.commit()
+    db.refresh(feedback)
+    return feedback
+
+
+# ─── Training and validation ──────────────────────────────────────────────────
+
+def _lr_member(pipeline):
+    """The ensemble's plain logistic-regression member, the one updates adjust."""
+    clf = pipeline.steps[-1][1]
+    for est in getattr(clf, "estimators_", [clf]):
+        if hasattr(est, "coef_") and not hasattr(est, "calibrated_classifiers_"):
+            return est
+    raise ValueError("pipeline has no logistic-regression member to update")
+
+
+def _preprocessor(pipeline):
+    return pipeline.named_steps.get("preprocessor") or pipeline.steps[0][1]
+
+
+def featurize(pipeline, messages: List[str]):
+    """Classifier input rows (TF-IDF | scaled numerics) for sanitized messages, as CSR."""
+    return ml_model.classifier_input([build_features(m) for m in messages], pipeline)
+
+
+def partial_fit(coef: np.ndarray, offset: np.ndarray, X, y: np.ndarray, epochs: int = EPOCHS,
+                learning_rate: float = LEARNING_RATE, anchor: float = ANCHOR,
+                seed: int = 0, sample_weight: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Mini-batch SGD on (sample-weighted) log loss for rows whose decision is
+    X·coef + offset (offset: the frozen part), starting from `coef` and
+    pulled back to it with strength `anchor`. Returns the new coefficients.
+    """
+    start = np.asarray(coef, dtype=np.float64).ravel()
+    w = start.copy()
+    y = np.asarray(y, dtype=np.float64)
+    weight = np.ones(len(y)) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+    rng = np.random.RandomState(seed)
+    for _ in range(epochs):
+        order = rng.permutation(X.shape[0])
+        for i in range(0, len(order), _BATCH):
+            rows = order[i:i + _BATCH]
+            batch = X[rows]
+            error = (expit(batch @ w + offset[rows]) - y[rows]) * weight[rows]
+            w -= learning_rate * (batch.T @ error / len(rows) + anchor * (w - start))
+    return w
+
+
+def _metrics(pipeline, X, y: np.ndarray, sample_weight: Optional[np.ndarray] = None) -> Dict:
+    """AUC, F1 and accuracy at BEST_THRESHOLD of the ensemble probability."""
+    probabilities = pipeline.steps[-1][1].predict_proba(X)[:, 1]
+    predicted = (probabilities >= ml_model.BEST_THRESHOLD).astype(int)
+    auc = roc_auc_score(y, probabilities, sample_weight=sample_weight) if len(np.unique(y)) > 1 else None
+    return {
+        "auc": round(float(auc), 4) if auc is not None else None,
+        "f1": round(float(f1_score(y, predicted, sample_weight=sample_weight, zero_division=0)), 4),
+        "accuracy": round(float(np.average(predicted == y, weights=sample_weight)), 4),
+    }
+
+
+def feedback_weights(user_ids: List[int], trusted: List[bool], cap: float) -> np.ndarray:
+    """Per-row weights: each untrusted user's rows sum to at most `cap`; trusted rows weigh 1."""
+    per_user: Dict[int, int] = {}
+    for user_id in user_ids:
+        per_user[user_id] = per_user.get(user_id, 0) + 1
+    return np.array([
+        1.0 if is_trusted else min(1.0, cap / per_user[user_id])
+        for user_id, is_trusted in zip(user_ids, trusted)
+    ])
+
+
+def _load_holdout(pipeline) -> Tuple:
+    # Updates never change the preprocessor, so the features stay valid across versions
+    global _holdout
+    with _holdout_lock:
+        if _holdout is None:
+            frame = pd.read_csv(HOLDOUT_PATH)
+            if "text" not in frame or "label" not in frame:
+                raise ValueError(f"{HOLDOUT_PATH} needs `text` and `label` columns")
+            _holdout = (featurize(pipeline, frame["text"].astype(str).tolist()),
+                        frame["label"].astype(int).to_numpy())
+        return _holdout
+
+
+def _accepted(before: Dict, after: Dict) -> bool:
+    holdout_ok = all(
+        after["holdout"][metric] >= before["holdout"][metric] - MAX_DROP
+        for metric in ("auc", "f1")
+        if before["holdout"][metric] is not None
+    )
+    return holdout_ok and after["feedback"]["accuracy"] >= before["feedback"]["accuracy"]
+
+
+# ─── Publishing and reloading ─────────────────────────────────────────────────
+
+def _write_artifact(pipeline) -> Tuple[str, str]:
+    os.makedirs(MODEL_UPDATES_DIR, exist_ok=True)
+    tmp_path = os.path.join(MODEL_UPDATES_DIR, f".model-{os.getpid()}.tmp")
+    joblib.dump(pipeline, tmp_path)
+    version = ml_model.artifact_version(tmp_path)
+    path = os.path.join(MODEL_UPDATES_DIR, f"model-{version}.pkl")
+    os.replace(tmp_path, path)
+    return path, version
+
+
+def _serve(pipeline, version: str) -> None:
+    ml_model.swap_pipeline(pipeline, version)
+    campaign_index.clear()      # cached verdicts came from the previous model
+
+
+def reload(db: Optional[Session] = None) -> bool:
+    """Serve the newest published update of this MODEL_PATH artifact; True if it swapped."""
+    own = db is None
+    db = db or SessionLocal()
+    try:
+        latest = (
+            db.query(ModelUpdate)
+            .filter(ModelUpdate.root_version == ROOT_VERSION, ModelUpdate.published.is_(True))
+            .order_by(ModelUpdate.id.desc())
+            .first()
+        )
+    finally:
+        if own:
+            db.close()
+    if latest is None or latest.version == ml_model.MODEL_VERSION:
+        return False
+    _serve(joblib.load(latest.artifact), latest.version)
+    return True
+
+
+# ─── Update attempts ───────────────────────────────────────────────────────────
+
+def _claim(db: Session) -> bool:
+    now = int(time.time())
+    claimed = db.execute(
+        text(f"UPDATE {_META} SET value = :until WHERE key = 'lease_until' AND value < :now RETURNING value"),
+        {"until": now + _LEASE_SECONDS, "now": now},
+    ).scalar()
+    db.commit()
+    return claimed is not None
+
+
+def _release(db: Session) -> None:
+    db.rollback()
+    db.execute(text(f"UPDATE {_META} SET value = 0 WHERE key = 'lease_until'"))
+    db.commit()
+
+
+def _attempt(db: Session, min_feedback: float) -> Optional[ModelUpdate]:
+    reload(db)      # build on the newest published version
+    applied_to = db.execute(text(f"SELECT value FROM {_META} WHERE key = 'applied_to'")).scalar()
+    # Rejected attempts at this window so far (a published one would have moved applied_to)
+    retries, retried_to = db.query(func.count(ModelUpdate.id), func.max(ModelUpdate.feedback_to)).filter(
+        ModelUpdate.feedback_from == applied_to, ModelUpdate.published.is_(False)
+    ).one()
+    rows = (
+        db.query(Feedback.id, Feedback.message, Feedback.is_scam, Feedback.user_id, User.role)
+        .outerjoin(User, User.id == Feedback.user_id)
+        .filter(Feedback.id > applied_to)
+        .order_by(Feedback.id)
+        .limit(MAX_FEEDBACK)
+        .all()
+    )
+    if not rows:
+        return None
+    weights = feedback_weights([r.user_id for r in rows], [r.role == "admin" for r in rows], MAX_PER_USER)
+    # A first attempt needs min_feedback; a retry needs that much more than the last attempt had
+    since = retried_to if retries else applied_to
+    if sum(w for r, w in zip(rows, weights) if r.id > since) < min_feedback:
+        return None
+
+    start = time.perf_counter()
+    base, base_version = ml_model._pipeline, ml_model.MODEL_VERSION
+    X = featurize(base, [r.message for r in rows])
+    y = np.array([int(r.is_scam) for r in rows])
+    candidate = copy.deepcopy(base)
+    member = _lr_member(candidate)
+    coef = np.asarray(member.coef_, dtype=np.float64).ravel()
+    n_text = len(_preprocessor(base).named_transformers_["text"].idf_)
+    offset = X[:, n_text:] @ coef[n_text:] + float(member.intercept_[0])
+    coef[:n_text] = partial_fit(coef[:n_text], offset, X[:, :n_text], y, sample_weight=weights)
+    member.coef_ = coef.reshape(member.coef_.shape).astype(member.coef_.dtype)
+
+    holdout_X, holdout_y = _load_holdout(base)
+    report = {
+        stage: {"holdout": _metrics(pipeline, holdout_X, holdout_y),
+                "feedback": _metrics(pipeline, X, y, sample_weight=weights)}
+        for stage, pipeline in (("before", base), ("after", candidate))
+    }
+    published = _accepted(report["before"], report["after"])
+    # A rejected window is retried with more feedback, unless it has had its tries or cannot grow
+    consumed = published or retries + 1 >= MAX_RETRIES or len(rows) >= MAX_FEEDBACK
+    report["window"] = {
+        "attempt": retries + 1,
+        "users": len({r.user_id for r in rows}),
+        "effective_examples": round(float(weights.sum()), 2),
+        "consumed": consumed,
+    }
+    record = ModelUpdate(
+        root_version=ROOT_VERSION,
+        base_version=base_version,
+        feedback_from=applied_to,
+        feedback_to=rows[-1].id,
+        examples=len(rows),
+        published=published,
+        report=json.dumps(report),
+    )
+    if record.published:
+        record.artifact, record.version = _write_artifact(candidate)
+    record.duration_ms = (time.perf_counter() - start) * 1000
+    db.add(record)
+    if consumed:
+        db.execute(text(f"UPDATE {_META} SET value = :high WHERE key = 'applied_to'"), {"high": rows[-1].id})
+    db.commit()
+    db.refresh(record)
+    db.expunge(record)      # stays readable after the lease is released
+
+    if record.published:
+        _serve(candidate, record.version)
+    logger.info(
+        "Model update from %d feedback rows in %.0f ms: %s (holdout AUC %s → %s)",
+        len(rows), record.duration_ms, f"published {record.version}" if record.published else "rejected",
+        report["before"]["holdout"]["auc"], report["after"]["holdout"]["auc"],
+    )
+    return record
+
+
+def update(min_feedback: float = MIN_FEEDBACK) -> Optional[ModelUpdate]:
+    """
+    One update attempt over feedback not yet applied, if training is on, at
+    least `min_feedback` (weighted) new rows wait and no other worker holds
+    the lease. Returns the logged attempt, or None when nothing was attempted.
+    """
+    if not HOLDOUT_PATH:
+        return None
+    db = SessionLocal()
+    try:
+        if not _claim(db):
+            return None
+        try:
+            return _attempt(db, max(1, min_feedback))
+        finally:
+            _release(db)
+    finally:
+        db.close()
+
+
+def _run() -> None:
+    while True:
+        try:
+            reload()
+            update()
+        except Exception:
+            logger.exception("Model update cycle failed")
+        time.sleep(UPDATE_INTERVAL)
+
+
+def start() -> None:
+    global _thread
+    if UPDATE_INTERVAL > 0 and _thread is None:
+        _thread = threading.Thread(target=_run, name="model-updates", daemon=True)
+        _thread.start()
+
+
+# ─── Reporting ─────────────────────────────────────────────────────────────────
+
+def summary_item(update: ModelUpdate) -> Dict:
+    return {
+        "id": update.id,
+        "created_at": update.created_at,
+        "base_version": update.base_version,
+        "version": update.version,
+        "examples": update.examples,
+        "published": update.published,
+        "duration_ms": round(update.duration_ms or 0.0, 1),
+        "report": json.loads(update.report or "{}"),
+    }
+
+
+def summary(db: Session, limit: int = 20) -> Dict:
+    applied_to = db.execute(text(f"SELECT value FROM {_META} WHERE key = 'applied_to'")).scalar() or 0
+    updates = db.query(ModelUpdate).order_by(ModelUpdate.id.desc()).limit(limit).all()
+    return {
+        "serving_version": ml_model.MODEL_VERSION,
+        "root_version": ROOT_VERSION,
+        "training_enabled": bool(HOLDOUT_PATH),
+        "pending_feedback": db.query(func.count(Feedback.id)).filter(Feedback.id > applied_to).scalar(),
+        "min_feedback": MIN_FEEDBACK,
+        "updates": [summary_item(u) for u in updates],
+    }
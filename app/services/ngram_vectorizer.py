@@ -0,0 +1,234 @@
+"""
+ngram_vectorizer.py — TfidfVectorizer.transform without sklearn's generic path
+
+TfidfVectorizer.transform rebuilds its analyzer on every call, joins every
+1–3-gram of the message into a new string for the vocabulary lookup, builds
+a count matrix through generic scipy code and then applies sublinear TF,
+IDF and the L2 norm as separate passes; the ColumnTransformer around it
+adds pandas column selection and another sparse stack.
+
+NgramVectorizer is built once per fitted vectorizer. Tokens are interned
+to the ids of the words that occur in the vocabulary's n-grams, and the
+vocabulary's n-grams are re-keyed by their token ids, so an n-gram is one
+integer built from its (n-1)-gram's key: no string is joined, and any
+n-gram with a token outside the vocabulary is skipped without a lookup.
+Counts become the final sublinear-TF·IDF row with the same numpy operations
+(and the same L2 normalization routine) sklearn uses, so rows are
+bit-for-bit what tfidf.transform() returns.
+
+ClassifierInput does the same for the whole preprocessor: [tfidf(clean_text)
+| standardized numerics] as the CSR matrix the ColumnTransformer would hand
+to the classifier. `for_pipeline()` returns the one for a fitted Pipeline
+(None when its structure is not the one these classes reproduce, in which
+case callers use sklearn) and rebuilds it when ml_model swaps the pipeline.
+"""
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.utils.sparsefuncs_fast import inplace_csr_row_normalize_l2
+
+from app.services.features import MessageFeatures
+
+# \w runs never contain a space, so splitting a vocabulary n-gram on spaces
+# recovers exactly the tokens sklearn joined
+_DEFAULT_TOKEN_PATTERN = r"(?u)\b\w\w+\b"
+
+
+class NgramVectorizer:
+    """Exact, faster transform() of a fitted word-n-gram TfidfVectorizer."""
+
+    def __init__(self, tfidf):
+        if (tfidf.analyzer != "word" or tfidf.tokenizer is not None or tfidf.preprocessor is not None
+                or tfidf.token_pattern != _DEFAULT_TOKEN_PATTERN or tfidf.binary
+                or tfidf.norm not in ("l2", None) or np.dtype(tfidf.dtype) != np.float64):
+            raise ValueError("unsupported TfidfVectorizer configuration")
+
+        self.preprocess = tfidf.build_preprocessor()
+        self.tokenize = tfidf.build_tokenizer()
+        self.stop_words = tfidf.get_stop_words()
+        self.min_n, self.max_n = tfidf.ngram_range
+        self.sublinear_tf = tfidf.sublinear_tf
+        self.norm = tfidf.norm
+        self.idf = np.asarray(tfidf.idf_, dtype=np.float64) if tfidf.use_idf else None
+        self.n_features = len(tfidf.vocabulary_)
+
+        self.feature_names: List[str] = [""] * self.n_features   # index → n-gram
+        self.unigrams: Dict[str, int] = {}
+        self.token_ids: Dict[str, int] = {}
+        grams: Dict[int, List[Tuple[List[str], int]]] = {}
+        for gram, idx in tfidf.vocabulary_.items():
+            self.feature_names[idx] = gram
+            words = gram.split(" ")
+            if len(words) == 1:
+                self.unigrams[gram] = idx
+            else:
+                for word in words:
+                    self.token_ids.setdefault(word, len(self.token_ids))
+                grams.setdefault(len(words), []).append((words, idx))
+
+        # The key of (t_1 … t_n) is t_1·T^(n-1) + … + t_n with T distinct token ids
+        base = self.base = max(len(self.token_ids), 1)
+        self.ngrams: Dict[int, Dict[int, int]] = {}
+        for n, entries in grams.items():
+            table = self.ngrams[n] = {}
+            for words, idx in entries:
+                key = 0
+                for word in words:
+                    key = key * base + self.token_ids[word]
+                table[key] = idx
+
+    def tokens(self, clean_text: str) -> List[str]:
+        """The word tokens the vectorizer builds its n-grams from."""
+        tokens = self.tokenize(self.preprocess(clean_text))
+        if self.stop_words is not None:
+            tokens = [t for t in tokens if t not in self.stop_words]
+        return tokens
+
+    def counts(self, clean_text: str) -> Dict[int, int]:
+        """
+        In-vocabulary n-gram counts keyed by feature index, in the order
+        sklearn's analyzer produces the n-grams (unigrams, then bigrams, …).
+        """
+        tokens = self.tokens(clean_text)
+        counts: Dict[int, int] = {}
+        if self.min_n == 1:
+            unigrams = self.unigrams
+            for token in tokens:
+                idx = unigrams.get(token)
+                if idx is not None:
+                    counts[idx] = counts.get(idx, 0) + 1
+        if self.max_n < 2 or len(tokens) < 2:
+            return counts
+
+        base = self.base
+        token_ids = self.token_ids
+        ids = [token_ids.get(token, -1) for token in tokens]
+        keys = ids              # keys of the (n-1)-grams starting at each position; -1: not in any n-gram
+        for n in range(2, min(self.max_n, len(tokens)) + 1):
+            keys = [
+                key * base + nxt if key >= 0 and nxt >= 0 else -1
+                for key, nxt in zip(keys, ids[n - 1:])
+            ]
+            if n < self.min_n:
+                continue
+            table = self.ngrams.get(n)
+            if not table:
+                continue
+            for key in keys:
+                if key >= 0:
+                    idx = table.get(key)
+                    if idx is not None:
+                        counts[idx] = counts.get(idx, 0) + 1
+        return counts
+
+    def transform(self, clean_texts: List[str]) -> sparse.csr_matrix:
+        """Same matrix as tfidf.transform(clean_texts)."""
+        indptr = [0]
+        indices: List[int] = []
+        values: List[int] = []
+        for text in clean_texts:
+            counts = self.counts(text)
+            for idx in sorted(counts):
+                indices.append(idx)
+                values.append(counts[idx])
+            indptr.append(len(indices))
+
+        indices_arr = np.asarray(indices, dtype=np.int32)
+        data = np.asarray(values, dtype=np.float64)
+        if self.sublinear_tf:
+            np.log(data, data)
+            data += 1.0
+        if self.idf is not None:
+            data *= self.idf[indices_arr]
+        X = sparse.csr_matrix(
+            (data, indices_arr, np.asarray(indptr, dtype=np.int32)),
+            shape=(len(clean_texts), self.n_features),
+        )
+        if self.norm == "l2":
+            inplace_csr_row_normalize_l2(X)
+        return X
+
+
+class ClassifierInput:
+    """
+    The output of a Pipeline's ColumnTransformer (a 'text' TfidfVectorizer on
+    clean_text and a 'num' StandardScaler), built from MessageFeatures.
+    """
+
+    def __init__(self, pipeline):
+        if len(pipeline.steps) != 2:
+            raise ValueError("expected a preprocessor and a classifier")
+        pre = pipeline.steps[0][1]
+        if not getattr(pre, "sparse_output_", False):
+            raise ValueError("expected a sparse ColumnTransformer output")
+        active = [
+            (name, transformer, columns) for name, transformer, columns in pre.transformers_
+            if transformer != "drop" and len(columns)
+        ]
+        if [name for name, _, _ in active] != ["text", "num"] or active[0][2] != "clean_text":
+            raise ValueError("expected the 'text' and 'num' transformers")
+
+        self.pipeline = pipeline
+        self.text = NgramVectorizer(active[0][1])
+        scaler = active[1][1]
+        self.num_columns: List[str] = list(active[1][2])
+        self.mean = scaler.mean_ if scaler.with_mean else None
+        self.scale = scaler.scale_ if scaler.with_std else None
+        self.n_features = self.text.n_features + len(self.num_columns)
+
+    def scale_numeric(self, features: List[MessageFeatures]) -> np.ndarray:
+        """StandardScaler.transform of the numeric columns, one row per message."""
+        rows = [f.numeric_row() for f in features]
+        X = np.array([[row[c] for c in self.num_columns] for row in rows], dtype=np.float64)
+        if self.mean is not None:
+            X -= self.mean
+        if self.scale is not None:
+            X /= self.scale
+        return X
+
+    def transform(self, features: List[MessageFeatures]) -> sparse.csr_matrix:
+        """Same matrix as the preprocessor's transform() of these messages' DataFrame."""
+        text = self.text.transform([f.clean_text for f in features])
+        numeric = self.scale_numeric(features)
+
+        # Each row: its TF-IDF entries, then its non-zero numerics (as sparse.hstack lays them out)
+        present = numeric != 0
+        text_nnz = np.diff(text.indptr)
+        num_nnz = present.sum(axis=1)
+        indptr = np.zeros(len(features) + 1, dtype=np.int32)
+        np.cumsum(text_nnz + num_nnz, out=indptr[1:])
+
+        nnz = int(indptr[-1])
+        data = np.empty(nnz, dtype=np.float64)
+        indices = np.empty(nnz, dtype=np.int32)
+        rows = np.repeat(np.arange(len(features)), text_nnz)
+        text_at = np.arange(text.nnz) + (indptr[:-1] - text.indptr[:-1])[rows]
+        data[text_at] = text.data
+        indices[text_at] = text.indices
+        num_rows, num_cols = np.nonzero(present)
+        num_at = (indptr[:-1] + text_nnz)[num_rows] + (np.cumsum(present, axis=1) - 1)[num_rows, num_cols]
+        data[num_at] = numeric[num_rows, num_cols]
+        indices[num_at] = self.text.n_features + num_cols
+        return sparse.csr_matrix((data, indices, indptr), shape=(len(features), self.n_features))
+
+
+_current: Optional[Tuple[object, Optional[ClassifierInput]]] = None
+_lock = threading.Lock()
+
+
+def for_pipeline(pipeline) -> Optional[ClassifierInput]:
+    """ClassifierInput of `pipeline`, or None if it cannot be reproduced exactly."""
+    global _current
+    current = _current
+    if current is None or current[0] is not pipeline:
+        with _lock:
+            if _current is None or _current[0] is not pipeline:
+                try:
+                    built = ClassifierInput(pipeline)
+                except (AttributeError, TypeError, ValueError):
+                    built = None
+                _current = (pipeline, built)
+            current = _current
+    return current[1]
@@ -0,0 +1,245 @@
+"""
+reputation.py — local reputation store for known-bad indicators
+
+Blocklists are flat files in REPUTATION_DIR, one indicator per line
+(`#` starts a comment):
+
+    domains.txt   scam domains        (e.g. sbi-kyc-update.co)
+    phones.txt    mule phone numbers  (last 10 digits are used)
+    upi.txt       mule UPI handles    (e.g. winner@okaxis)
+
+A domain is listed if it or any parent domain down to its registrable
+domain is (login.sbi-kyc-update.co matches a listed sbi-kyc-update.co):
+O(labels) lookups per domain. The registrable domain is the last two
+labels, or three under a common second-level suffix (co.in, gov.in,
+co.uk, …); a public suffix is never looked up as a parent.
+
+Each kind is held as a Bloom filter (≈10 bits per entry, 0.1% false
+positives) in front of an exact set of 128-bit blake2b digests, so a lookup
+is one hash plus O(1) probes regardless of list size. The Bloom filter
+answers the common "not listed" case; the digest set confirms hits.
+
+The lists are loaded on the first lookup in a process (the API workers also
+start loading them at startup), which then starts a background thread that
+re-checks the files every REPUTATION_RELOAD_SECONDS, so job_worker.py,
+replay.py and scripts see the same lists as the API. Files that only grew
+are read from the last offset (incremental); files that were replaced or
+truncated are rebuilt and swapped in atomically.
+"""
+import hashlib
+import logging
+import math
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ─── Constants ─────────────────────────────────────────────────────────────────
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPUTATION_DIR = os.getenv(
+    "REPUTATION_DIR", os.path.abspath(os.path.join(BASE_DIR, "..", "data", "reputation"))
+)
+RELOAD_SECONDS = float(os.getenv("REPUTATION_RELOAD_SECONDS", "60"))
+
+_FILES = {"domains": "domains.txt", "phones": "phones.txt", "upi": "upi.txt"}
+_FALSE_POSITIVE_RATE = 0.001
+_MIN_CAPACITY = 1024
+# Second-level public suffixes under which the registrable domain has three labels
+_SECOND_LEVEL_SUFFIXES = frozenset({
+    "co.in", "net.in", "org.in", "firm.in", "gen.in", "ind.in", "gov.in", "nic.in", "ac.in",
+    "edu.in", "res.in", "mil.in", "co.uk", "org.uk", "gov.uk", "ac.uk", "com.au", "net.au",
+    "org.au", "co.nz", "co.za", "com.sg", "com.my", "com.pk", "com.bd", "com.np", "com.lk",
+    "co.jp", "com.br", "com.cn", "com.hk",
+})
+
+
+def _normalize(kind: str, value: str) -> str:
+    value = value.strip().lower()
+    if kind == "phones":
+        return re.sub(r"\D", "", value)[-10:]
+    if kind == "domains" and value.startswith("www."):
+        return value[4:]
+    return value
+
+
+def _domain_candidates(domain: str) -> List[str]:
+    """`domain` and each parent down to its registrable domain, most specific first."""
+    labels = domain.split(".")
+    keep = 3 if ".".join(labels[-2:]) in _SECOND_LEVEL_SUFFIXES else 2
+    return [".".join(labels[i:]) for i in range(max(1, len(labels) - keep + 1))]
+
+
+def _digest(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest(), "big")
+
+
+# ─── Bloom filter + exact backing ──────────────────────────────────────────────
+
+class IndicatorSet:
+    """Bloom filter front with an exact digest-set backing."""
+
+    def __init__(self, capacity: int = _MIN_CAPACITY):
+        self.capacity = max(capacity, _MIN_CAPACITY)
+        self.num_bits = int(math.ceil(-self.capacity * math.log(_FALSE_POSITIVE_RATE) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.digests: set = set()
+
+    def _positions(self, digest: int):
+        h1, h2 = digest >> 64, (digest & 0xFFFFFFFFFFFFFFFF) | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add_digest(self, digest: int) -> None:
+        # Exact set first, so a concurrent reader never sees a Bloom hit it cannot confirm
+        self.digests.add(digest)
+        for pos in self._positions(digest):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def contains_digest(self, digest: int) -> bool:
+        for pos in self._positions(digest):
+            if not self.bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return digest in self.digests
+
+    def __len__(self) -> int:
+        return len(self.digests)
+
+    def grown(self) -> "IndicatorSet":
+        """Copy into a filter with twice the capacity (keeps the FP rate bounded)."""
+        bigger = IndicatorSet(self.capacity * 2)
+        for d in self.digests:
+            bigger.add_digest(d)
+        return bigger
+
+
+# ─── Store ─────────────────────────────────────────────────────────────────────
+
+class ReputationStore:
+    def __init__(self, directory: str = REPUTATION_DIR):
+        self.directory = directory
+        self._sets: Dict[str, IndicatorSet] = {kind: IndicatorSet() for kind in _FILES}
+        self._file_state: Dict[str, Optional[tuple]] = {kind: None for kind in _FILES}
+        self._reload_lock = threading.Lock()
+        self.loaded_at: Optional[float] = None
+
+    def _read_lines(self, path: str, offset: int):
+        with open(path, "rb") as fh:
+            fh.seek(offset)
+            for raw in fh:
+                if not raw.endswith(b"\n"):
+                    # Partially written last line; pick it up on the next reload
+                    break
+                offset += len(raw)
+                yield raw.decode("utf-8", errors="ignore"), offset
+
+    def _load_kind(self, kind: str) -> None:
+        path = os.path.join(self.directory, _FILES[kind])
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            if self._file_state[kind] is not None:
+                self._sets[kind] = IndicatorSet()
+                self._file_state[kind] = None
+            return
+
+        state = self._file_state[kind]
+        appended = (
+            state is not None
+            and state[0] == st.st_ino
+            and st.st_size >= state[1]
+        )
+        if appended and st.st_size == state[1]:
+            return
+
+        target = self._sets[kind] if appended else IndicatorSet(self._estimate_lines(st.st_size))
+        offset = state[1] if appended else 0
+        for line, offset in self._read_lines(path, offset):
+            value = line.split("#", 1)[0]
+            if not value.strip():
+                continue
+            if len(target) >= target.capacity:
+                target = target.grown()
+            target.add_digest(_digest(_normalize(kind, value)))
+
+        self._sets[kind] = target
+        self._file_state[kind] = (st.st_ino, offset)
+
+    @staticmethod
+    def _estimate_lines(size: int) -> int:
+        return size // 16 + 1
+
+    def reload(self) -> Dict[str, int]:
+        """Pick up changes to the blocklist files. Returns entry counts per kind."""
+        with self._reload_lock:
+            for kind in _FILES:
+                self._load_kind(kind)
+            self.loaded_at = time.time()
+            return self.sizes()
+
+    def sizes(self) -> Dict[str, int]:
+        return {kind: len(s) for kind, s in self._sets.items()}
+
+    def is_listed(self, kind: str, value: str) -> bool:
+        value = _normalize(kind, value)
+        indicator_set = self._sets[kind]
+        if kind == "domains":
+            return any(indicator_set.contains_digest(_digest(d)) for d in _domain_candidates(value))
+        return indicator_set.contains_digest(_digest(value))
+
+    def lookup(self, indicators: Dict[str, List[str]]) -> List[Dict]:
+        """Return [{"type", "value"}] for every listed indicator."""
+        hits = []
+        for kind, singular in (("domains", "domain"), ("phones", "phone"), ("upi", "upi")):
+            for value in indicators.get(kind, []):
+                if self.is_listed(kind, value):
+                    hits.append({"type": singular, "value": value})
+        return hits
+
+
+_store = ReputationStore()
+_reloader: Optional[threading.Thread] = None
+
+
+def _reload_loop() -> None:
+    while True:
+        try:
+            _store.reload()
+        except Exception:  # keep serving the previous lists
+            logger.exception("Reputation reload failed")
+        time.sleep(RELOAD_SECONDS)
+
+
+def start_reloader() -> None:
+    """Load the blocklists in the background and keep them fresh."""
+    global _reloader
+    if _reloader is None:
+        _reloader = threading.Thread(target=_reload_loop, name="reputation-reload", daemon=True)
+        _reloader.start()
+
+
+def reload() -> Dict[str, int]:
+    return _store.reload()
+
+
+def ensure_loaded() -> None:
+    """Load the blocklists now if this process has not, and keep them fresh."""
+    if _store.loaded_at is None:
+        try:
+            _store.reload()
+        except Exception:
+            logger.exception("Reputation load failed")
+    start_reloader()
+
+
+def lookup(indicators: Dict[str, List[str]]) -> List[Dict]:
+    if _store.loaded_at is None:
+        ensure_loaded()
+    return _store.lookup(indicators)
+
+
+def sizes() -> Dict[str, int]:
+    return _store.sizes()
@@ -0,0 +1,291 @@
+"""
+result_cache.py — ML verdicts shared by every worker on the host
+
+Each gunicorn worker (and job_worker.py) would otherwise score a repeated
+message again, and any in-process cache starts cold after every restart or
+deploy. Verdicts of ml_model.predict / predict_batch are kept in their own
+SQLite file (RESULT_CACHE_PATH, WAL mode, so readers never wait on the
+writer), keyed by (message content hash, model version):
+
+    scam_probability, scam_type and the contributing words — or no words
+    for verdicts computed with explain=False, which cannot serve a request
+    that wants them (that request rescores and replaces the entry)
+
+The file outlives the process, so a newly deployed worker serving the same
+model.pkl starts warm; a different model (or a model_updates hot swap) has
+a different version and simply misses. Entries older than
+RESULT_CACHE_TTL_SECONDS are not served. Every _PRUNE_EVERY writes (a tenth
+of the bound, at most 500) a worker deletes expired entries and the oldest
+ones beyond RESULT_CACHE_MAX_ENTRIES, so the bound can be overshot by at
+most that many writes per worker.
+
+Lookups and hits are counted per worker and added to totals in the file,
+so stats() reports both this worker's hit rate and the host's. Cache errors
+(e.g. a locked or full disk) are logged and treated as misses; they never
+fail an analysis. RESULT_CACHE_PATH="" disables the cache.
+"""
+import hashlib
+import html
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import msgpack
+
+from app.services import ml_model
+from app.services.features import MessageFeatures, build_features
+
+logger = logging.getLogger(__name__)
+
+# ─── Constants ─────────────────────────────────────────────────────────────────
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "./result_cache.db")
+ENABLED = bool(RESULT_CACHE_PATH)
+TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "200000"))
+_PRUNE_EVERY = max(1, min(500, MAX_ENTRIES // 10))   # writes between prunes
+_LOOKUP_BATCH = 500         # hashes per SELECT
+_FLUSH_EVERY = 1000         # lookups between adding this worker's counters to the totals
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    message_hash  TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    verdict       BLOB NOT NULL,
+    stored_at     REAL NOT NULL,
+    PRIMARY KEY (message_hash, model_version)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_results_stored ON results (stored_at);
+CREATE TABLE IF NOT EXISTS result_cache_stats (
+    key   TEXT    PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO result_cache_stats (key, value) VALUES ('lookups', 0), ('hits', 0);
+"""
+
+_lock = threading.Lock()
+_lookups = 0
+_hits = 0
+_unflushed = [0, 0]         # lookups, hits not yet added to the totals
+_writes = 0
+
+
+def connect(path: str = RESULT_CACHE_PATH) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=2, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+_local = threading.local()
+
+
+def connection() -> sqlite3.Connection:
+    """This thread's connection to RESULT_CACHE_PATH (created on first use)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = connect()
+    return conn
+
+
+# ─── Entries ───────────────────────────────────────────────────────────────────
+
+def content_hash(text: str) -> str:
+    """sha256 hex digest of the message, as message_store.content_hash."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _encode(result: Dict, explained: bool) -> bytes:
+    words = [[w["word"], w["impact"]] for w in result["contributing_words"]] if explained else None
+    return msgpack.packb([result["scam_probability"], result["scam_type"], words], use_bin_type=True)
+
+
+def _decode(blob: bytes) -> Dict:
+    scam_probability, scam_type, words = msgpack.unpackb(blob, raw=False)
+    return {
+        "scam_probability": scam_probability,
+        "scam_type": scam_type,
+        "contributing_words": None if words is None else [{"word": w, "impact": i} for w, i in words],
+    }
+
+
+def _count(lookups: int, hits: int) -> None:
+    global _lookups, _hits
+    with _lock:
+        _lookups += lookups
+        _hits += hits
+        _unflushed[0] += lookups
+        _unflushed[1] += hits
+        flush = _unflushed[0] >= _FLUSH_EVERY
+    if flush:
+        _flush()
+
+
+def _flush() -> None:
+    with _lock:
+        lookups, hits = _unflushed
+        _unflushed[0] = _unflushed[1] = 0
+    if not lookups:
+        return
+    try:
+        connection().executemany(
+            "UPDATE result_cache_stats SET value = value + ? WHERE key = ?",
+            ((lookups, "lookups"), (hits, "hits")),
+        )
+    except sqlite3.Error as e:
+        logger.warning("Result cache stats not saved: %s", e)
+
+
+def get_many(hashes: List[str], model_version: str) -> Dict[str, Dict]:
+    """Fresh cached verdicts by message hash (decoded; words None if not explained)."""
+    found: Dict[str, Dict] = {}
+    fresh_after = time.time() - TTL_SECONDS
+    try:
+        conn = connection()
+        for i in range(0, len(hashes), _LOOKUP_BATCH):
+            batch = hashes[i:i + _LOOKUP_BATCH]
+            rows = conn.execute(
+                f"SELECT message_hash, verdict FROM results WHERE model_version = ? AND stored_at >= ? "
+                f"AND message_hash IN ({', '.join('?' * len(batch))})",
+                (model_version, fresh_after, *batch),
+            )
+            found.update((message_hash, _decode(blob)) for message_hash, blob in rows)
+    except sqlite3.Error as e:
+        logger.warning("Result cache lookup failed: %s", e)
+        return {}
+    return found
+
+
+def put_many(entries: List[tuple], model_version: str) -> None:
+    """Store (message hash, ml result, explained) entries under `model_version`."""
+    global _writes
+    if not entries:
+        return
+    now = time.time()
+    try:
+        conn = connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO results (message_hash, model_version, verdict, stored_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(h, model_version, _encode(result, explained), now) for h, result, explained in entries],
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    except sqlite3.Error as e:
+        logger.warning("Result cache write failed: %s", e)
+        return
+    with _lock:
+        _writes += len(entries)
+        prune_now = _writes >= _PRUNE_EVERY
+        if prune_now:
+            _writes = 0
+    if prune_now:
+        prune()
+
+
+def prune() -> int:
+    """Delete expired entries and the oldest beyond MAX_ENTRIES. Returns entries deleted."""
+    try:
+        conn = connection()
+        deleted = conn.execute("DELETE FROM results WHERE stored_at < ?", (time.time() - TTL_SECONDS,)).rowcount
+        excess = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] - MAX_ENTRIES
+        if excess > 0:
+            deleted += conn.execute(
+                "DELETE FROM results WHERE (message_hash, model_version) IN "
+                "(SELECT message_hash, model_version FROM results ORDER BY stored_at LIMIT ?)",
+                (excess,),
+            ).rowcount
+    except sqlite3.Error as e:
+        logger.warning("Result cache prune failed: %s", e)
+        return 0
+    return deleted
+
+
+# ─── Cached inference ──────────────────────────────────────────────────────────
+
+def predict(text: str, features: Optional[MessageFeatures] = None, explain: bool = True) -> Dict:
+    """
+    ml_model.predict(), answered from the cache when this model has scored
+    `text` before (such results carry "cached": True).
+    """
+    if not ENABLED:
+        return ml_model.predict(text, features, explain)
+    version = ml_model.MODEL_VERSION
+    message_hash = content_hash(text)
+    cached = get_many([message_hash], version).get(message_hash)
+    if cached is not None and (cached["contributing_words"] is not None or not explain):
+        _count(1, 1)
+        words = cached["contributing_words"] if explain else []
+        return {
+            "scam_probability":   cached["scam_probability"],
+            "scam_type":          cached["scam_type"],
+            "contributing_words": words,
+            "highlighted_text":   ml_model._build_highlighted_text(text, words) if explain else html.escape(text),
+            "cached":             True,
+        }
+    _count(1, 0)
+    result = ml_model.predict(text, features, explain)
+    if ml_model.MODEL_VERSION == version:   # not scored by a model swapped in meanwhile
+        put_many([(message_hash, result, explain)], version)
+    return result
+
+
+def predict_batch(texts: List[str], features: Optional[List[MessageFeatures]] = None) -> List[Dict]:
+    """ml_model.predict_batch(), scoring only the messages not in the cache."""
+    if not ENABLED or not texts:
+        return ml_model.predict_batch(texts, features)
+    features = features or [build_features(t) for t in texts]
+    version = ml_model.MODEL_VERSION
+    hashes = [content_hash(t) for t in texts]
+    cached = get_many(list(set(hashes)), version)
+    missing = [i for i, h in enumerate(hashes) if h not in cached]
+    _count(len(texts), len(texts) - len(missing))
+
+    scored = ml_model.predict_batch([texts[i] for i in missing], [features[i] for i in missing])
+    fresh = {hashes[i]: verdict for i, verdict in zip(missing, scored)}
+    if fresh and ml_model.MODEL_VERSION == version:
+        put_many([(h, verdict, False) for h, verdict in fresh.items()], version)
+    return [
+        fresh[h] if h in fresh else {"scam_probability": cached[h]["scam_probability"],
+                                     "scam_type": cached[h]["scam_type"]}
+        for h in hashes
+    ]
+
+
+def stats() -> Dict:
+    """Size and hit rates: this worker's and all workers' (since the file was created)."""
+    with _lock:
+        lookups, hits = _lookups, _hits
+    report = {
+        "enabled": ENABLED,
+        "entries": 0,
+        "max_entries": MAX_ENTRIES,
+        "ttl_seconds": TTL_SECONDS,
+        "lookups": lookups,
+        "hits": hits,
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        "host_lookups": 0,
+        "host_hits": 0,
+        "host_hit_rate": 0.0,
+    }
+    if not ENABLED:
+        return report
+    _flush()
+    try:
+        conn = connection()
+        totals = dict(conn.execute("SELECT key, value FROM result_cache_stats").fetchall())
+        report["entries"] = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+    except sqlite3.Error as e:
+        logger.warning("Result cache stats unavailable: %s", e)
+        return report
+    report["host_lookups"], report["host_hits"] = totals.get("lookups", 0), totals.get("hits", 0)
+    if report["host_lookups"]:
+        report["host_hit_rate"] = round(report["host_hits"] / report["host_lookups"], 4)
+    return report
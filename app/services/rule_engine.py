@@ -1,5 +1,8 @@
 import re
-from typing import List, Dict
+from typing import List, Dict, Optional
+
+from app.services import indicators, reputation
+from app.services.features import MessageFeatures, build_features
 
 # ─── Suspicious context words ──────────────────────────────────────────────────
 # OTP rule only triggers when these appear alongside "otp" — avoids false
@@ -27,6 +30,7 @@ def _has_otp_scam_context(text_lower: str) -> bool:
 
 # ─── Rule definitions ──────────────────────────────────────────────────────────
 # Each rule has:
+#   id       – stable key stored in rule_hits; never renumber or reuse one
 #   name     – human-readable label shown in the UI
 #   weight   – contribution to rule_score (weights sum to 1.0)
 #   patterns – list of regex patterns; ONE match is enough to trigger
@@ -35,6 +39,7 @@ def _has_otp_scam_context(text_lower: str) -> bool:
 # ──────────────────────────────────────────────────────────────────────────────
 RULES: List[Dict] = [
     {
+        "id": 1,
         "name": "OTP Request",
         "weight": 0.20,
         "patterns": [
@@ -47,6 +52,7 @@ RULES: List[Dict] = [
         "context_fn": _has_otp_scam_context,
     },
     {
+        "id": 2,
         "name": "Urgency / Threat",
         "weight": 0.18,
         "patterns": [
@@ -60,6 +66,7 @@ RULES: List[Dict] = [
         "phrases": ["immediately", "urgently", "will be blocked", "last warning"],
     },
     {
+        "id": 3,
         "name": "Suspicious Link",
         "weight": 0.18,
         "patterns": [
@@ -74,6 +81,7 @@ RULES: List[Dict] = [
         "phrases": ["click here", "suspicious URL", "short link"],
     },
     {
+        "id": 4,
         "name": "Banking / UPI Impersonation",
         "weight": 0.20,
         "patterns": [
@@ -89,6 +97,7 @@ RULES: List[Dict] = [
         "phrases": ["KYC", "UPI", "bank account", "debit card"],
     },
     {
+        "id": 5,
         "name": "Financial Reward / Lottery",
         "weight": 0.12,
         "patterns": [
@@ -103,6 +112,7 @@ RULES: List[Dict] = [
         "phrases": ["you won", "prize", "cashback", "reward"],
     },
     {
+        "id": 6,
         "name": "Government / Legal Impersonation",
         "weight": 0.10,
         "patterns": [
@@ -118,6 +128,7 @@ RULES: List[Dict] = [
         "phrases": ["CBI", "income tax", "arrest warrant", "FIR"],
     },
     {
+        "id": 7,
         "name": "Personal Info Request",
         "weight": 0.06,
         "patterns": [
@@ -133,32 +144,52 @@ RULES: List[Dict] = [
 
 _TOTAL_WEIGHT = sum(r["weight"] for r in RULES)
 
+# Patterns compiled once at import, in rule order
+_COMPILED_RULES = [(rule, [re.compile(p) for p in rule["patterns"]]) for rule in RULES]
+
+# ─── Reputation rule ───────────────────────────────────────────────────────────
+# Fires when a URL domain, phone number or UPI handle is on a local blocklist
+# (see reputation.py). Its weight is added on top of the normalized pattern
+# rules rather than into _TOTAL_WEIGHT, so scores of messages without a
+# blocklist hit are unchanged; the final score is still capped at 1.0.
+REPUTATION_RULE = {
+    "id": 8,
+    "name": "Known Malicious Indicator",
+    "weight": 0.30,
+}
+
+# Rule name → id, for rule_hits (names are what results and history carry)
+RULE_IDS: Dict[str, int] = {rule["name"]: rule["id"] for rule in RULES + [REPUTATION_RULE]}
 
-def analyze_rules(message: str) -> Dict:
+
+def analyze_rules(message: str, features: Optional[MessageFeatures] = None) -> Dict:
     """
-    Apply the contextual rule engine to the message.
+    Apply the contextual rule engine to the message. Pass the request's
+    MessageFeatures to reuse its lowercased text.
 
     Returns:
         {
             "rule_score": float  (0.0 – 1.0, normalized),
             "matched_rules": List[str],
-            "suspicious_phrases": List[str]
+            "suspicious_phrases": List[str],
+            "indicator_hits": List[{"type": str, "value": str}]
         }
     """
-    text_lower = message.lower()
+    f = features or build_features(message)
+    text_lower = f.lower
     matched_rules: List[str] = []
     suspicious_phrases: List[str] = []
     accumulated_score: float = 0.0
 
-    for rule in RULES:
+    for rule, patterns in _COMPILED_RULES:
         # Optional extra context gate (e.g. for OTP)
         context_fn = rule.get("context_fn")
         if context_fn and not context_fn(text_lower):
             continue
 
         triggered = False
-        for pattern in rule["patterns"]:
-            m = re.search(pattern, text_lower)
+        for pattern in patterns:
+            m = pattern.search(text_lower)
             if m:
                 triggered = True
                 hit = m.group(0).strip()
@@ -175,6 +206,13 @@ def analyze_rules(message: str) -> Dict:
     # Normalize score to 0-1 range
     rule_score = min(accumulated_score / _TOTAL_WEIGHT, 1.0) if _TOTAL_WEIGHT else 0.0
 
+    # Confirmed blocklist hits raise the score beyond the pattern rules
+    indicator_hits = reputation.lookup(indicators.extract_lower(text_lower))
+    if indicator_hits:
+        matched_rules.append(REPUTATION_RULE["name"])
+        rule_score = min(rule_score + REPUTATION_RULE["weight"], 1.0)
+        suspicious_phrases.extend(h["value"] for h in indicator_hits)
+
     # Deduplicate while preserving order
     seen: set = set()
     unique_phrases: List[str] = []
@@ -188,4 +226,15 @@ def analyze_rules(message: str) -> Dict:
         "rule_score": round(rule_score, 4),
         "matched_rules": matched_rules,
         "suspicious_phrases": unique_phrases[:10],
+        "indicator_hits": indicator_hits,
     }
+
+
+def score_matched_rules(matched_rules: List[str]) -> float:
+    """rule_score for a set of rule names, normalized exactly as analyze_rules does."""
+    names = set(matched_rules)
+    accumulated = sum(rule["weight"] for rule in RULES if rule["name"] in names)
+    rule_score = min(accumulated / _TOTAL_WEIGHT, 1.0) if _TOTAL_WEIGHT else 0.0
+    if REPUTATION_RULE["name"] in names:
+        rule_score = min(rule_score + REPUTATION_RULE["weight"], 1.0)
+    return round(rule_score, 4)
@@ -0,0 +1,283 @@
+"""
+score_sketches.py — streaming score distributions for drift monitoring
+
+Every persisted analysis feeds its ai_score, rule_score and final_score
+into KLL quantile sketches keyed by (score, model version, UTC hour).
+A KLL sketch keeps O(k·log(n/k)) items for rank error ≈ 1.7/k, so k=200
+answers quantiles within about ±1% of rank whatever the traffic. Hours
+older than SKETCH_RETENTION_HOURS are dropped, which bounds the total
+number of sketches as well.
+
+Sketches merge losslessly with respect to their error bound, so each worker
+periodically writes its own snapshot file (SKETCH_DIR/<host>-<pid>.json)
+and the admin report merges every snapshot with the live in-process
+sketches. No query against analyzed_messages is needed.
+"""
+import json
+import logging
+import math
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.services import ml_model
+
+logger = logging.getLogger(__name__)
+
+# ─── Constants ─────────────────────────────────────────────────────────────────
+SKETCH_K = int(os.getenv("SKETCH_K", "200"))
+RETENTION_HOURS = int(os.getenv("SKETCH_RETENTION_HOURS", "168"))
+FLUSH_SECONDS = float(os.getenv("SKETCH_FLUSH_SECONDS", "60"))
+SKETCH_DIR = os.getenv("SKETCH_DIR", "./score_sketches")
+
+SCORES = ("ai_score", "rule_score", "final_score")
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+# Decision boundaries per score: ML threshold and fast-path, fusion risk cut-offs
+BOUNDARIES = {
+    "ai_score":    (ml_model.BEST_THRESHOLD, 0.75),
+    "rule_score":  (),
+    "final_score": (0.35, 0.60),
+}
+NEAR_BAND = float(os.getenv("SKETCH_NEAR_BAND", "0.05"))
+
+_HOUR_FORMAT = "%Y-%m-%dT%H"
+
+
+class KLLSketch:
+    """KLL quantile sketch (Karnin, Lang, Liberty 2016) with c = 2/3."""
+
+    _C = 2.0 / 3.0
+
+    def __init__(self, k: int = SKETCH_K, seed: Optional[int] = None):
+        self.k = k
+        self.n = 0
+        self.levels: List[List[float]] = [[]]
+        self._rng = random.Random(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return int(math.ceil(self.k * self._C ** depth)) + 1
+
+    def _size(self) -> int:
+        return sum(len(items) for items in self.levels)
+
+    def _max_size(self) -> int:
+        return sum(self._capacity(h) for h in range(len(self.levels)))
+
+    def _compress(self) -> None:
+        while self._size() >= self._max_size():
+            for h, items in enumerate(self.levels):
+                if len(items) >= self._capacity(h):
+                    if h + 1 == len(self.levels):
+                        self.levels.append([])
+                    items.sort()
+                    keep = [items.pop()] if len(items) % 2 else []
+                    offset = self._rng.random() < 0.5
+                    self.levels[h + 1].extend(items[offset::2])
+                    self.levels[h] = keep
+                    break
+
+    def update(self, value: float) -> None:
+        self.levels[0].append(value)
+        self.n += 1
+        if len(self.levels[0]) >= self._capacity(0):
+            self._compress()
+
+    def merge(self, other: "KLLSketch") -> None:
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for h, items in enumerate(other.levels):
+            self.levels[h].extend(items)
+        self.n += other.n
+        self._compress()
+
+    # ── queries ──
+    def _weighted(self) -> List[Tuple[float, int]]:
+        return sorted((v, 1 << h) for h, items in enumerate(self.levels) for v in items)
+
+    def quantiles(self, qs: Iterable[float]) -> List[Optional[float]]:
+        items = self._weighted()
+        total = sum(w for _, w in items)
+        if not total:
+            return [None for _ in qs]
+        out = []
+        for q in qs:
+            target, acc = q * total, 0
+            value = items[-1][0]
+            for v, w in items:
+                acc += w
+                if acc >= target:
+                    value = v
+                    break
+            out.append(value)
+        return out
+
+    def cdf(self, x: float) -> float:
+        """Estimated fraction of values ≤ x."""
+        total = below = 0
+        for h, items in enumerate(self.levels):
+            weight = 1 << h
+            total += weight * len(items)
+            below += weight * sum(1 for v in items if v <= x)
+        return below / total if total else 0.0
+
+    # ── snapshots ──
+    def to_dict(self) -> Dict:
+        return {"k": self.k, "n": self.n, "levels": self.levels}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "KLLSketch":
+        sketch = cls(k=data["k"])
+        sketch.n = data["n"]
+        sketch.levels = [list(items) for items in data["levels"]] or [[]]
+        return sketch
+
+
+def _hour_key(ts: Optional[datetime] = None) -> str:
+    return (ts or datetime.utcnow()).strftime(_HOUR_FORMAT)
+
+
+class SketchStore:
+    """(score, model version, hour) → KLLSketch for this worker."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sketches: Dict[Tuple[str, str, str], KLLSketch] = {}
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+
+    def record(self, scores: Dict[str, float], model_version: str) -> None:
+        hour = _hour_key()
+        with self._lock:
+            for name in SCORES:
+                key = (name, model_version, hour)
+                sketch = self._sketches.get(key)
+                if sketch is None:
+                    sketch = self._sketches[key] = KLLSketch()
+                sketch.update(float(scores[name]))
+
+    def expire(self) -> None:
+        cutoff = _hour_key(datetime.utcnow() - timedelta(hours=RETENTION_HOURS))
+        with self._lock:
+            for key in [k for k in self._sketches if k[2] < cutoff]:
+                del self._sketches[key]
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "worker": self.worker_id,
+                "written_at": time.time(),
+                "sketches": [
+                    {"score": s, "version": v, "hour": h, "sketch": sk.to_dict()}
+                    for (s, v, h), sk in self._sketches.items()
+                ],
+            }
+
+    def flush(self, directory: str = SKETCH_DIR) -> None:
+        """Atomically replace this worker's snapshot file."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.worker_id}.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self.snapshot(), fh, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def copies(self) -> List[Tuple[str, str, str, KLLSketch]]:
+        with self._lock:
+            return [(s, v, h, KLLSketch.from_dict(sk.to_dict())) for (s, v, h), sk in self._sketches.items()]
+
+
+_store = SketchStore()
+_flusher: Optional[threading.Thread] = None
+
+
+def _flush_loop() -> None:
+    while True:
+        time.sleep(FLUSH_SECONDS)
+        try:
+            _store.expire()
+            _store.flush()
+        except Exception:
+            logger.exception("Score sketch flush failed")
+
+
+def start_flusher() -> None:
+    global _flusher
+    if _flusher is None:
+        _flusher = threading.Thread(target=_flush_loop, name="score-sketch-flush", daemon=True)
+        _flusher.start()
+
+
+def flush() -> None:
+    _store.flush()
+
+
+def record(ai_score: float, rule_score: float, final_score: float,
+           model_version: Optional[str] = None) -> None:
+    _store.record(
+        {"ai_score": ai_score, "rule_score": rule_score, "final_score": final_score},
+        model_version or ml_model.MODEL_VERSION,
+    )
+
+
+def _collect(hours: int) -> List[Tuple[str, str, str, KLLSketch]]:
+    """Live sketches of this worker plus every other worker's latest snapshot."""
+    cutoff = _hour_key(datetime.utcnow() - timedelta(hours=hours - 1))
+    collected = [item for item in _store.copies() if item[2] >= cutoff]
+    if not os.path.isdir(SKETCH_DIR):
+        return collected
+    stale = time.time() - RETENTION_HOURS * 3600
+    for name in os.listdir(SKETCH_DIR):
+        if not name.endswith(".json") or name == f"{_store.worker_id}.json":
+            continue
+        path = os.path.join(SKETCH_DIR, name)
+        try:
+            if os.path.getmtime(path) < stale:
+                os.remove(path)          # worker gone and all its hours expired
+                continue
+            with open(path, encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            continue
+        for entry in data.get("sketches", []):
+            if entry["hour"] >= cutoff:
+                collected.append((entry["score"], entry["version"], entry["hour"],
+                                  KLLSketch.from_dict(entry["sketch"])))
+    return collected
+
+
+def _describe(name: str, sketch: KLLSketch) -> Dict:
+    quantiles = sketch.quantiles(QUANTILES)
+    return {
+        "count": sketch.n,
+        "quantiles": {f"p{int(q * 100):02d}": v for q, v in zip(QUANTILES, quantiles)},
+        "near_boundaries": {
+            str(round(b, 4)): round(sketch.cdf(b + NEAR_BAND) - sketch.cdf(b - NEAR_BAND), 4)
+            for b in BOUNDARIES[name]
+        },
+    }
+
+
+def report(hours: int = 24, by_hour: bool = False) -> Dict:
+    """
+    Merged distributions over the last `hours` hours:
+    {version: {score: {...}}}, or {version: {hour: {score: {...}}}} by hour.
+    """
+    merged: Dict[Tuple, KLLSketch] = {}
+    for score, version, hour, sketch in _collect(hours):
+        key = (version, hour if by_hour else None, score)
+        if key in merged:
+            merged[key].merge(sketch)
+        else:
+            merged[key] = sketch
+
+    versions: Dict = {}
+    for (version, hour, score), sketch in sorted(merged.items(), key=lambda kv: (kv[0][0], kv[0][1] or "", kv[0][2])):
+        node = versions.setdefault(version, {})
+        if by_hour:
+            node = node.setdefault(hour, {})
+        node[score] = _describe(score, sketch)
+    return {"hours": hours, "near_band": NEAR_BAND, "versions": versions}
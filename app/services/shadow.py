@@ -0,0 +1,262 @@
+"""
+shadow.py — score live traffic with a candidate model, off the request path
+
+With SHADOW_MODEL_PATH set, a sampled fraction (SHADOW_SAMPLE_RATE) of
+/api/analyze messages the primary model scored itself (not degraded, not
+reused from a campaign or the result cache: see comparable()) is handed to
+a bounded queue after the response has been sent, together with the score
+the request was answered with. One daemon thread drains it and writes each
+comparison to a separate SQLite file (SHADOW_DB_PATH), so shadow writes
+never contend with the main database:
+
+    primary (served) / candidate scam probability and their delta
+    primary / candidate risk level (fused with the same rule score)
+    latency: predict_proba of each model's whole pipeline on the message's
+             DataFrame — the same sklearn path for both, so the two are
+             comparable (the served path is faster than either)
+
+The scorer shares the worker's GIL with request handling, so it scores at
+most SHADOW_MAX_PER_SECOND messages per second; beyond that the queue fills
+and further messages are dropped. The enqueue never blocks: when the queue
+is full the message is dropped and counted. The candidate is loaded lazily
+by the worker thread, so startup and the primary path are unaffected.
+"""
+import logging
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+import joblib
+
+from app.services import ml_model, fusion_engine
+from app.services.features import build_features
+
+logger = logging.getLogger(__name__)
+
+# ─── Constants ─────────────────────────────────────────────────────────────────
+SHADOW_MODEL_PATH = os.getenv("SHADOW_MODEL_PATH", "")
+SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0.1"))
+QUEUE_SIZE = int(os.getenv("SHADOW_QUEUE_SIZE", "1000"))
+SHADOW_DB_PATH = os.getenv("SHADOW_DB_PATH", "./shadow.db")
+MAX_PER_SECOND = float(os.getenv("SHADOW_MAX_PER_SECOND", "5"))
+_BATCH = 50
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shadow_results (
+    id                   INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at           TEXT    NOT NULL,
+    primary_version      TEXT    NOT NULL,
+    candidate_version    TEXT    NOT NULL,
+    rule_score           REAL    NOT NULL,
+    primary_score        REAL    NOT NULL,
+    candidate_score      REAL    NOT NULL,
+    score_delta          REAL    NOT NULL,
+    primary_risk         TEXT    NOT NULL,
+    candidate_risk       TEXT    NOT NULL,
+    risk_disagreement    INTEGER NOT NULL,
+    primary_latency_ms   REAL    NOT NULL,
+    candidate_latency_ms REAL    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_shadow_results_versions
+    ON shadow_results (primary_version, candidate_version);
+"""
+
+
+class ShadowScorer:
+    def __init__(self, model_path: str, db_path: str, sample_rate: float, queue_size: int,
+                 max_per_second: float = MAX_PER_SECOND):
+        self.model_path = model_path
+        self.db_path = db_path
+        self.sample_rate = sample_rate
+        self.interval = 1.0 / max_per_second if max_per_second > 0 else 0.0
+        self.queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self.candidate = None
+        self.candidate_version: Optional[str] = None
+        self.error: Optional[str] = None
+        self.enqueued = 0
+        self.dropped = 0
+        self.scored = 0
+        self._counter_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.model_path) and self.error is None
+
+    def sampled(self) -> bool:
+        return self.enabled and random.random() < self.sample_rate
+
+    def enqueue(self, message: str, rule_score: float, primary_score: float, primary,
+                primary_version: str) -> None:
+        """Hand a served message and the pipeline that scored it to the worker; drops it if the queue is full."""
+        try:
+            self.queue.put_nowait((message, rule_score, primary_score, primary, primary_version))
+            counter = "enqueued"
+        except queue.Full:
+            counter = "dropped"
+        with self._counter_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def start(self) -> None:
+        if self.model_path and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="shadow-scorer", daemon=True)
+            self._thread.start()
+
+    # ── worker ──
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _score(self, message: str, rule_score: float, primary: float, primary_pipeline,
+               primary_version: str) -> tuple:
+        df = ml_model._build_dataframe(message, build_features(message))
+        start = time.perf_counter()
+        primary_pipeline.predict_proba(df)
+        primary_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        candidate = float(self.candidate.predict_proba(df)[0][1])
+        candidate_ms = (time.perf_counter() - start) * 1000
+
+        primary_risk = fusion_engine.fuse_scores(rule_score, primary)["risk_level"]
+        candidate_risk = fusion_engine.fuse_scores(rule_score, round(candidate, 4))["risk_level"]
+        return (
+            datetime.utcnow().isoformat(), primary_version, self.candidate_version,
+            rule_score, primary, candidate, candidate - primary,
+            primary_risk, candidate_risk, int(primary_risk != candidate_risk),
+            primary_ms, candidate_ms,
+        )
+
+    def _run(self) -> None:
+        try:
+            candidate = joblib.load(self.model_path)
+            candidate_version = ml_model.artifact_version(self.model_path)
+            conn = self._connect()
+        except Exception as e:
+            self.error = str(e)
+            logger.exception("Shadow scoring disabled: cannot load %s", self.model_path)
+            return
+        # Published only once the results table exists: summary() reads it as soon as there is a version
+        self.candidate, self.candidate_version = candidate, candidate_version
+        logger.info("Shadow scoring %s (candidate %s) at %.0f%% of traffic",
+                    self.model_path, self.candidate_version, self.sample_rate * 100)
+
+        next_at = time.monotonic()
+        while True:
+            items = [self.queue.get()]
+            while len(items) < _BATCH:           # batch whatever else is already waiting
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = []
+            for item in items:
+                # Pace to MAX_PER_SECOND so shadow scoring never takes much of the GIL
+                next_at = max(next_at + self.interval, time.monotonic())
+                time.sleep(max(0.0, next_at - time.monotonic()))
+                try:
+                    rows.append(self._score(*item))
+                except Exception:
+                    logger.exception("Shadow scoring failed for one message")
+            if not rows:
+                continue
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO shadow_results (created_at, primary_version, candidate_version, "
+                        "rule_score, primary_score, candidate_score, score_delta, primary_risk, "
+                        "candidate_risk, risk_disagreement, primary_latency_ms, candidate_latency_ms) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        rows,
+                    )
+                with self._counter_lock:
+                    self.scored += len(rows)
+            except sqlite3.Error:
+                logger.exception("Shadow results write failed; %d rows lost", len(rows))
+
+    # ── reporting ──
+    def summary(self) -> Dict:
+        with self._counter_lock:
+            enqueued, dropped, scored = self.enqueued, self.dropped, self.scored
+        report = {
+            "enabled": self.enabled,
+            "primary_version": ml_model.MODEL_VERSION,
+            "candidate_version": self.candidate_version,
+            "sample_rate": self.sample_rate,
+            "queue_depth": self.queue.qsize(),
+            "enqueued": enqueued,
+            "dropped": dropped,
+            "scored": scored,
+            "error": self.error,
+        }
+        if self.candidate_version is None or not os.path.exists(self.db_path):
+            return report
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            where = "WHERE primary_version = ? AND candidate_version = ?"
+            params = (ml_model.MODEL_VERSION, self.candidate_version)
+            n, mean_delta, mean_abs_delta, disagreements = conn.execute(
+                "SELECT COUNT(*), AVG(score_delta), AVG(ABS(score_delta)), SUM(risk_disagreement) "
+                f"FROM shadow_results {where}", params,
+            ).fetchone()
+
+            def percentile(column: str, q: float) -> Optional[float]:
+                if not n:
+                    return None
+                row = conn.execute(
+                    f"SELECT {column} FROM shadow_results {where} ORDER BY {column} LIMIT 1 OFFSET ?",
+                    params + (min(n - 1, int(q * n)),),
+                ).fetchone()
+                return round(row[0], 3)
+
+            report.update({
+                "compared": n,
+                "mean_delta": mean_delta,
+                "mean_abs_delta": mean_abs_delta,
+                "risk_disagreement_rate": (disagreements or 0) / n if n else None,
+                "latency_ms": {
+                    name: {"p50": percentile(column, 0.50), "p95": percentile(column, 0.95)}
+                    for name, column in (("primary", "primary_latency_ms"),
+                                         ("candidate", "candidate_latency_ms"))
+                },
+            })
+        finally:
+            conn.close()
+        return report
+
+
+_scorer = ShadowScorer(SHADOW_MODEL_PATH, SHADOW_DB_PATH, SAMPLE_RATE, QUEUE_SIZE)
+
+
+def start() -> None:
+    _scorer.start()
+
+
+def sampled() -> bool:
+    return _scorer.sampled()
+
+
+def comparable(result: Dict) -> bool:
+    """Whether an analyze() result's ML score is the primary model's own output for the message."""
+    return (result["degradation"] == "none" and result["campaign_id"] is None
+            and not result["ml"].get("cached"))
+
+
+async def enqueue(message: str, result: Dict) -> None:
+    """
+    Response background task for an analyze() result: async so it runs on
+    the event loop, not the threadpool.
+    """
+    _scorer.enqueue(message, result["rules"]["rule_score"], result["ml"]["scam_probability"],
+                    ml_model._pipeline, ml_model.MODEL_VERSION)
+
+
+def summary() -> Dict:
+    return _scorer.summary()
@@ -0,0 +1,416 @@
+"""
+thread_scoring.py — incremental scoring of a growing conversation thread
+
+Scams build up over a WhatsApp/SMS thread (greeting → courier story →
+payment link). Instead of re-analyzing the whole pasted thread on every new
+message, a ThreadState keeps what the model needs about the thread so far:
+
+  • accumulated in-vocabulary n-gram counts with running Σ coef·weight
+    per linear ensemble member and Σ weight² (linear_head.RunningVector),
+    so the L2-normalized TF-IDF decision is dots / sqrt(Σ weight²)
+    without rebuilding the row
+  • summed numeric features, keyword hits and the phishing flag
+  • the union of matched rules and of pattern-detected scam types
+
+Appending a message featurizes only that message and updates the terms it
+touches, so the cost of an update is proportional to the new message, not
+to the thread. Each update yields the message's own score and the
+cumulative thread score.
+
+Differences from re-analyzing the thread joined with newlines: n-grams and
+the OTP context gate do not span message boundaries.
+
+Thread state is shared by every worker on the host: it lives in its own
+SQLite file (THREAD_DB_PATH, WAL mode), so any worker can serve the next
+message of a thread another worker created. A thread is stored as
+
+  threads          one small row of running aggregates: dots, squared
+                   norm, non-zero term count, numeric sums, keyword hits,
+                   matched rules and scam types (msgpack), message count
+  thread_counts    one row per n-gram the thread contains, with its count
+  thread_messages  one row per message, with its trajectory point
+
+so an append reads and writes the aggregates, the counts of the n-grams
+the new message touches and one new message row, in one BEGIN IMMEDIATE
+transaction (concurrent appends to a thread are applied one at a time).
+Only GET reads the whole trajectory. A thread created under a model that
+has since been swapped out (model_updates) is rebuilt from its stored
+messages, the one path that reads them, on its next append or GET. At most
+THREAD_MAX_ACTIVE threads are kept; threads idle for THREAD_TTL_SECONDS
+expire.
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import msgpack
+import numpy as np
+
+from app.services import ml_model, rule_engine, fusion_engine
+from app.services.features import MessageFeatures, build_features
+from app.services.linear_head import RunningVector, get_head
+
+# ─── Constants ─────────────────────────────────────────────────────────────────
+MAX_ACTIVE = int(os.getenv("THREAD_MAX_ACTIVE", "10000"))
+TTL_SECONDS = float(os.getenv("THREAD_TTL_SECONDS", str(6 * 3600)))
+MAX_MESSAGES = int(os.getenv("THREAD_MAX_MESSAGES", "500"))
+THREAD_DB_PATH = os.getenv("THREAD_DB_PATH", "./threads.db")
+
+_COUNT_BATCH = 500          # n-gram counts per SELECT
+
+_NUMERIC_SUMS = ("length", "num_digits", "num_exclaim", "num_upper", "num_urls")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id     TEXT    PRIMARY KEY,
+    user_id       INTEGER NOT NULL,
+    last_used     REAL    NOT NULL,
+    message_count INTEGER NOT NULL,
+    aggregates    BLOB    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_threads_last_used ON threads (last_used);
+CREATE TABLE IF NOT EXISTS thread_counts (
+    thread_id TEXT    NOT NULL,
+    idx       INTEGER NOT NULL,
+    count     INTEGER NOT NULL,
+    PRIMARY KEY (thread_id, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS thread_messages (
+    thread_id TEXT    NOT NULL,
+    seq       INTEGER NOT NULL,
+    message   TEXT    NOT NULL,
+    point     BLOB    NOT NULL,
+    PRIMARY KEY (thread_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+class ThreadFullError(Exception):
+    """The thread already holds THREAD_MAX_MESSAGES messages."""
+
+
+def _score_block(rule_score: float, scam_probability: float, scam_type: str,
+                 matched_rules: List[str]) -> Dict:
+    fusion = fusion_engine.fuse_scores(rule_score=rule_score, scam_probability=scam_probability)
+    return {
+        "risk_level":    fusion["risk_level"],
+        "final_score":   fusion["final_score"],
+        "rule_score":    rule_score,
+        "ai_score":      round(scam_probability, 4),
+        "scam_type":     scam_type,
+        "matched_rules": matched_rules,
+    }
+
+
+def _scam_type(types_present: List[str], scam_probability: float) -> str:
+    # Same decision as ml_model._detect_scam_type, over the pattern hits so far
+    if scam_probability < ml_model.BEST_THRESHOLD:
+        return "Legitimate Message"
+    return types_present[0] if types_present else "Fraudulent Message"
+
+
+class ThreadState:
+    def __init__(self, user_id: int, thread_id: Optional[str] = None):
+        self.thread_id = thread_id or uuid.uuid4().hex
+        self.user_id = user_id
+        self.last_used = time.time()
+        self.model_version = ml_model.MODEL_VERSION
+        self.head = get_head()
+
+        self.vector = RunningVector(self.head)
+        self.numeric = dict.fromkeys(_NUMERIC_SUMS, 0)
+        self.keyword_hits: set = set()
+        self.phishing_pattern = 0
+        self.matched_rules: List[str] = []
+        self.scam_types: set = set()
+        self.message_count = 0
+        # Whatever of these was loaded: all of them in a fresh or fetched state
+        self.messages: List[str] = []
+        self.trajectory: List[Dict] = []
+
+    # ── persistence ──
+    def dumps(self) -> bytes:
+        """The running aggregates (not the counts, messages or trajectory)."""
+        return msgpack.packb({
+            "model_version":    self.model_version,
+            "dots":             self.vector.dots.tolist(),
+            "sq_norm":          self.vector.sq_norm,
+            "terms":            self.vector.terms,
+            "numeric":          self.numeric,
+            "keyword_hits":     sorted(self.keyword_hits),
+            "phishing_pattern": self.phishing_pattern,
+            "matched_rules":    self.matched_rules,
+            "scam_types":       sorted(self.scam_types),
+        }, use_bin_type=True)
+
+    @classmethod
+    def loads(cls, thread_id: str, user_id: int, last_used: float, message_count: int,
+              blob: bytes) -> "ThreadState":
+        """A state with its aggregates; counts, messages and trajectory are loaded as needed."""
+        data = msgpack.unpackb(blob, raw=False)
+        state = cls(user_id, thread_id)
+        state.last_used = last_used
+        state.message_count = message_count
+        state.model_version = data["model_version"]
+        state.vector.dots = np.asarray(data["dots"], dtype=np.float64)
+        state.vector.sq_norm = data["sq_norm"]
+        state.vector.terms = data["terms"]
+        state.numeric = data["numeric"]
+        state.keyword_hits = set(data["keyword_hits"])
+        state.phishing_pattern = data["phishing_pattern"]
+        state.matched_rules = data["matched_rules"]
+        state.scam_types = set(data["scam_types"])
+        return state
+
+    @property
+    def stale(self) -> bool:
+        """Built with a model that has since been swapped out."""
+        return self.model_version != ml_model.MODEL_VERSION
+
+    def rebuild(self, messages: List[str]) -> None:
+        """Recount the n-grams of `messages` with the served model (feature indices are per model)."""
+        self.head = get_head()
+        self.model_version = ml_model.MODEL_VERSION
+        self.vector = RunningVector(self.head)
+        for message in messages:
+            for idx, added in self.head.ngram_counts(build_features(message).clean_text).items():
+                self.vector.add(idx, added)
+        self.vector.resync()
+
+    def append(self, message: str, f: Optional[MessageFeatures] = None,
+               msg_counts: Optional[Dict[int, int]] = None) -> Dict:
+        """
+        Add one message; returns {"index", "message", "cumulative"} scores.
+        vector.counts must hold the thread's counts of every n-gram in msg_counts.
+        """
+        head = self.head
+        f = f or build_features(message)
+
+        # ── this message alone
+        if msg_counts is None:
+            msg_counts = head.ngram_counts(f.clean_text)
+        msg_rules = rule_engine.analyze_rules(message, f)
+        msg_types = ml_model._scam_types_present(f.lower)
+        msg_prob = head.score_counts(msg_counts, f.numeric_row().values())
+
+        # ── fold the delta into the thread state (only terms this message touches)
+        for idx, added in msg_counts.items():
+            self.vector.add(idx, added)
+
+        if self.message_count:
+            self.numeric["length"] += 1      # newline joining consecutive messages
+        for name in _NUMERIC_SUMS:
+            self.numeric[name] += getattr(f, name)
+        self.keyword_hits.update(f.keyword_hits)
+        self.phishing_pattern |= f.phishing_pattern
+        for rule in msg_rules["matched_rules"]:
+            if rule not in self.matched_rules:
+                self.matched_rules.append(rule)
+        self.scam_types.update(msg_types)
+        self.messages.append(message)
+
+        # ── cumulative score from the running state
+        numeric_row = [
+            self.numeric["length"], self.numeric["num_digits"], self.numeric["num_exclaim"],
+            self.numeric["num_upper"], self.numeric["num_urls"],
+            len(self.keyword_hits), self.phishing_pattern,
+        ]
+        thread_prob = self.vector.probability(numeric_row)
+        thread_types = [t for t in ml_model._SCAM_TYPE_MAP if t in self.scam_types]
+
+        message_score = _score_block(
+            msg_rules["rule_score"], msg_prob,
+            _scam_type(msg_types, msg_prob), msg_rules["matched_rules"],
+        )
+        cumulative = _score_block(
+            rule_engine.score_matched_rules(self.matched_rules), thread_prob,
+            _scam_type(thread_types, thread_prob), list(self.matched_rules),
+        )
+        point = {
+            "index":      self.message_count,
+            "message":    message_score,
+            "cumulative": cumulative,
+        }
+        self.trajectory.append(point)
+        self.message_count += 1
+        self.last_used = time.time()
+        return point
+
+
+def connect(path: str = THREAD_DB_PATH) -> sqlite3.Connection:
+    """Connection in autocommit mode; transactions are explicit BEGIN IMMEDIATE."""
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+class ThreadStore:
+    """Bounded, TTL-expiring table of active threads, shared through THREAD_DB_PATH."""
+
+    def __init__(self, path: str = THREAD_DB_PATH, capacity: int = MAX_ACTIVE, ttl: float = TTL_SECONDS):
+        self.path = path
+        self.capacity = capacity
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection to the store (created on first use)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+    @staticmethod
+    def _drop(conn: sqlite3.Connection, thread_ids: List[str]) -> int:
+        rows = [(thread_id,) for thread_id in thread_ids]
+        conn.executemany("DELETE FROM thread_counts WHERE thread_id = ?", rows)
+        conn.executemany("DELETE FROM thread_messages WHERE thread_id = ?", rows)
+        return conn.executemany("DELETE FROM threads WHERE thread_id = ?", rows).rowcount
+
+    def _expire(self, conn: sqlite3.Connection) -> None:
+        expired = conn.execute(
+            "SELECT thread_id FROM threads WHERE last_used < ? UNION "
+            "SELECT thread_id FROM (SELECT thread_id FROM threads ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (time.time() - self.ttl, self.capacity),
+        ).fetchall()
+        if expired:
+            self._drop(conn, [thread_id for thread_id, in expired])
+
+    def _load(self, conn: sqlite3.Connection, thread_id: str, user_id: int) -> Optional[ThreadState]:
+        """The thread's aggregates, rebuilt (and saved) if its model was swapped out."""
+        row = conn.execute(
+            "SELECT last_used, message_count, aggregates FROM threads "
+            "WHERE thread_id = ? AND user_id = ? AND last_used >= ?",
+            (thread_id, user_id, time.time() - self.ttl),
+        ).fetchone()
+        if row is None:
+            return None
+        state = ThreadState.loads(thread_id, user_id, *row)
+        if state.stale:
+            messages = [m for m, in conn.execute(
+                "SELECT message FROM thread_messages WHERE thread_id = ? ORDER BY seq", (thread_id,)
+            )]
+            state.rebuild(messages)
+            conn.execute("DELETE FROM thread_counts WHERE thread_id = ?", (thread_id,))
+            conn.executemany(
+                "INSERT INTO thread_counts (thread_id, idx, count) VALUES (?, ?, ?)",
+                [(thread_id, int(idx), count) for idx, count in state.vector.counts.items()],
+            )
+            conn.execute("UPDATE threads SET aggregates = ? WHERE thread_id = ?", (state.dumps(), thread_id))
+        return state
+
+    def create(self, user_id: int) -> ThreadState:
+        state = ThreadState(user_id)
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO threads (thread_id, user_id, last_used, message_count, aggregates) "
+                "VALUES (?, ?, ?, 0, ?)",
+                (state.thread_id, user_id, state.last_used, state.dumps()),
+            )
+            self._expire(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return state
+
+    def get(self, thread_id: str, user_id: int) -> Optional[ThreadState]:
+        """The thread with its whole trajectory."""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            state = self._load(conn, thread_id, user_id)
+            if state is not None:
+                state.trajectory = [
+                    msgpack.unpackb(point, raw=False) for point, in conn.execute(
+                        "SELECT point FROM thread_messages WHERE thread_id = ? ORDER BY seq", (thread_id,)
+                    )
+                ]
+                state.last_used = time.time()
+                conn.execute("UPDATE threads SET last_used = ? WHERE thread_id = ?", (state.last_used, thread_id))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return state
+
+    def append(self, thread_id: str, user_id: int, message: str) -> Optional[Dict]:
+        """
+        Score `message` as the thread's next one; None if the thread is gone.
+        Reads and writes the aggregates, the counts this message touches and its own row.
+        """
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            state = self._load(conn, thread_id, user_id)
+            if state is not None:
+                if state.message_count >= MAX_MESSAGES:
+                    raise ThreadFullError(thread_id)
+                f = build_features(message)
+                msg_counts = state.head.ngram_counts(f.clean_text)
+                touched = [int(idx) for idx in msg_counts]
+                for i in range(0, len(touched), _COUNT_BATCH):
+                    batch = touched[i:i + _COUNT_BATCH]
+                    state.vector.counts.update(conn.execute(
+                        f"SELECT idx, count FROM thread_counts WHERE thread_id = ? "
+                        f"AND idx IN ({', '.join('?' * len(batch))})",
+                        (thread_id, *batch),
+                    ))
+                point = state.append(message, f, msg_counts)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO thread_counts (thread_id, idx, count) VALUES (?, ?, ?)",
+                    [(thread_id, idx, state.vector.counts[idx]) for idx in touched],
+                )
+                conn.execute(
+                    "INSERT INTO thread_messages (thread_id, seq, message, point) VALUES (?, ?, ?, ?)",
+                    (thread_id, point["index"], message, msgpack.packb(point, use_bin_type=True)),
+                )
+                conn.execute(
+                    "UPDATE threads SET last_used = ?, message_count = ?, aggregates = ? WHERE thread_id = ?",
+                    (state.last_used, state.message_count, state.dumps(), thread_id),
+                )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return point if state is not None else None
+
+    def delete(self, thread_id: str, user_id: int) -> bool:
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            owned = conn.execute(
+                "SELECT 1 FROM threads WHERE thread_id = ? AND user_id = ?", (thread_id, user_id)
+            ).fetchone()
+            deleted = self._drop(conn, [thread_id]) > 0 if owned else False
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return deleted
+
+
+_store = ThreadStore()
+
+
+def create_thread(user_id: int) -> ThreadState:
+    return _store.create(user_id)
+
+
+def get_thread(thread_id: str, user_id: int) -> Optional[ThreadState]:
+    return _store.get(thread_id, user_id)
+
+
+def append_message(thread_id: str, user_id: int, message: str) -> Optional[Dict]:
+    return _store.append(thread_id, user_id, message)
+
+
+def delete_thread(thread_id: str, user_id: int) -> bool:
+    return _store.delete(thread_id, user_id)
@@ -0,0 +1,209 @@
+"""
+traffic_capture.py — sampled, redacted copies of /api/analyze requests
+
+Synthetic corpora miss the real message mix (long forwarded chains,
+emoji-heavy Hinglish, URL floods). With CAPTURE_SAMPLE_RATE > 0 a sampled
+fraction of /api/analyze requests is handed to a bounded queue after the
+response has been sent; one daemon thread masks PII and appends each one
+as a JSON line to a local capture file, for replay.py:
+
+    {"ts": <arrival, epoch seconds>, "message": <sanitized, masked text>,
+     "fields": <?fields or null>, "compact": <?compact>}
+
+Masking (CAPTURE_MASK, comma-separated, applied in this order):
+    email    local part of e-mail addresses
+    upi      handle of UPI ids (name@bank)
+    aadhaar  12-digit Aadhaar numbers
+    card     13–19 digit card numbers
+    phone    Indian mobile numbers, with or without +91 / 91 / 0 in front,
+             unbroken or split by spaces or dashes (98765 43210, 987-654-3210)
+    account  any other run of 9 or more digits, split or not (bank account,
+             customer and reference numbers of any length)
+    digits   every other digit (OTPs, amounts, PINs)
+    url      path and query of links (the host is kept)
+Masked characters keep their class (upper → X, lower → x, digit → 0), so
+length, digit, capital and URL counts are unchanged (masked numbers still
+fold to numtoken for the model) and a replay exercises the same paths.
+
+NOT MASKED by the default CAPTURE_MASK (email, upi, aadhaar, card, phone,
+account): numbers of up to 8 digits (OTPs, PINs, amounts, short account or
+landline numbers — add `digits` to mask those too), link paths and queries
+(add `url`), names, postal addresses, foreign phone formats, and anything
+spelled out in words.
+Capture files can still hold personal data: keep them on the host and
+delete them after the replay.
+
+Each process writes its own files in CAPTURE_DIR, capture-<start>-<pid>.jsonl,
+starting a new one after CAPTURE_MAX_BYTES; the oldest capture files in the
+directory beyond CAPTURE_MAX_FILES are deleted. The enqueue never blocks:
+when the queue is full the request is dropped and counted.
+"""
+import glob
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ─── Constants ─────────────────────────────────────────────────────────────────
+SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", "0"))
+CAPTURE_DIR = os.getenv("CAPTURE_DIR", "./captures")
+MAX_BYTES = int(os.getenv("CAPTURE_MAX_BYTES", str(64 * 1024 * 1024)))
+MAX_FILES = int(os.getenv("CAPTURE_MAX_FILES", "20"))
+QUEUE_SIZE = int(os.getenv("CAPTURE_QUEUE_SIZE", "1000"))
+MASK = [kind.strip() for kind in os.getenv("CAPTURE_MASK", "email,upi,aadhaar,card,phone,account").split(",")
+        if kind.strip()]
+
+FILE_PATTERN = "capture-*.jsonl"
+
+# kind → (pattern, group to mask)
+_MASKS = {
+    "email":   (re.compile(r"([\w.+-]+)@[\w-]+(?:\.[\w-]+)+"), 1),
+    "upi":     (re.compile(r"([\w.-]+)@[A-Za-z]{2,}\b"), 1),
+    "aadhaar": (re.compile(r"\b\d{4}[ -]?\d{4}[ -]?\d{4}\b"), 0),
+    "card":    (re.compile(r"\b(?:\d[ -]?){12,18}\d\b"), 0),
+    "phone":   (re.compile(r"(?<![\d+])(?:\+?91[ -]?|0)?[6-9]\d{2}(?:[ -]?\d){7}(?!\d)"), 0),
+    "account": (re.compile(r"(?<!\d)\d(?:[ -]?\d){8,}(?!\d)"), 0),
+    "digits":  (re.compile(r"\d+"), 0),
+    "url":     (re.compile(r"https?://[^\s/?#]+([/?#]\S*)"), 1),
+}
+_SHAPE = str.maketrans(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789",
+    "X" * 26 + "x" * 26 + "0" * 10,
+)
+
+
+def mask(text: str, kinds: List[str] = MASK) -> str:
+    """`text` with the PII of the given kinds replaced, character class by class."""
+    for kind in _MASKS:
+        if kind not in kinds:
+            continue
+        pattern, group = _MASKS[kind]
+
+        def shape(match: re.Match) -> str:
+            start, end = match.span(group)
+            whole = match.group(0)
+            offset = match.start(0)
+            return whole[:start - offset] + match.group(group).translate(_SHAPE) + whole[end - offset:]
+
+        text = pattern.sub(shape, text)
+    return text
+
+
+class TrafficCapture:
+    def __init__(self, directory: str, sample_rate: float, queue_size: int,
+                 max_bytes: int, max_files: int, kinds: List[str]):
+        unknown = set(kinds) - set(_MASKS)
+        if unknown:
+            raise ValueError(f"unknown CAPTURE_MASK kinds: {', '.join(sorted(unknown))}")
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.kinds = kinds
+        self.queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+        self._path: Optional[str] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def sampled(self) -> bool:
+        return self.enabled and random.random() < self.sample_rate
+
+    def enqueue(self, received: float, message: str, fields: Optional[str], compact: bool) -> None:
+        """Hand a request to the writer; drops it when the queue is full."""
+        try:
+            self.queue.put_nowait((received, message, fields, compact))
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self) -> None:
+        if self.enabled and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+            self._thread.start()
+
+    # ── writer ──
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        self._path = os.path.join(self.directory, f"capture-{stamp}-{os.getpid()}.jsonl")
+        self._file = open(self._path, "a", encoding="utf-8")
+        # Oldest first by name (start time), across every process writing here
+        files = sorted(glob.glob(os.path.join(self.directory, FILE_PATTERN)), key=os.path.basename)
+        for old in files[:max(0, len(files) - self.max_files)]:
+            if old != self._path:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+    def _run(self) -> None:
+        logger.info("Capturing %.1f%% of /api/analyze requests to %s (masking: %s)",
+                    self.sample_rate * 100, self.directory, ", ".join(self.kinds) or "none")
+        while True:
+            items = [self.queue.get()]
+            while len(items) < 100:             # batch whatever else is already waiting
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = "".join(
+                json.dumps({"ts": received, "message": mask(message, self.kinds), "fields": fields,
+                            "compact": compact}, ensure_ascii=False) + "\n"
+                for received, message, fields, compact in items
+            )
+            try:
+                if self._file is None or self._file.tell() >= self.max_bytes:
+                    self._rotate()
+                self._file.write(lines)
+                self._file.flush()
+                self.written += len(items)
+            except OSError:
+                logger.exception("Capture write failed; %d requests lost", len(items))
+                self._file = None
+
+    def summary(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "file": self._path,
+            "queue_depth": self.queue.qsize(),
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "written": self.written,
+        }
+
+
+_capture = TrafficCapture(CAPTURE_DIR, SAMPLE_RATE, QUEUE_SIZE, MAX_BYTES, MAX_FILES, MASK)
+
+
+def start() -> None:
+    _capture.start()
+
+
+def sampled() -> bool:
+    return _capture.sampled()
+
+
+async def enqueue(received: float, message: str, fields: Optional[str], compact: bool) -> None:
+    """Response background task: async so it runs on the event loop, not the threadpool."""
+    _capture.enqueue(received, message, fields, compact)
+
+
+def summary() -> Dict:
+    return _capture.summary()
@@ -0,0 +1,105 @@
+"""
+warmup.py — bring a worker to steady-state before it receives traffic
+
+Importing ml_model loads the pipeline, but the first real request would
+still pay for sklearn/scipy's lazily initialized code paths, pandas' first
+DataFrame construction, the `re` module's pattern cache (phishing patterns,
+highlight patterns) and the linear head's extraction from the pipeline.
+
+run() sends a small corpus covering each scam type plus benign messages
+through analysis_pipeline.analyze — rules, campaign lookup, result cache,
+ML with contributing words and highlighting, fusion, explanation and the
+visualization block — in the full and the rules_only (linear head) tiers,
+encodes each response, and feeds a live-scoring session. Since the shared
+result cache may already answer the corpus (another worker warmed up), the
+model is also run directly. Nothing is written to the database; warm-up
+verdicts are the served model's real ones, so the campaign index and the
+result cache may keep them.
+
+/health/ready reports ready only after run() has succeeded. A warm-up that
+raises is retried up to WARMUP_ATTEMPTS times, WARMUP_RETRY_SECONDS apart;
+if every attempt fails the worker stays not-ready (503 with the error), so
+the orchestrator restarts it instead of routing traffic to a worker whose
+analyze chain is broken.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Dict
+
+from app.services import analysis_pipeline, ml_model
+from app.services.live_scoring import LiveSession
+from app.utils.response_encoder import encode_analyze_response
+
+logger = logging.getLogger(__name__)
+
+# ─── Constants ─────────────────────────────────────────────────────────────────
+ATTEMPTS = max(1, int(os.getenv("WARMUP_ATTEMPTS", "3")))
+RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+
+WARMUP_MESSAGES = [
+    "Dear customer, your SBI account will be blocked today. Share the OTP sent to your mobile to avoid suspension.",
+    "Your KYC is pending. Update immediately at http://sbi-kyc-update.xyz/verify or your UPI will be deactivated.",
+    "Congratulations! You have WON Rs 25,00,000 in the lucky winner draw. Click here to claim your prize!!!",
+    "This is CBI. An arrest warrant is issued against your Aadhaar. Pay the fine now to avoid legal action.",
+    "Work from home job offer: earn 5000 daily. Pay registration fee of Rs 499 to confirm your seat.",
+    "Your courier parcel is held at customs. Pay Rs 49 at bit.ly/parcel-fee within 24 hours.",
+    "Income tax refund of Rs 15,490 approved. Verify your bank account details to receive it.",
+    "Your OTP for login is 482931. Do not share this OTP with anyone.",
+    "Hi, are we still meeting for lunch tomorrow at 1pm?",
+    "Your Amazon order has been shipped and will arrive on Friday.",
+]
+
+_lock = threading.Lock()
+_state: Dict = {"ready": False, "failed": False, "attempts": 0, "duration_ms": None, "messages": 0, "error": None}
+
+
+def _analyze_once(message: str, live: LiveSession) -> None:
+    result = analysis_pipeline.analyze(message)
+    encode_analyze_response(analysis_pipeline.response_values(result, None))
+    analysis_pipeline.analyze(message, tier="rules_only")
+    ml_model.predict(message)
+    live.update(message)
+
+
+def run(rounds: int = 2) -> None:
+    """
+    Run the warm-up corpus `rounds` times, then mark the worker ready.
+    Failed attempts are retried; after ATTEMPTS failures the worker stays not-ready.
+    """
+    for attempt in range(1, ATTEMPTS + 1):
+        start = time.perf_counter()
+        live = LiveSession()
+        try:
+            for _ in range(rounds):
+                for message in WARMUP_MESSAGES:
+                    _analyze_once(message, live)
+        except Exception as e:
+            logger.exception("Warm-up attempt %d of %d failed", attempt, ATTEMPTS)
+            with _lock:
+                _state.update(attempts=attempt, error=str(e), failed=attempt == ATTEMPTS)
+            if attempt < ATTEMPTS:
+                time.sleep(RETRY_SECONDS)
+            continue
+        duration_ms = round((time.perf_counter() - start) * 1000, 1)
+        with _lock:
+            _state.update(ready=True, attempts=attempt, duration_ms=duration_ms,
+                          messages=rounds * len(WARMUP_MESSAGES), error=None)
+        logger.info("Warm-up finished in %.1f ms (%d messages)", duration_ms, rounds * len(WARMUP_MESSAGES))
+        return
+    logger.error("Warm-up failed %d times; worker stays not ready", ATTEMPTS)
+
+
+def start() -> None:
+    """Warm up in the background; /health/ready stays 503 until it finishes."""
+    threading.Thread(target=run, name="warmup", daemon=True).start()
+
+
+def is_ready() -> bool:
+    return _state["ready"]
+
+
+def status() -> Dict:
+    with _lock:
+        return dict(_state)
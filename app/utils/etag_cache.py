@@ -0,0 +1,143 @@
+"""
+etag_cache.py — conditional GET for the per-user dashboard endpoints.
+
+/api/stats and /api/history are polled every few seconds, and their
+content only changes when the user stores a new analysis (rows are never
+updated). Each user therefore has a cheap version token, (latest analysis
+id, analysis count), which is:
+
+  • bumped in memory by analysis_pipeline.save on this worker;
+  • re-read with one indexed query once it is older than
+    ETAG_VERSION_TTL_SECONDS, so inserts made by other gunicorn workers
+    show up within that time.
+
+The ETag hashes the endpoint, its query parameters and the version token
+(and, for stats, today's date, since the 14-day trend rolls over at
+midnight). A matching If-None-Match returns 304 without running the
+endpoint's query or serializing anything. Otherwise the last rendered body
+per (user, endpoint, parameters) is served from a small LRU when its ETag
+still matches, and is rendered and stored only when it does not. The LRU
+holds at most ETAG_BODY_CACHE_SIZE bodies and ETAG_BODY_CACHE_BYTES bytes;
+bodies larger than a sixteenth of that are served but never cached.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.database.models import AnalyzedMessage
+
+# ─── Constants ─────────────────────────────────────────────────────────────────
+VERSION_TTL = float(os.getenv("ETAG_VERSION_TTL_SECONDS", "2"))
+BODY_CACHE_SIZE = int(os.getenv("ETAG_BODY_CACHE_SIZE", "2048"))
+BODY_CACHE_BYTES = int(os.getenv("ETAG_BODY_CACHE_BYTES", str(32 * 1024 * 1024)))
+CACHE_CONTROL = "private, no-cache"     # always revalidate, never reuse blindly
+
+
+class UserVersions:
+    """user_id → (latest analysis id, count, checked_at)."""
+
+    def __init__(self, ttl: float = VERSION_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._versions: Dict[int, Tuple[int, int, float]] = {}
+
+    def get(self, db: Session, user_id: int) -> Tuple[int, int]:
+        with self._lock:
+            cached = self._versions.get(user_id)
+        if cached and time.monotonic() - cached[2] < self.ttl:
+            return cached[0], cached[1]
+        latest, count = (
+            db.query(func.max(AnalyzedMessage.id), func.count(AnalyzedMessage.id))
+            .filter(AnalyzedMessage.user_id == user_id)
+            .one()
+        )
+        version = (latest or 0, count)
+        with self._lock:
+            self._versions[user_id] = version + (time.monotonic(),)
+        return version
+
+    def bump(self, user_id: int, analysis_id: int) -> None:
+        """Record an insert made by this worker (keeps the TTL window)."""
+        with self._lock:
+            cached = self._versions.get(user_id)
+            if cached is not None:
+                self._versions[user_id] = (max(cached[0], analysis_id), cached[1] + 1, cached[2])
+
+
+class BodyCache:
+    """LRU of key → (etag, rendered body), bounded in entries and in bytes."""
+
+    def __init__(self, capacity: int = BODY_CACHE_SIZE, max_bytes: int = BODY_CACHE_BYTES):
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.max_body = max_bytes // 16
+        self.size = 0           # bytes of the cached bodies
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, Tuple[str, bytes]]" = OrderedDict()
+
+    def get(self, key: tuple, etag: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: tuple, etag: str, body: bytes) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1])
+            if len(body) > self.max_body:
+                return
+            self._entries[key] = (etag, body)
+            self.size += len(body)
+            while len(self._entries) > self.capacity or self.size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+_versions = UserVersions()
+_bodies = BodyCache()
+
+
+def bump(user_id: int, analysis_id: int) -> None:
+    _versions.bump(user_id, analysis_id)
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def conditional_response(
+    request: Request,
+    db: Session,
+    user_id: int,
+    endpoint: str,
+    params: tuple,
+    render: Callable[[], bytes],
+) -> Response:
+    """304, cached body or freshly rendered body for a per-user GET endpoint."""
+    latest, count = _versions.get(db, user_id)
+    digest = hashlib.blake2b(repr((endpoint, params, user_id, latest, count)).encode(), digest_size=12)
+    etag = f'"{digest.hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+    if _matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    key = (user_id, endpoint, params)
+    body = _bodies.get(key, etag)
+    if body is None:
+        body = render()
+        _bodies.put(key, etag, body)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -23,6 +23,16 @@ def deserialize_list(data: str) -> list:
         return []
 
 
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def csv_safe(value):
+    """A CSV cell a spreadsheet will not evaluate: text starting like a formula gets a leading '."""
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
 def format_score(score: float) -> str:
     """Format a float score as a percentage string."""
     return f"{score:.1%}"
@@ -0,0 +1,102 @@
+"""
+job_files.py — reading uploaded message files and writing job results
+
+Uploads are read as a stream, one message at a time, so a 100k-line file
+is never held in memory as a whole:
+
+    .csv              a "message" or "text" column (header required)
+    .jsonl / .ndjson  one JSON string, or object with "message"/"text", per line
+    anything else     plain text, one message per line
+
+Blank lines are skipped and every message goes through sanitize_input.
+Results are written back as NDJSON or CSV in ~64 KB chunks; CSV cells that
+would start a spreadsheet formula are escaped (helpers.csv_safe).
+"""
+import csv
+import io
+from typing import BinaryIO, Iterable, Iterator
+
+import orjson
+
+from app.services.job_queue import RESULT_COLUMNS
+from app.utils.helpers import csv_safe, sanitize_input
+
+RESULT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv":    ("text/csv", "csv"),
+}
+_TEXT_KEYS = ("message", "text")
+_CHUNK_BYTES = 64 * 1024
+
+
+class UploadFormatError(ValueError):
+    """The upload cannot be parsed as the format its name implies."""
+
+
+def _from_csv(stream: io.TextIOWrapper) -> Iterator[str]:
+    reader = csv.reader(stream)
+    header = [h.strip().lower() for h in next(reader, [])]
+    column = next((header.index(k) for k in _TEXT_KEYS if k in header), None)
+    if column is None:
+        raise UploadFormatError("CSV uploads need a 'message' or 'text' column.")
+    for row in reader:
+        if column < len(row):
+            yield row[column]
+
+
+def _from_ndjson(stream: io.TextIOWrapper) -> Iterator[str]:
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            value = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            raise UploadFormatError(f"Line {number} is not valid JSON.")
+        if isinstance(value, dict):
+            value = next((value[k] for k in _TEXT_KEYS if k in value), None)
+        if not isinstance(value, str):
+            raise UploadFormatError(f"Line {number} has no 'message' or 'text' string.")
+        yield value
+
+
+def iter_messages(fileobj: BinaryIO, filename: str = "") -> Iterator[str]:
+    """Sanitized, non-empty messages of an uploaded file, in order."""
+    stream = io.TextIOWrapper(fileobj, encoding="utf-8-sig", errors="replace", newline="")
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        raw = _from_csv(stream)
+    elif name.endswith((".jsonl", ".ndjson")):
+        raw = _from_ndjson(stream)
+    else:
+        raw = (line.rstrip("\r\n") for line in stream)
+    for message in raw:
+        message = sanitize_input(message)
+        if message:
+            yield message
+
+
+def _csv_lines(rows: Iterable[dict]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(RESULT_COLUMNS)
+    for row in rows:
+        row["matched_rules"] = "; ".join(row["matched_rules"])
+        row["suspicious_phrases"] = "; ".join(row["suspicious_phrases"])
+        writer.writerow([csv_safe(row[c]) for c in RESULT_COLUMNS])
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+
+
+def encode_results(rows: Iterable[dict], fmt: str) -> Iterator[bytes]:
+    """Result rows (job_queue.iter_results) as NDJSON or CSV chunks."""
+    lines = _csv_lines(rows) if fmt == "csv" else (orjson.dumps(r) + b"\n" for r in rows)
+    pending, size = [], 0
+    for line in lines:
+        pending.append(line)
+        size += len(line)
+        if size >= _CHUNK_BYTES:
+            yield b"".join(pending)
+            pending, size = [], 0
+    if pending:
+        yield b"".join(pending)
@@ -0,0 +1,79 @@
+"""
+response_encoder.py — fast JSON path for /api/analyze responses.
+
+The regular path builds AnalyzeResponse (plus nested VisualizationBlock,
+RiskMeterViz and WordImpact models), then FastAPI validates it again against
+response_model and serializes it with json.dumps. Here the route hands over
+plain values and the response is encoded with orjson, field by field in
+AnalyzeResponse order, splicing in the pre-encoded safety_advice and
+scam_type_info fragments from explanation_engine. The bytes are identical to
+what FastAPI would send for the same values.
+
+A request may ask for a subset of the fields (select_fields: ?fields=a,b or
+?compact=true); only those are encoded, in model order.
+"""
+from typing import Any, Dict, Optional, Tuple, Type
+
+import orjson
+from fastapi import Response
+from pydantic import BaseModel
+
+from app.schemas.analysis_schemas import AnalyzeResponse
+from app.services import explanation_engine
+
+_FIELDS = list(AnalyzeResponse.model_fields)
+_KEY_PREFIX = {name: orjson.dumps(name) + b":" for name in _FIELDS}
+_DEFAULTS = {
+    name: orjson.dumps(field.default)
+    for name, field in AnalyzeResponse.model_fields.items()
+    if not field.is_required()
+}
+
+
+def select_fields(
+    model: Type[BaseModel], fields: Optional[str], compact: bool, compact_fields: Tuple[str, ...],
+) -> Optional[Tuple[str, ...]]:
+    """
+    The response fields a request asked for, in `model` order: the
+    comma-separated `fields`, else `compact_fields` when compact is set.
+    None means every field. Raises ValueError on unknown names.
+    """
+    if fields is None:
+        return compact_fields if compact else None
+    names = {name.strip() for name in fields.split(",") if name.strip()}
+    if not names:
+        raise ValueError("fields must name at least one field.")
+    unknown = names.difference(model.model_fields)
+    if unknown:
+        raise ValueError(
+            f"Unknown fields: {', '.join(sorted(unknown))}. Choose from: {', '.join(model.model_fields)}."
+        )
+    return tuple(name for name in model.model_fields if name in names)
+
+
+def encode_analyze_response(values: Dict[str, Any], fields: Optional[Tuple[str, ...]] = None) -> bytes:
+    """
+    Encode an analyze result as AnalyzeResponse JSON, or only `fields` of it.
+
+    `values` holds the AnalyzeResponse fields as plain Python values (the
+    visualization block as a nested dict). safety_advice and scam_type_info
+    are taken from the pre-encoded fragments for values["risk_level"] and
+    values["scam_type"], exactly as generate_explanation selects them.
+    """
+    parts = []
+    for name in _FIELDS if fields is None else fields:
+        if name == "safety_advice":
+            fragment = explanation_engine.encoded_safety_advice(values["risk_level"])
+        elif name == "scam_type_info":
+            fragment = explanation_engine.encoded_scam_type_info(values["scam_type"])
+        elif name in values:
+            fragment = orjson.dumps(values[name])
+        else:
+            fragment = _DEFAULTS[name]
+        parts.append(_KEY_PREFIX[name] + fragment)
+    return b"{" + b",".join(parts) + b"}"
+
+
+def analyze_response(values: Dict[str, Any], fields: Optional[Tuple[str, ...]] = None) -> Response:
+    """Response that bypasses response_model validation and re-serialization."""
+    return Response(content=encode_analyze_response(values, fields), media_type="application/json")
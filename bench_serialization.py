@@ -0,0 +1,98 @@
+"""
+Serialization micro-benchmark for /api/analyze responses.
+
+Compares the Pydantic path (AnalyzeResponse models → response_model
+validation → JSONResponse) with the orjson fast path in
+app/utils/response_encoder.py, checks both produce identical bytes, and
+reports CPU time per response. Run from backend/ with:
+  python bench_serialization.py [iterations]
+"""
+import asyncio
+import sys
+import time
+
+sys.path.insert(0, ".")
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi._compat import ModelField
+from fastapi.utils import create_response_field
+
+from app.schemas.analysis_schemas import AnalyzeResponse, VisualizationBlock, RiskMeterViz, WordImpact
+from app.services import rule_engine, ml_model, fusion_engine, explanation_engine
+from app.utils.response_encoder import encode_analyze_response
+
+MESSAGES = [
+    "Your SBI account will be blocked. Share your OTP immediately to avoid arrest.",
+    "Click http://bit.ly/fakelink to verify KYC or account suspended in 24 hours.",
+    "Your OTP for login is 482931. Do not share this OTP with anyone.",
+    "Your Amazon order has been shipped. Track it at amazon.in.",
+]
+
+FIELD: ModelField = create_response_field(name="response", type_=AnalyzeResponse)
+
+
+def _values(message: str) -> dict:
+    rules = rule_engine.analyze_rules(message)
+    ml = ml_model.predict(message)
+    fusion = fusion_engine.fuse_scores(rules["rule_score"], ml["scam_probability"])
+    expl = explanation_engine.generate_explanation(
+        rules["matched_rules"], ml["scam_type"], fusion["risk_level"],
+        fusion["final_score"], ml["scam_probability"],
+    )
+    return {
+        "risk_level": fusion["risk_level"],
+        "final_score": fusion["final_score"],
+        "rule_score": rules["rule_score"],
+        "ai_score": ml["scam_probability"],
+        "scam_type": ml["scam_type"],
+        "matched_rules": rules["matched_rules"],
+        "suspicious_phrases": rules["suspicious_phrases"],
+        "explanation": expl["explanation"],
+        "scam_type_info": expl["scam_type_info"],
+        "safety_advice": expl["safety_advice"],
+        "analysis_id": 1,
+        "visualization": {
+            "risk_meter": {"score_percentage": round(fusion["final_score"] * 100, 1), "meter_color": "red"},
+            "feature_importance": [{"word": w["word"], "impact": w["impact"]} for w in ml["contributing_words"]],
+            "highlighted_text": ml["highlighted_text"],
+        },
+    }
+
+
+async def pydantic_path(v: dict) -> bytes:
+    viz = v["visualization"]
+    model = AnalyzeResponse(
+        **{k: v[k] for k in v if k != "visualization"},
+        visualization=VisualizationBlock(
+            risk_meter=RiskMeterViz(**viz["risk_meter"]),
+            feature_importance=[WordImpact(**w) for w in viz["feature_importance"]],
+            highlighted_text=viz["highlighted_text"],
+        ),
+    )
+    content = await serialize_response(field=FIELD, response_content=model, is_coroutine=True)
+    return JSONResponse(content).body
+
+
+async def fast_path(v: dict) -> bytes:
+    return encode_analyze_response(v)
+
+
+async def bench(fn, values, n):
+    start = time.process_time()
+    for _ in range(n):
+        for v in values:
+            await fn(v)
+    return (time.process_time() - start) / (n * len(values)) * 1e6
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    values = [_values(m) for m in MESSAGES]
+    for v in values:
+        assert asyncio.run(pydantic_path(v)) == asyncio.run(fast_path(v)), "fast path output differs"
+    print("[OK] fast path output identical to response_model path")
+    slow = asyncio.run(bench(pydantic_path, values, n))
+    fast = asyncio.run(bench(fast_path, values, n))
+    print(f"  response_model path : {slow:8.1f} µs CPU / response")
+    print(f"  fast path           : {fast:8.1f} µs CPU / response  ({slow / fast:.1f}x)")
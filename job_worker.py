@@ -0,0 +1,133 @@
+"""
+Bulk analysis job workers.
+
+Runs --processes worker processes against the local job queue
+(app/services/job_queue.py, JOBS_DB_PATH). Each process loads the model
+once, then repeatedly leases a chunk of an uploaded job, scores it with
+analysis_pipeline.analyze_batch (rules → vectorized ML → fusion) and
+commits the chunk's results and progress in one transaction.
+
+Workers pick up published feedback updates (app/services/model_updates.py)
+between chunks, every MODEL_UPDATE_INTERVAL seconds, and load the
+reputation blocklists at start (re-read every REPUTATION_RELOAD_SECONDS),
+so rule scores match the API's.
+
+Stopping (Ctrl-C / SIGTERM) lets every process finish the chunk in hand.
+A process that dies mid-chunk is restarted, and its chunk is re-leased
+once JOB_LEASE_SECONDS has passed, so jobs resume from their last committed
+chunk. Idle workers purge jobs finished more than JOB_RETENTION_HOURS ago.
+
+Run from backend/ (next to the API, so JOBS_DB_PATH resolves the same) with:
+  python job_worker.py [--processes 2] [--poll 0.5]
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+
+sys.path.insert(0, ".")
+
+logger = logging.getLogger("fraudshield.jobs")
+
+_MIN_LENGTH = 5          # AnalyzeRequest.message min_length
+_PURGE_EVERY = 3600.0
+
+
+def process_chunk(messages):
+    """[(seq, message)] → [(seq, result)]; too-short messages get an error instead."""
+    from app.services import analysis_pipeline
+
+    valid = [(seq, m) for seq, m in messages if len(m) >= _MIN_LENGTH]
+    scored = dict(zip((seq for seq, _ in valid), analysis_pipeline.analyze_batch([m for _, m in valid])))
+    error = {"error": f"Message must be at least {_MIN_LENGTH} characters."}
+    return [(seq, scored.get(seq, error)) for seq, _ in messages]
+
+
+def run_worker(stop, poll: float) -> None:
+    """Worker process body: claim → score → commit until `stop` is set."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)     # the parent coordinates shutdown
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    from app.services import job_queue, ml_model, model_updates, reputation   # loads the model once per process
+
+    reputation.ensure_loaded()      # the same blocklists as the API, kept fresh by its reload thread
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    conn = job_queue.connect()
+    logger.info("Worker %s ready", worker_id)
+    last_purge = last_reload = 0.0
+    while not stop.is_set():
+        if model_updates.UPDATE_INTERVAL > 0 and time.monotonic() - last_reload > model_updates.UPDATE_INTERVAL:
+            try:
+                model_updates.reload()       # score with the model version the API serves
+            except Exception:
+                logger.exception("Model reload failed; keeping version %s", ml_model.MODEL_VERSION)
+            last_reload = time.monotonic()
+        claimed = job_queue.claim(conn, worker_id)
+        if claimed is None:
+            if time.monotonic() - last_purge > _PURGE_EVERY:
+                purged = job_queue.purge(conn)
+                if purged:
+                    logger.info("Purged %d finished jobs", purged)
+                last_purge = time.monotonic()
+            stop.wait(poll)
+            continue
+        job_id, chunk, messages = claimed
+        start = time.perf_counter()
+        try:
+            results = process_chunk(messages)
+        except Exception:
+            logger.exception("Job %s chunk %d failed; releasing it", job_id, chunk)
+            job_queue.release(conn, worker_id, job_id, chunk)
+            continue
+        if job_queue.complete(conn, worker_id, job_id, chunk, results):
+            logger.info("Job %s chunk %d: %d messages in %.0f ms",
+                        job_id, chunk, len(results), (time.perf_counter() - start) * 1000)
+        else:
+            logger.warning("Job %s chunk %d discarded (lease lost or job no longer running)", job_id, chunk)
+    conn.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--processes", type=int, default=int(os.getenv("JOB_WORKERS", "1")))
+    parser.add_argument("--poll", type=float, default=0.5, help="idle poll interval in seconds")
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO"),
+        format="%(asctime)s %(levelname)s [FraudShield] %(name)s: %(message)s",
+    )
+
+    stop = multiprocessing.Event()
+    stopping = []
+
+    def spawn():
+        proc = multiprocessing.Process(target=run_worker, args=(stop, args.poll), daemon=True)
+        proc.start()
+        return proc
+
+    def shutdown(signum, frame):
+        # Only flag it here: Event.set() from a handler can deadlock on the Event's own lock
+        stopping.append(signum)
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    workers = [spawn() for _ in range(args.processes)]
+    while not stopping:
+        for i, proc in enumerate(workers):
+            if not proc.is_alive():
+                logger.error("Worker pid %s exited with code %s; restarting", proc.pid, proc.exitcode)
+                workers[i] = spawn()
+        time.sleep(1.0)
+    logger.info("Stopping workers after their current chunk")
+    stop.set()
+    for proc in workers:
+        proc.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
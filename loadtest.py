@@ -0,0 +1,435 @@
+"""
+Concurrent load test of the production deployment (gunicorn + uvicorn).
+
+Starts the app the way the README deploys it:
+
+  gunicorn main:app -k uvicorn.workers.UvicornWorker
+
+on a free local port, against a throwaway SQLite database in a temp
+directory, waits for /health/ready, signs up --users test users through
+/auth/signup, then drives /api/analyze, /api/history and /api/stats with a
+weighted --mix from --concurrency client threads (one keep-alive connection
+each) for --duration seconds.
+
+Two load models:
+  --rate R   open loop: request i is due at start + i/R whatever happened to
+             earlier requests, and its latency is measured from that due
+             time, so a server that falls behind is charged for the
+             queueing it causes (no coordinated omission)
+  --rate 0   closed loop: every thread sends its next request as soon as
+             the previous one returns (maximum throughput)
+
+Messages come from a synthetic corpus: templated scams of every type
+(bank/KYC, OTP, lottery, job, courier, impersonation, refund) with varied
+banks, amounts, links and UPI handles; a share of campaign texts repeated
+verbatim across users; and benign messages (OTP notices, deliveries,
+personal chat).
+
+The server runs with SERVER_TIMING=1, so every analyze response carries
+its stage durations (queue, features, rules, ml, fusion, explanation,
+visualization, persist); "outside" is the client latency not spent in
+those stages (HTTP, framework, serialization, network).
+
+The JSON report (--report) holds the configuration, throughput, error
+rates and status codes, p50/p95/p99/mean/max latency per endpoint and in
+total, per-stage percentiles and the degradation tiers served. Pass
+--baseline with an earlier report to print the change per endpoint.
+
+Run from backend/ with:
+  python loadtest.py [--workers 2] [--concurrency 16] [--rate 0]
+         [--duration 30] [--warmup 5] [--users 8]
+         [--mix analyze=70,history=20,stats=10]
+         [--report loadtest_report.json] [--baseline old_report.json]
+  python loadtest.py --url http://host:port ...   # existing server, no spawn
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+ENDPOINTS = {
+    "analyze": ("POST", "/api/analyze"),
+    "history": ("GET", "/api/history?limit=20"),
+    "stats":   ("GET", "/api/stats"),
+}
+STAGES = ("queue", "features", "rules", "ml", "fusion", "explanation", "visualization", "persist")
+PERCENTILES = (0.50, 0.95, 0.99)
+
+# ─── Synthetic corpus ─────────────────────────────────────────────────────────
+BANKS = ["SBI", "HDFC", "ICICI", "Axis", "PNB", "Kotak", "Bank of Baroda", "Canara Bank"]
+DOMAINS = ["bit.ly/{w}", "tinyurl.com/{w}", "{b}-kyc-update.xyz/verify", "secure-{b}.online/login",
+           "{b}-rewards.top/claim", "customs-parcel.in/{w}"]
+SCAM_TEMPLATES = [
+    "Dear customer, your {bank} account will be blocked today. Update KYC at {link} immediately.",
+    "Your {bank} debit card is suspended. Share the OTP sent to your mobile to reactivate it.",
+    "ALERT: {bank} netbanking locked due to suspicious login. Verify now {link} or lose access in 24 hours.",
+    "Congratulations! You have WON Rs {amount} in the {bank} lucky draw. Pay processing fee to {upi} to claim.",
+    "Work from home job: earn Rs {small} daily by liking videos. Registration fee Rs 499 to {upi}.",
+    "Your parcel is held at customs. Pay Rs {small} duty at {link} within 24 hours or it will be returned.",
+    "This is CBI cyber cell. An arrest warrant is issued on your Aadhaar. Pay Rs {amount} fine to avoid arrest.",
+    "Income tax refund of Rs {amount} approved. Verify your {bank} account details at {link} to receive it.",
+    "Electricity connection will be disconnected tonight at 9.30 pm. Call officer {phone} immediately.",
+    "Hi mom, I lost my phone, this is my new number. Please send Rs {small} urgently to {upi}.",
+]
+BENIGN_TEMPLATES = [
+    "Your OTP for login is {otp}. Do not share this OTP with anyone. -{bank}",
+    "Rs {small} debited from your {bank} account for UPI txn {otp}. Not you? Call your branch.",
+    "Your Amazon order has been shipped and will arrive on {day}.",
+    "Hi, are we still meeting for lunch on {day} at 1pm?",
+    "Reminder: your electricity bill of Rs {small} is due on {day}. Pay via the official app.",
+    "Can you send me the notes from today's class? Exam is on {day}.",
+    "Your appointment with Dr. Mehta is confirmed for {day} at 11:30 am.",
+]
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def build_corpus(rng: random.Random, size: int = 2000, campaign_share: float = 0.2,
+                 scam_share: float = 0.6) -> list:
+    """Synthetic traffic; campaign texts repeat verbatim, the rest are unique fills."""
+    def fill(template: str) -> str:
+        bank = rng.choice(BANKS)
+        slug = bank.lower().replace(" ", "")
+        link = "http://" + rng.choice(DOMAINS).format(w=f"{slug}{rng.randint(10, 999)}", b=slug)
+        return template.format(
+            bank=bank, link=link,
+            amount=f"{rng.randint(5, 99)},{rng.randint(0, 99):02d},000",
+            small=rng.choice([49, 99, 499, 1500, 2999, 5000]),
+            upi=f"{rng.choice(['pay', 'refund', 'help', 'claim'])}{rng.randint(100, 9999)}@{rng.choice(['ybl', 'paytm', 'okaxis'])}",
+            phone=f"9{rng.randint(100000000, 999999999)}",
+            otp=rng.randint(100000, 999999), day=rng.choice(DAYS),
+        )
+
+    campaigns = [fill(rng.choice(SCAM_TEMPLATES)) for _ in range(25)]
+    corpus = []
+    for _ in range(size):
+        roll = rng.random()
+        if roll < campaign_share:
+            corpus.append(rng.choice(campaigns))
+        elif roll < scam_share:
+            corpus.append(fill(rng.choice(SCAM_TEMPLATES)))
+        else:
+            corpus.append(fill(rng.choice(BENIGN_TEMPLATES)))
+    return corpus
+
+
+# ─── Server ───────────────────────────────────────────────────────────────────
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, workdir: str, port: int) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'loadtest.db')}",
+        SERVER_TIMING="1",
+        SKETCH_DIR=os.path.join(workdir, "score_sketches"),
+        SHADOW_DB_PATH=os.path.join(workdir, "shadow.db"),
+        LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"),
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "main:app", "-k", "uvicorn.workers.UvicornWorker",
+         "--bind", f"127.0.0.1:{port}", "--workers", str(workers)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+    )
+
+
+def stop_server(proc: subprocess.Popen) -> None:
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def wait_ready(host: str, port: int, proc: subprocess.Popen = None,
+               timeout: float = 120.0, checks: int = 8) -> None:
+    """Poll /health/ready until `checks` consecutive probes succeed (one per worker, roughly)."""
+    deadline, ok = time.time() + timeout, 0
+    while ok < checks:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"server exited with code {proc.returncode}")
+        if time.time() > deadline:
+            raise RuntimeError("server did not become ready in time")
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=5)
+            conn.request("GET", "/health/ready")
+            ok = ok + 1 if conn.getresponse().status == 200 else 0
+            conn.close()
+        except OSError:
+            ok = 0
+        time.sleep(0.25)
+
+
+def signup_users(host: str, port: int, count: int, run_id: str) -> list:
+    tokens = []
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    for i in range(count):
+        body = json.dumps({"name": f"Load Tester {i}", "email": f"load{i}-{run_id}@example.com",
+                           "password": "loadtest-password"})
+        conn.request("POST", "/auth/signup", body=body, headers={"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        data = json.loads(resp.read())
+        if resp.status != 201:
+            raise RuntimeError(f"signup failed ({resp.status}): {data}")
+        tokens.append(data["access_token"])
+    conn.close()
+    return tokens
+
+
+# ─── Load generation ──────────────────────────────────────────────────────────
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {name: [] for name in ENDPOINTS}
+        self.status = {name: {} for name in ENDPOINTS}
+        self.errors = {name: 0 for name in ENDPOINTS}
+        self.stages = {stage: [] for stage in STAGES + ("outside",)}
+        self.degradation = {}
+
+    def add(self, name: str, latency_ms: float, status: str, ok: bool,
+            timings: dict = None, degradation: str = None) -> None:
+        with self.lock:
+            self.latencies[name].append(latency_ms)
+            self.status[name][status] = self.status[name].get(status, 0) + 1
+            if not ok:
+                self.errors[name] += 1
+            if timings:
+                for stage, ms in timings.items():
+                    self.stages.setdefault(stage, []).append(ms)
+                self.stages["outside"].append(max(0.0, latency_ms - sum(timings.values())))
+            if degradation:
+                self.degradation[degradation] = self.degradation.get(degradation, 0) + 1
+
+
+def _parse_server_timing(header: str) -> dict:
+    timings = {}
+    for part in header.split(","):
+        name, _, dur = part.strip().partition(";dur=")
+        if dur:
+            timings[name] = float(dur)
+    return timings
+
+
+class Schedule:
+    """Hands out (endpoint, due time); open loop when rate > 0."""
+
+    def __init__(self, mix: dict, rate: float, start: float, end: float, seed: int):
+        self.names = list(mix)
+        self.weights = [mix[n] for n in self.names]
+        self.rate, self.start, self.end = rate, start, end
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.issued = 0
+
+    def next(self):
+        with self.lock:
+            due = self.start + self.issued / self.rate if self.rate else time.perf_counter()
+            if due >= self.end:
+                return None
+            self.issued += 1
+            return self.rng.choices(self.names, self.weights)[0], due
+
+
+def _client(host, port, schedule, tokens, corpus, recorder, record_after, seed):
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection(host, port, timeout=60)
+    while True:
+        item = schedule.next()
+        if item is None:
+            break
+        name, due = item
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        method, path = ENDPOINTS[name]
+        headers = {"Authorization": f"Bearer {rng.choice(tokens)}"}
+        body = None
+        if name == "analyze":
+            body = json.dumps({"message": rng.choice(corpus)})
+            headers["Content-Type"] = "application/json"
+        timings = degradation = None
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            payload = resp.read()
+            status, ok = str(resp.status), 200 <= resp.status < 300
+            if name == "analyze" and ok:
+                timings = _parse_server_timing(resp.getheader("Server-Timing", ""))
+                degradation = json.loads(payload).get("degradation")
+        except (OSError, http.client.HTTPException) as e:
+            status, ok = type(e).__name__, False
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=60)
+        finished = time.perf_counter()
+        if due >= record_after:
+            recorder.add(name, (finished - due) * 1000, status, ok, timings, degradation)
+    conn.close()
+
+
+# ─── Report ───────────────────────────────────────────────────────────────────
+def _summary(values: list) -> dict:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    out = {"count": len(ordered)}
+    for q in PERCENTILES:
+        out[f"p{int(q * 100)}"] = round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+    out["mean"] = round(sum(ordered) / len(ordered), 3)
+    out["max"] = round(ordered[-1], 3)
+    return out
+
+
+def build_report(args, recorder: Recorder, measured_s: float, corpus_size: int) -> dict:
+    endpoints = {}
+    for name in ENDPOINTS:
+        count = len(recorder.latencies[name])
+        if not count:
+            continue
+        endpoints[name] = {
+            "requests": count,
+            "throughput_rps": round(count / measured_s, 2),
+            "errors": recorder.errors[name],
+            "error_rate": round(recorder.errors[name] / count, 5),
+            "status": recorder.status[name],
+            "latency_ms": _summary(recorder.latencies[name]),
+        }
+    everything = [v for values in recorder.latencies.values() for v in values]
+    errors = sum(recorder.errors.values())
+    return {
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "config": {
+            "url": args.url, "workers": None if args.url else args.workers,
+            "concurrency": args.concurrency, "rate": args.rate, "duration_s": args.duration,
+            "warmup_s": args.warmup, "users": args.users, "mix": args.mix,
+            "seed": args.seed, "corpus_size": corpus_size,
+        },
+        "measured_s": round(measured_s, 3),
+        "requests": len(everything),
+        "throughput_rps": round(len(everything) / measured_s, 2) if measured_s else 0.0,
+        "errors": errors,
+        "error_rate": round(errors / len(everything), 5) if everything else 0.0,
+        "latency_ms": _summary(everything),
+        "endpoints": endpoints,
+        "stages_ms": {stage: _summary(v) for stage, v in recorder.stages.items() if v},
+        "degradation": recorder.degradation,
+    }
+
+
+def print_report(report: dict, baseline: dict = None) -> None:
+    def delta(path, new, label):
+        node = baseline
+        for key in path:
+            node = (node or {}).get(key)
+        if not isinstance(node, (int, float)) or not node:
+            return ""
+        return f"  {label} {(new - node) / node * 100:+.1f}%"
+
+    print(f"\n{'endpoint':<10} {'req':>7} {'rps':>8} {'err%':>6} {'p50':>9} {'p95':>9} {'p99':>9}  (ms)")
+    rows = list(report["endpoints"].items()) + [("total", report)]
+    for name, data in rows:
+        lat = data["latency_ms"]
+        base = ("endpoints", name) if name != "total" else ()
+        print(f"{name:<10} {data['requests']:>7} {data['throughput_rps']:>8.1f} "
+              f"{data['error_rate'] * 100:>6.2f} {lat['p50']:>9.1f} {lat['p95']:>9.1f} {lat['p99']:>9.1f}"
+              f"{delta(base + ('throughput_rps',), data['throughput_rps'], 'rps')}"
+              f"{delta(base + ('latency_ms', 'p95'), lat['p95'], 'p95')}")
+    if report["stages_ms"]:
+        print(f"\n{'stage':<14} {'p50':>9} {'p95':>9} {'p99':>9}  (ms, /api/analyze)")
+        for stage, data in report["stages_ms"].items():
+            print(f"{stage:<14} {data['p50']:>9.3f} {data['p95']:>9.3f} {data['p99']:>9.3f}"
+                  f"{delta(('stages_ms', stage, 'p50'), data['p50'], 'p50')}")
+    if report["degradation"]:
+        print("\ndegradation tiers served:", report["degradation"])
+
+
+def _parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name!r}; choose from {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", help="target an already running server instead of starting one")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="client threads")
+    parser.add_argument("--rate", type=float, default=0.0, help="requests/s (open loop); 0 = closed loop")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds of load before measuring")
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--mix", default="analyze=70,history=20,stats=10")
+    parser.add_argument("--corpus-size", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--report", default="loadtest_report.json")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    args = parser.parse_args()
+    mix = _parse_mix(args.mix)
+
+    workdir = proc = None
+    if args.url:
+        target = urlsplit(args.url)
+        host, port = target.hostname, target.port or 80
+    else:
+        workdir = tempfile.mkdtemp(prefix="fraudshield-loadtest-")
+        host, port = "127.0.0.1", _free_port()
+        proc = start_server(args.workers, workdir, port)
+    try:
+        wait_ready(host, port, proc, checks=max(1, args.workers * 2) if proc else 1)
+        tokens = signup_users(host, port, args.users, run_id=f"{os.getpid()}-{int(time.time())}")
+        corpus = build_corpus(random.Random(args.seed), args.corpus_size)
+
+        recorder = Recorder()
+        start = time.perf_counter()
+        record_after = start + args.warmup
+        schedule = Schedule(mix, args.rate, start, record_after + args.duration, args.seed)
+        threads = [
+            threading.Thread(target=_client, args=(host, port, schedule, tokens, corpus, recorder,
+                                                   record_after, args.seed + i + 1), daemon=True)
+            for i in range(args.concurrency)
+        ]
+        print(f"[loadtest] {args.concurrency} clients, "
+              f"{f'{args.rate:g} req/s' if args.rate else 'closed loop'}, "
+              f"{args.warmup:g}s warm-up + {args.duration:g}s measured against {host}:{port}")
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        measured = min(time.perf_counter(), record_after + args.duration) - record_after
+    finally:
+        if proc is not None:
+            stop_server(proc)
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = build_report(args, recorder, measured, len(corpus))
+    with open(args.report, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+    print_report(report, baseline)
+    print(f"\n[OK] report written to {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,35 @@
 import sys
 import os
+import time
+import logging
+import threading
+
+_import_start = time.perf_counter()
 
 # Ensure the backend/app directory is importable
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO"),
+    format="%(asctime)s %(levelname)s [FraudShield] %(name)s: %(message)s",
+)
+logger = logging.getLogger("fraudshield")
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import OperationalError
 
-from app.database.db import engine
+from app.database.db import engine, SessionLocal
 from app.database import models as db_models
-from app.routes import auth_routes, analysis_routes, dashboard_routes
+from app.database.migrations import upgrade_schema
+from app.database.message_store import migrate_legacy_messages
+from app.database import rule_hits, search_index, shards
+from app.middleware.compression import CompressionMiddleware
+from app.routes import auth_routes, analysis_routes, dashboard_routes, thread_routes, live_routes, admin_routes, job_routes
+from app.services import campaign_index, model_updates, reputation, score_sketches, shadow, traffic_capture, warmup
 
-# Create all tables
-db_models.Base.metadata.create_all(bind=engine)
+logger.info("Application modules imported in %.1f ms", (time.perf_counter() - _import_start) * 1000)
 
 app = FastAPI(
     title="FraudShield AI API",
@@ -42,10 +59,134 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip for responses of at least GZIP_MIN_SIZE bytes (history pages, exports, full analyses)
+app.add_middleware(CompressionMiddleware)
+
 # Register routers
 app.include_router(auth_routes.router)
 app.include_router(analysis_routes.router)
 app.include_router(dashboard_routes.router)
+app.include_router(thread_routes.router)
+app.include_router(live_routes.router)
+app.include_router(admin_routes.router)
+app.include_router(job_routes.router)
+
+
+@app.on_event("startup")
+def init_database():
+    # Create all tables, then add columns/indexes introduced since the DB was created
+    start = time.perf_counter()
+    try:
+        db_models.Base.metadata.create_all(bind=engine)
+    except OperationalError:
+        # Another gunicorn worker created a table between the check and CREATE; recheck
+        db_models.Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    rule_hits.create(engine)
+    search_index.create(engine)
+    model_updates.create(engine)
+    if shards.ENABLED:
+        for shard in range(shards.SHARDS):
+            shards.prepare(shard)
+    logger.info("Database schema ready in %.1f ms", (time.perf_counter() - start) * 1000)
+
+
+@app.on_event("startup")
+def move_legacy_messages():
+    # Older rows kept their text inline; move it into content-addressed storage
+    db = SessionLocal()
+    try:
+        migrate_legacy_messages(db)
+    finally:
+        db.close()
+
+
+def _backfill_search_index():
+    for shard in range(shards.SHARDS):
+        db = shards.session(shard)
+        try:
+            indexed = search_index.backfill(db)
+            if indexed:
+                logger.info("Indexed %d existing analyses for search (shard %d)", indexed, shard)
+        finally:
+            db.close()
+
+
+def _backfill_rule_hits():
+    for shard in range(shards.SHARDS):
+        db = shards.session(shard)
+        try:
+            filled = rule_hits.backfill(db)
+            if filled:
+                logger.info("Recorded rule hits of %d existing analyses (shard %d)", filled, shard)
+        finally:
+            db.close()
+
+
+def _rebuild_campaign_index():
+    for shard in range(shards.SHARDS):
+        db = shards.session(shard)
+        try:
+            campaign_index.rebuild_from_db(db, limit=campaign_index.INDEX_SIZE // shards.SHARDS)
+        finally:
+            db.close()
+
+
+@app.on_event("startup")
+def load_reputation_lists():
+    reputation.start_reloader()
+
+
+@app.on_event("startup")
+def load_campaign_index():
+    # Rebuilt in the background; lookups simply miss until it is populated
+    threading.Thread(target=_rebuild_campaign_index, name="campaign-index", daemon=True).start()
+
+
+@app.on_event("startup")
+def backfill_search_index():
+    # Analyses stored before the full-text index existed; new ones are indexed on insert
+    threading.Thread(target=_backfill_search_index, name="search-backfill", daemon=True).start()
+
+
+@app.on_event("startup")
+def backfill_rule_hits():
+    # Analyses stored before rule_hits existed; new ones get their rows on insert
+    threading.Thread(target=_backfill_rule_hits, name="rule-hits-backfill", daemon=True).start()
+
+
+@app.on_event("startup")
+def start_shadow_scoring():
+    # No-op unless SHADOW_MODEL_PATH names a candidate model
+    shadow.start()
+
+
+@app.on_event("startup")
+def start_traffic_capture():
+    # No-op unless CAPTURE_SAMPLE_RATE > 0
+    traffic_capture.start()
+
+
+@app.on_event("startup")
+def start_score_sketches():
+    score_sketches.start_flusher()
+
+
+@app.on_event("shutdown")
+def flush_score_sketches():
+    score_sketches.flush()
+
+
+@app.on_event("startup")
+def start_model_updates():
+    # Serve the newest published feedback update before warm-up and traffic
+    model_updates.reload()
+    model_updates.start()
+
+
+@app.on_event("startup")
+def start_warmup():
+    warmup.start()
 
 
 @app.get("/", tags=["Health"])
@@ -61,3 +202,14 @@ def root():
 @app.get("/health", tags=["Health"])
 def health():
     return {"status": "healthy"}
+
+
+@app.get("/health/ready", tags=["Health"])
+def readiness():
+    """Readiness probe: 503 until the warm-up corpus has run through the analyze chain."""
+    state = warmup.status()
+    if state["failed"]:
+        return JSONResponse(status_code=503, content={"status": "failed", "warmup_error": state["error"]})
+    if not state["ready"]:
+        return JSONResponse(status_code=503, content={"status": "warming", "warmup_error": state["error"]})
+    return {"status": "ready", "warmup_ms": state["duration_ms"]}
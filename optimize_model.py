@@ -0,0 +1,225 @@
+"""
+Offline model optimizer: vocabulary pruning + float32 weights, behind an
+accuracy gate.
+
+Most of the 30k TF-IDF 1–3-grams carry near-zero weight in every ensemble
+member, yet each one costs vocabulary memory and a dictionary lookup per
+n-gram at inference. For each text feature this computes its combined
+contribution
+
+    idf_t · Σ_m share_m · |coef_m,t|
+
+(share_m = the member's weight in the soft vote, split evenly over the SVM's
+calibration folds), i.e. the largest effect a single occurrence can have on
+the ensemble before L2 normalization, and drops features below
+--threshold × the largest contribution. The TF-IDF `stop_words_` set (kept
+only for introspection) is dropped, and IDF, scaler statistics and all
+coefficients/intercepts are cast to float32.
+
+The optimized pipeline is scored against the original on a held-out CSV
+(`text` column, optional 0/1 `label` column). The report gives AUC and F1 at
+BEST_THRESHOLD for both models (when labels are present), the decision
+agreement at BEST_THRESHOLD and the probability deltas. The artifact is
+only written when agreement ≥ --min-agreement.
+
+Run from backend/ with:
+  python optimize_model.py --holdout holdout.csv [--threshold 0.01]
+         [--min-agreement 0.995] [--out app/models/model.optimized.pkl]
+         [--report optimize_report.json]
+Serve the result by pointing MODEL_PATH at it.
+"""
+import argparse
+import copy
+import json
+import os
+import pickle
+import sys
+import time
+
+sys.path.insert(0, ".")
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import f1_score, roc_auc_score
+
+from app.services.features import build_features
+from app.services.linear_head import LinearHead
+from app.services.ml_model import BEST_THRESHOLD, MODEL_PATH
+
+DEFAULT_MIN_AGREEMENT = float(os.getenv("OPTIMIZE_MIN_AGREEMENT", "0.995"))
+
+
+def feature_contribution(pipeline) -> np.ndarray:
+    """Combined absolute contribution of every TF-IDF feature (see module docstring)."""
+    head = LinearHead(pipeline)
+    voter_weights = head.voter_weights if head.voter_weights is not None else np.ones(len(head.voters))
+    voter_weights = voter_weights / voter_weights.sum()
+    member_share = np.zeros(head.n_members)
+    for (rows, _), weight in zip(head.voters, voter_weights):
+        member_share[rows] = weight / len(rows)
+    return head.idf * (np.abs(head.text_coef) @ member_share)
+
+
+def _linear_estimators(pipeline):
+    """Every fitted estimator holding coef_ columns over the ColumnTransformer output."""
+    clf = pipeline.steps[-1][1]
+    for est in getattr(clf, "estimators_", [clf]):
+        if hasattr(est, "calibrated_classifiers_"):
+            for cc in est.calibrated_classifiers_:
+                yield cc.estimator
+        else:
+            yield est
+
+
+def _set_n_features(obj, n: int) -> None:
+    try:
+        obj.n_features_in_ = n
+    except AttributeError:   # derived property on some meta-estimators
+        pass
+
+
+def optimize(pipeline, keep: np.ndarray):
+    """Copy of `pipeline` restricted to the text features in `keep`, in float32."""
+    pipe = copy.deepcopy(pipeline)
+    pre = pipe.steps[0][1]
+    tfidf = pre.named_transformers_["text"]
+    scaler = pre.named_transformers_["num"]
+    n_text = len(tfidf.idf_)
+    n_num = len(scaler.mean_)
+    kept = np.flatnonzero(keep)
+
+    # ── TF-IDF: renumber the kept terms 0..k-1 in their original order
+    remap = np.full(n_text, -1, dtype=np.int64)
+    remap[kept] = np.arange(len(kept))
+    idf = tfidf.idf_
+    tfidf.vocabulary_ = {term: int(remap[i]) for term, i in tfidf.vocabulary_.items() if keep[i]}
+    tfidf.idf_ = idf[kept].astype(np.float32)
+    _set_n_features(tfidf._tfidf, len(kept))
+    if hasattr(tfidf, "stop_words_"):
+        del tfidf.stop_words_
+
+    # ── Scaler
+    scaler.mean_ = scaler.mean_.astype(np.float32)
+    scaler.scale_ = scaler.scale_.astype(np.float32)
+    if getattr(scaler, "var_", None) is not None:
+        scaler.var_ = scaler.var_.astype(np.float32)
+
+    # ── ColumnTransformer output layout
+    n_out = len(kept) + n_num
+    if hasattr(pre, "output_indices_"):
+        pre.output_indices_["text"] = slice(0, len(kept))
+        pre.output_indices_["num"] = slice(len(kept), n_out)
+
+    # ── Classifier coefficients: kept text columns + all numeric columns
+    columns = np.concatenate([kept, np.arange(n_text, n_text + n_num)])
+    for est in _linear_estimators(pipe):
+        est.coef_ = np.ascontiguousarray(est.coef_[:, columns], dtype=np.float32)
+        est.intercept_ = np.asarray(est.intercept_, dtype=np.float32)
+        _set_n_features(est, n_out)
+    clf = pipe.steps[-1][1]
+    for est in getattr(clf, "estimators_", []):
+        _set_n_features(est, n_out)
+    _set_n_features(clf, n_out)
+    return pipe
+
+
+def _frame(texts) -> pd.DataFrame:
+    rows = []
+    for text in texts:
+        f = build_features(text)
+        row = {"clean_text": f.clean_text}
+        row.update(f.numeric_row())
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def evaluate(original, optimized, texts, labels=None) -> dict:
+    X = _frame(texts)
+    t0 = time.perf_counter()
+    p_orig = original.predict_proba(X)[:, 1]
+    t1 = time.perf_counter()
+    p_opt = optimized.predict_proba(X)[:, 1]
+    t2 = time.perf_counter()
+
+    d_orig = p_orig >= BEST_THRESHOLD
+    d_opt = p_opt >= BEST_THRESHOLD
+    delta = np.abs(p_orig - p_opt)
+    report = {
+        "messages": len(texts),
+        "agreement": float(np.mean(d_orig == d_opt)),
+        "flips": int(np.sum(d_orig != d_opt)),
+        "max_abs_delta": float(delta.max()) if len(delta) else 0.0,
+        "mean_abs_delta": float(delta.mean()) if len(delta) else 0.0,
+        "batch_ms": {"original": round((t1 - t0) * 1000, 1), "optimized": round((t2 - t1) * 1000, 1)},
+    }
+    if labels is not None:
+        y = np.asarray(labels, dtype=int)
+        for name, p, d in (("original", p_orig, d_orig), ("optimized", p_opt, d_opt)):
+            report[name] = {
+                "auc": float(roc_auc_score(y, p)) if len(set(y)) > 1 else None,
+                "f1": float(f1_score(y, d.astype(int), zero_division=0)),
+            }
+    return report
+
+
+def _ngram_orders(vocabulary) -> dict:
+    orders = {}
+    for term in vocabulary:
+        n = term.count(" ") + 1
+        orders[n] = orders.get(n, 0) + 1
+    return dict(sorted(orders.items()))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--holdout", required=True, help="CSV with a `text` column and optional `label` column")
+    parser.add_argument("--threshold", type=float, default=0.01,
+                        help="drop features below this fraction of the largest contribution")
+    parser.add_argument("--min-agreement", type=float, default=DEFAULT_MIN_AGREEMENT)
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(MODEL_PATH), "model.optimized.pkl"))
+    parser.add_argument("--report", default="optimize_report.json")
+    args = parser.parse_args()
+
+    original = joblib.load(args.model)
+    holdout = pd.read_csv(args.holdout)
+    texts = holdout["text"].astype(str).tolist()
+    labels = holdout["label"].tolist() if "label" in holdout.columns else None
+
+    contribution = feature_contribution(original)
+    keep = contribution >= args.threshold * contribution.max()
+    optimized = optimize(original, keep)
+
+    tfidf_before = original.steps[0][1].named_transformers_["text"]
+    tfidf_after = optimized.steps[0][1].named_transformers_["text"]
+    report = {
+        "model": args.model,
+        "threshold": args.threshold,
+        "best_threshold": BEST_THRESHOLD,
+        "min_agreement": args.min_agreement,
+        "features": {"before": int(len(keep)), "after": int(keep.sum())},
+        "ngram_orders": {"before": _ngram_orders(tfidf_before.vocabulary_),
+                         "after": _ngram_orders(tfidf_after.vocabulary_)},
+        "pickle_bytes": {"before": len(pickle.dumps(original)), "after": len(pickle.dumps(optimized))},
+        "evaluation": evaluate(original, optimized, texts, labels),
+    }
+    agreement = report["evaluation"]["agreement"]
+    report["written"] = agreement >= args.min_agreement
+    if report["written"]:
+        joblib.dump(optimized, args.out)
+        report["out"] = args.out
+
+    with open(args.report, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(json.dumps(report, indent=2))
+
+    if not report["written"]:
+        print(f"[FAIL] agreement {agreement:.4f} < floor {args.min_agreement}; artifact NOT written", file=sys.stderr)
+        return 1
+    print(f"[OK] optimized model written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,334 @@
+"""
+Replay captured /api/analyze traffic against a build and compare builds.
+
+Captures are the JSON-lines files traffic_capture.py writes (CAPTURE_DIR);
+pass files or directories. Requests are replayed in arrival order, each due
+at its original offset from the first one divided by --speed (1: original
+pacing, 10: ten times faster, 0: back to back). Latency is measured from
+the due time, as in loadtest.py, so a build that falls behind is charged
+for the queueing it causes.
+
+Two targets:
+  in-process (default)  imports the build in --build (default: this
+                        checkout) and runs analysis_pipeline.analyze on each
+                        message: no HTTP, auth or persistence (the
+                        reputation blocklists are loaded first). The shared
+                        result cache, traffic capture and shadow scoring are
+                        switched off, so every message is scored by the build.
+                        With --concurrency 1 the outputs are deterministic
+                        (campaign reuse depends on message order).
+  --url                 POSTs to /api/analyze of a running server (any build)
+                        as a fresh replay user, with the captured fields /
+                        compact options (plus risk_level and final_score).
+
+The JSON report (--report) holds the configuration, throughput, error rate,
+latency and per-stage percentiles and every message's risk_level and
+final_score. Pass --baseline with the report of another build on the same
+capture to print the latency change and every message whose risk_level or
+final_score differs (beyond --tolerance).
+
+Run from backend/ with:
+  python replay.py captures/ [--speed 1] [--concurrency 1] [--limit N]
+         [--report replay_report.json] [--baseline other_report.json]
+  python replay.py captures/ --build ../other-checkout/backend
+  python replay.py captures/ --url http://host:port --concurrency 8
+"""
+import argparse
+import glob
+import hashlib
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+from loadtest import _parse_server_timing, _summary, signup_users, wait_ready
+
+_PREVIEW = 80
+
+
+# ─── Capture ──────────────────────────────────────────────────────────────────
+def load_capture(paths: list, limit: int = 0) -> list:
+    """Captured requests from files and directories, in arrival order."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "capture-*.jsonl"))))
+        else:
+            files.append(path)
+    records = []
+    for path in files:
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if line:
+                    records.append(json.loads(line))
+    records.sort(key=lambda r: r["ts"])       # stable: ties keep file order
+    return records[:limit] if limit else records
+
+
+def fingerprint(records: list) -> str:
+    digest = hashlib.sha256()
+    for record in records:
+        digest.update(json.dumps([record["message"], record.get("fields"), record.get("compact")],
+                                 ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def _explain(record: dict) -> bool:
+    """Whether /api/analyze computed the visualization block for this request."""
+    if record.get("fields"):
+        return "visualization" in [f.strip() for f in record["fields"].split(",")]
+    return not record.get("compact")
+
+
+# ─── Targets ──────────────────────────────────────────────────────────────────
+class InProcess:
+    """analysis_pipeline.analyze of the build in `build_dir`."""
+
+    def __init__(self, build_dir: str, workdir: str):
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'replay.db')}",
+            RESULT_CACHE_PATH="",
+            CAPTURE_SAMPLE_RATE="0",
+            SHADOW_MODEL_PATH="",
+            LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"),
+        )
+        sys.path.insert(0, os.path.abspath(build_dir))
+        from app.services import analysis_pipeline
+        from app.utils.helpers import sanitize_input
+        self.analyze, self.sanitize = analysis_pipeline.analyze, sanitize_input
+        # The server loads the reputation blocklists at startup; load them before
+        # the first timed message (builds without them skip this)
+        try:
+            from app.services import reputation
+        except ImportError:
+            return
+        reputation.reload()
+
+    def connect(self):
+        return None
+
+    def send(self, conn, record: dict):
+        """(risk_level, final_score, stage timings, error); conn is unused."""
+        kwargs = {} if _explain(record) else {"explain": False}   # older builds lack the argument
+        result = self.analyze(self.sanitize(record["message"]), **kwargs)
+        fusion = result["fusion"]
+        return conn, fusion["risk_level"], fusion["final_score"], result.get("timings"), None
+
+
+class Http:
+    """POST /api/analyze on a running server."""
+
+    def __init__(self, url: str):
+        target = urlsplit(url)
+        self.host, self.port = target.hostname, target.port or 80
+        wait_ready(self.host, self.port, checks=1)
+        token = signup_users(self.host, self.port, 1, run_id=f"replay-{os.getpid()}-{int(time.time())}")[0]
+        self.headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+
+    def connect(self):
+        return http.client.HTTPConnection(self.host, self.port, timeout=60)
+
+    def send(self, conn, record: dict):
+        params = {}
+        if record.get("fields"):
+            params["fields"] = record["fields"] + ",risk_level,final_score"
+        elif record.get("compact"):
+            params["compact"] = "true"
+        path = "/api/analyze" + (f"?{urlencode(params)}" if params else "")
+        try:
+            conn.request("POST", path, body=json.dumps({"message": record["message"]}), headers=self.headers)
+            resp = conn.getresponse()
+            payload = resp.read()
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            return self.connect(), None, None, None, type(e).__name__
+        if resp.status != 200:
+            return conn, None, None, None, str(resp.status)
+        data = json.loads(payload)
+        timings = _parse_server_timing(resp.getheader("Server-Timing", ""))
+        return conn, data["risk_level"], data["final_score"], timings, None
+
+
+# ─── Replay ───────────────────────────────────────────────────────────────────
+class Schedule:
+    """Hands out (seq, due time) in capture order."""
+
+    def __init__(self, records: list, speed: float, start: float):
+        self.offsets = [r["ts"] - records[0]["ts"] for r in records] if records else []
+        self.speed, self.start = speed, start
+        self.lock = threading.Lock()
+        self.issued = 0
+
+    def next(self):
+        with self.lock:
+            seq = self.issued
+            if seq >= len(self.offsets):
+                return None
+            self.issued += 1
+        due = self.start + self.offsets[seq] / self.speed if self.speed else time.perf_counter()
+        return seq, due
+
+
+def _client(target, records, schedule, outputs, latencies, stages, errors, lock):
+    conn = target.connect()
+    while True:
+        item = schedule.next()
+        if item is None:
+            break
+        seq, due = item
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            conn, risk_level, final_score, timings, error = target.send(conn, records[seq])
+        except Exception as e:                  # a build that fails on a message is a finding
+            risk_level = final_score = timings = None
+            error = type(e).__name__
+        latency_ms = (time.perf_counter() - due) * 1000
+        with lock:
+            latencies.append(latency_ms)
+            outputs[seq] = None if error else [risk_level, final_score]
+            if error:
+                errors[error] = errors.get(error, 0) + 1
+            for stage, ms in (timings or {}).items():
+                stages.setdefault(stage, []).append(ms)
+    if conn is not None:
+        conn.close()
+
+
+def replay(target, records: list, speed: float, concurrency: int) -> dict:
+    outputs, latencies, stages, errors = [None] * len(records), [], {}, {}
+    lock = threading.Lock()
+    start = time.perf_counter()
+    schedule = Schedule(records, speed, start)
+    threads = [
+        threading.Thread(target=_client, args=(target, records, schedule, outputs, latencies, stages, errors, lock),
+                         daemon=True)
+        for _ in range(concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    failed = sum(errors.values())
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "requests": len(records),
+        "throughput_rps": round(len(records) / elapsed, 2) if elapsed else 0.0,
+        "errors": errors,
+        "error_rate": round(failed / len(records), 5) if records else 0.0,
+        "latency_ms": _summary(latencies),
+        "stages_ms": {stage: _summary(values) for stage, values in stages.items()},
+        "outputs": outputs,
+    }
+
+
+# ─── Report ───────────────────────────────────────────────────────────────────
+def differences(report: dict, baseline: dict, tolerance: float) -> list:
+    """(seq, baseline output, new output) for every message whose result changed."""
+    changed = []
+    for seq, (old, new) in enumerate(zip(baseline["outputs"], report["outputs"])):
+        if old is None or new is None:
+            if old != new:
+                changed.append((seq, old, new))
+        elif old[0] != new[0] or abs(old[1] - new[1]) > tolerance:
+            changed.append((seq, old, new))
+    return changed
+
+
+def print_report(report: dict, records: list, baseline: dict = None,
+                 tolerance: float = 0.0, show: int = 10) -> list:
+    def delta(new, old):
+        return f"  ({(new - old) / old * 100:+.1f}%)" if isinstance(old, (int, float)) and old else ""
+
+    lat = report["latency_ms"]
+    base_lat = (baseline or {}).get("latency_ms", {})
+    print(f"\n{report['requests']} requests in {report['elapsed_s']:.1f} s: "
+          f"{report['throughput_rps']:.1f} req/s{delta(report['throughput_rps'], (baseline or {}).get('throughput_rps'))}, "
+          f"errors {report['error_rate'] * 100:.2f}% {report['errors'] or ''}")
+    if lat["count"]:
+        for q in ("p50", "p95", "p99", "mean", "max"):
+            print(f"  {q:<5} {lat[q]:>9.2f} ms{delta(lat[q], base_lat.get(q))}")
+    if report["stages_ms"]:
+        print(f"\n{'stage':<14} {'p50':>9} {'p95':>9} {'p99':>9}  (ms)")
+        for stage, data in report["stages_ms"].items():
+            print(f"{stage:<14} {data['p50']:>9.3f} {data['p95']:>9.3f} {data['p99']:>9.3f}")
+
+    if baseline is None:
+        return []
+    if baseline["config"]["capture"] != report["config"]["capture"]:
+        print("\n[WARN] the baseline replayed a different capture; outputs not compared")
+        return []
+    changed = differences(report, baseline, tolerance)
+    transitions = {}
+    for _, old, new in changed:
+        key = f"{old[0] if old else 'error'} -> {new[0] if new else 'error'}"
+        transitions[key] = transitions.get(key, 0) + 1
+    print(f"\n{len(changed)} of {report['requests']} outputs differ from the baseline "
+          f"(final_score tolerance {tolerance:g})")
+    for key, count in sorted(transitions.items(), key=lambda kv: -kv[1]):
+        print(f"  {key:<22} {count}")
+    for seq, old, new in changed[:show]:
+        preview = records[seq]["message"].replace("\n", " ")[:_PREVIEW]
+        print(f"  #{seq:<6} {old} -> {new}  {preview!r}")
+    return changed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("capture", nargs="+", help="capture files or directories")
+    parser.add_argument("--url", help="replay over HTTP against this server")
+    parser.add_argument("--build", default=os.path.dirname(os.path.abspath(__file__)),
+                        help="backend/ directory of the build to replay in-process")
+    parser.add_argument("--speed", type=float, default=1.0, help="pacing multiplier; 0 = back to back")
+    parser.add_argument("--concurrency", type=int, default=1, help="client threads")
+    parser.add_argument("--limit", type=int, default=0, help="replay only the first N requests")
+    parser.add_argument("--report", default="replay_report.json")
+    parser.add_argument("--baseline", help="report of another build on the same capture")
+    parser.add_argument("--tolerance", type=float, default=0.0, help="final_score change ignored")
+    parser.add_argument("--show", type=int, default=10, help="differing messages to print")
+    parser.add_argument("--fail-on-diff", action="store_true", help="exit 1 if outputs differ")
+    args = parser.parse_args()
+    if args.speed < 0 or args.concurrency < 1:
+        parser.error("--speed must be >= 0 and --concurrency >= 1")
+
+    records = load_capture(args.capture, args.limit)
+    if not records:
+        print("No captured requests found.")
+        return 1
+    with tempfile.TemporaryDirectory(prefix="fraudshield-replay-") as workdir:
+        target = Http(args.url) if args.url else InProcess(args.build, workdir)
+        print(f"[replay] {len(records)} requests, "
+              f"{f'{args.speed:g}x pacing' if args.speed else 'back to back'}, "
+              f"{args.concurrency} clients against {args.url or os.path.abspath(args.build)}")
+        report = replay(target, records, args.speed, args.concurrency)
+
+    report = {
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "config": {
+            "capture": fingerprint(records), "paths": args.capture, "limit": args.limit,
+            "url": args.url, "build": None if args.url else os.path.abspath(args.build),
+            "speed": args.speed, "concurrency": args.concurrency,
+        },
+        **report,
+    }
+    with open(args.report, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+    changed = print_report(report, records, baseline, args.tolerance, args.show)
+    print(f"\n[OK] report written to {args.report}")
+    return 1 if args.fail_on_diff and changed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
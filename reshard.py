@@ -0,0 +1,146 @@
+"""
+Move analyses between shards after changing DB_SHARDS.
+
+Every user's analyses — analyzed_messages rows, the message bodies they
+reference, their rule_hits rows and full-text index entries — are moved to
+the shard crc32(user_id) % --to assigns them (app/database/shards.py),
+keeping their ids. Rows are copied in batches, committed on the target and only then
+deleted from the source, so an interrupted run can simply be repeated.
+Bodies no longer referenced on a source shard are removed at the end.
+
+Stop the API and job workers first, and start them again with
+DB_SHARDS=<--to> afterwards. Shard files are named as the API names them
+(DATABASE_URL, DB_SHARD_URL_TEMPLATE).
+
+Run from backend/ with:
+  python reshard.py --to 4 [--from 1] [--batch 1000]
+"""
+import argparse
+import sys
+import time
+
+sys.path.insert(0, ".")
+
+from sqlalchemy import delete, distinct, inspect, insert, select, text
+from sqlalchemy.orm import Session
+
+from app.database import rule_hits, search_index, shards
+from app.database.message_store import decode_body, store_message
+from app.database.models import AnalyzedMessage, MessageBody, RuleHit
+
+_ANALYSES = AnalyzedMessage.__table__
+_BODIES = MessageBody.__table__
+_HITS = RuleHit.__table__
+
+
+def move_user(src: Session, dst: Session, user_id: int, batch: int) -> int:
+    """Move every analysis of `user_id` from `src` to `dst`. Returns rows moved."""
+    moved = 0
+    while True:
+        rows = src.execute(
+            select(_ANALYSES).where(_ANALYSES.c.user_id == user_id).order_by(_ANALYSES.c.id).limit(batch)
+        ).mappings().all()
+        if not rows:
+            return moved
+        ids = [row["id"] for row in rows]
+        hashes = {row["message_hash"] for row in rows if row["message_hash"]}
+        texts = {
+            body["content_hash"]: decode_body(body["body"], body["compressed"])
+            for body in src.execute(select(_BODIES).where(_BODIES.c.content_hash.in_(hashes))).mappings()
+        } if hashes else {}
+        # What the search index holds for each row (legacy rows: their inline text)
+        entries = [(row["id"], user_id, texts.get(row["message_hash"], row["message"] or "")) for row in rows]
+
+        # Rows already copied by an interrupted earlier run are not copied twice
+        present = set(dst.scalars(select(_ANALYSES.c.id).where(_ANALYSES.c.id.in_(ids))))
+        for message in texts.values():
+            store_message(dst, message)
+        new_rows = [dict(row) for row in rows if row["id"] not in present]
+        if new_rows:
+            new_ids = [row["id"] for row in new_rows]
+            hits = src.execute(select(_HITS).where(_HITS.c.analysis_id.in_(new_ids))).mappings().all()
+            dst.execute(insert(_ANALYSES), new_rows)
+            if hits:
+                dst.execute(insert(_HITS), [dict(hit) for hit in hits])
+            search_index.index_messages(dst, [e for e in entries if e[0] not in present])
+        dst.commit()
+
+        search_index.remove_messages(src, entries)
+        src.execute(delete(_HITS).where(_HITS.c.analysis_id.in_(ids)))
+        src.execute(delete(_ANALYSES).where(_ANALYSES.c.id.in_(ids)))
+        src.commit()
+        moved += len(rows)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--to", type=int, required=True, help="new shard count")
+    parser.add_argument("--from", dest="from_", type=int, default=shards.SHARDS,
+                        help="current shard count (default: DB_SHARDS)")
+    parser.add_argument("--batch", type=int, default=1000, help="rows per transaction")
+    args = parser.parse_args()
+    if args.to < 1 or args.from_ < 1:
+        parser.error("shard counts must be at least 1")
+    if not inspect(shards.engine(0)).has_table(_ANALYSES.name):
+        print(f"No analyzed_messages table in {shards.shard_url(0)}; start the API once to create it.")
+        return 1
+
+    # Every shard that may hold rows: the current layout's and the new one's
+    layout = range(max(args.from_, args.to))
+    for shard in layout:
+        shards.prepare(shard)
+        db = shards.session(shard)
+        try:
+            # Finish both backfills first: removing entries from a contentless
+            # index needs them indexed, and moved rows must not be filled twice
+            search_index.backfill(db)
+            rule_hits.backfill(db)
+        finally:
+            db.close()
+
+    # Each shard's counter must pass every id of its range, wherever those rows
+    # live now, so ids moved out of a shard are never allocated again
+    sessions = [shards.session(shard) for shard in layout]
+    try:
+        for id_range in layout:
+            floor = max(shards.highest_id(db, id_range) for db in sessions)
+            shards.raise_counter(sessions[id_range], floor)
+            sessions[id_range].commit()
+    finally:
+        for db in sessions:
+            db.close()
+
+    start = time.perf_counter()
+    total = 0
+    for shard in layout:
+        src = shards.session(shard)
+        try:
+            user_ids = src.scalars(select(distinct(_ANALYSES.c.user_id))).all()
+            moved = 0
+            for user_id in user_ids:
+                target = shards.shard_of(user_id, args.to)
+                if target == shard:
+                    continue
+                dst = shards.session(target)
+                try:
+                    moved += move_user(src, dst, user_id, args.batch)
+                finally:
+                    dst.close()
+            # Bodies only the moved users referenced
+            src.execute(text(
+                "DELETE FROM message_bodies WHERE NOT EXISTS "
+                "(SELECT 1 FROM analyzed_messages a WHERE a.message_hash = message_bodies.content_hash)"
+            ))
+            src.commit()
+            print(f"shard {shard}: {len(user_ids)} users, {moved} analyses moved out")
+            total += moved
+        finally:
+            src.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Moved {total} analyses in {elapsed:.1f} s. Restart the API with DB_SHARDS={args.to}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
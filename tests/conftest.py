@@ -0,0 +1,20 @@
+"""
+Shared test setup — run from backend/ with:
+  python -m pytest
+"""
+import os
+import sys
+import tempfile
+
+# Point every file the app opens at import time away from the working tree
+_TMP = tempfile.mkdtemp(prefix="fraudshield-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_TMP, 'fraudshield.db')}")
+os.environ.setdefault("RESULT_CACHE_PATH", "")
+os.environ.setdefault("CAPTURE_SAMPLE_RATE", "0")
+os.environ.setdefault("SHADOW_MODEL_PATH", "")
+for name, filename in [("JOBS_DB_PATH", "jobs.db"), ("SHADOW_DB_PATH", "shadow.db"),
+                       ("THREAD_DB_PATH", "threads.db"), ("SKETCH_DIR", "score_sketches"),
+                       ("MODEL_UPDATES_DIR", "model_updates"), ("CAPTURE_DIR", "captures")]:
+    os.environ.setdefault(name, os.path.join(_TMP, filename))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
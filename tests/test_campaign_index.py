@@ -0,0 +1,95 @@
+"""campaign_index: near-duplicate reuse and the startup rebuild."""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import models
+from app.database.result_blob import encode_result
+from app.services import campaign_index, ml_model
+
+TEMPLATE = ("Dear customer your SBI account will be blocked today. Update your KYC at {url} "
+            "and share the OTP sent to {phone} to avoid suspension")
+
+
+def _message(i):
+    return TEMPLATE.format(url=f"http://sbi-kyc{i}.xyz/update", phone=f"98765{i:05d}")
+
+
+@pytest.fixture
+def index(monkeypatch):
+    fresh = campaign_index.CampaignIndex(capacity=100)
+    monkeypatch.setattr(campaign_index, "_index", fresh)
+    return fresh
+
+
+def test_near_duplicate_reuses_the_campaign_verdict(index):
+    first, first_campaign = campaign_index.predict(_message(1))
+    assert first_campaign is None and first["contributing_words"]
+
+    again, campaign_id = campaign_index.predict(_message(2))
+    assert campaign_id is not None
+    assert again["scam_probability"] == first["scam_probability"]
+    assert again["contributing_words"] == first["contributing_words"]
+    assert "<mark" in again["highlighted_text"]
+    assert index.stats()["hits"] == 1
+
+
+def test_unrelated_message_misses(index):
+    campaign_index.predict(_message(1))
+    _, campaign_id = campaign_index.predict("Are we still meeting for lunch tomorrow at the usual place near office?")
+    assert campaign_id is None
+
+
+def test_unexplained_verdicts_are_not_indexed(index):
+    campaign_index.predict(_message(1), explain=False)
+    assert index.stats()["size"] == 0
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'analyses.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _row(message, degradation="none", words=True, model_version=None):
+    result = {
+        "ml": {"contributing_words": [{"word": "kyc", "impact": 0.5}] if words else []},
+        "campaign_id": None,
+        "degradation": degradation,
+    }
+    return models.AnalyzedMessage(
+        user_id=1, message=message, ai_score=0.91, scam_type="Banking / UPI Fraud",
+        result_blob=encode_result(result, model_version or ml_model.MODEL_VERSION),
+    )
+
+
+def test_rebuild_indexes_only_full_verdicts_of_the_served_model(index, db):
+    templates = [
+        "Your electricity connection will be cut tonight at 9.30pm, contact officer {n} immediately now",
+        "Congratulations your resume is shortlisted, deposit Rs {n} for the interview slot booking today",
+        "Hi mom I lost my phone, this is my new number {n}, please send money urgently will return",
+        "Your parcel is held at customs, pay the release fee at http://post{n}.xyz within one hour",
+    ]
+    db.add_all([
+        _row(templates[0].format(n=1)),
+        _row(templates[1].format(n=1), degradation="rules_only"),
+        _row(templates[2].format(n=1), words=False),
+        _row(templates[3].format(n=1), model_version="old-model"),
+    ])
+    db.commit()
+
+    assert campaign_index.rebuild_from_db(db) == 4
+    assert index.stats()["size"] == 1
+
+    hit = index.lookup(campaign_index.signature(templates[0].format(n=2)))
+    assert hit["verdict"] == {
+        "scam_probability": 0.91, "scam_type": "Banking / UPI Fraud",
+        "contributing_words": [{"word": "kyc", "impact": 0.5}],
+    }
+    for template in templates[1:]:
+        assert index.lookup(campaign_index.signature(template.format(n=2))) is None
+    assert campaign_index.rebuild_from_db(db) == 0      # already loaded
@@ -0,0 +1,36 @@
+"""ml_model contributing words and highlighting."""
+import re
+
+import numpy as np
+
+from app.services import ml_model
+from app.services.features import build_features
+
+MESSAGE = "Your SBI account will be blocked. Share your OTP immediately to avoid arrest."
+
+
+def test_words_match_the_fitted_vectorizer_and_lr_coefficients():
+    words = ml_model._get_contributing_words(MESSAGE)
+    assert words
+
+    pre = ml_model._pipeline.steps[0][1]
+    tfidf = pre.named_transformers_["text"]
+    lr = next(est for est in ml_model._pipeline.steps[-1][1].estimators_ if hasattr(est, "coef_"))
+    row = tfidf.transform([build_features(MESSAGE).clean_text])
+    names = tfidf.get_feature_names_out()
+    impacts = {names[i]: abs(lr.coef_[0][i] * v) for i, v in zip(row.indices, row.data)}
+    expected = sorted(impacts.values(), reverse=True)[:10]     # equal impacts may come in either order
+    assert np.allclose([w["impact"] for w in words], [round(v, 4) for v in expected])
+    for w in words:
+        assert w["impact"] == round(impacts[w["word"]], 4)
+
+
+def test_highlighting_never_nests_or_breaks_markup():
+    words = [{"word": "your sbi", "impact": 1.0}, {"word": "sbi", "impact": 0.9},
+             {"word": "mark", "impact": 0.8}, {"word": "amp", "impact": 0.7}]
+    highlighted = ml_model._build_highlighted_text("Your SBI <mark> & SBI", words)
+    assert highlighted == (
+        '<mark class="highlight-word">Your SBI</mark> &lt;<mark class="highlight-word">mark</mark>&gt; '
+        '&amp; <mark class="highlight-word">SBI</mark>'
+    )
+    assert re.sub(r'</?mark( class="highlight-word")?>', "", highlighted) == "Your SBI &lt;mark&gt; &amp; SBI"
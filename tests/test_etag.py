@@ -0,0 +1,60 @@
+"""Conditional GET on /api/stats and /api/history (etag_cache)."""
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from app.utils import etag_cache
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as c:
+        yield c
+
+
+def _signup(client, email: str) -> dict:
+    r = client.post("/auth/signup", json={"name": "Test", "email": email, "password": "secret1"})
+    assert r.status_code in (200, 201), r.text
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+@pytest.mark.parametrize("path", ["/api/stats", "/api/history"])
+def test_not_modified_until_a_new_analysis(client, path):
+    headers = _signup(client, f"etag{path.replace('/', '-')}@example.com")
+    client.post("/api/analyze", json={"message": "Your KYC is pending, update now"}, headers=headers)
+
+    first = client.get(path, headers=headers)
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and first.headers["cache-control"] == etag_cache.CACHE_CONTROL
+
+    again = client.get(path, headers={**headers, "If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b"" and again.headers["etag"] == etag
+    weak = client.get(path, headers={**headers, "If-None-Match": f'"other", W/{etag}'})
+    assert weak.status_code == 304
+
+    client.post("/api/analyze", json={"message": "Hi, lunch tomorrow at 1pm?"}, headers=headers)
+    changed = client.get(path, headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+
+
+def test_etag_is_per_user(client):
+    alice = _signup(client, "etag-alice@example.com")
+    bob = _signup(client, "etag-bob@example.com")
+    etag = client.get("/api/stats", headers=alice).headers["etag"]
+    assert client.get("/api/stats", headers={**bob, "If-None-Match": etag}).status_code == 200
+
+
+def test_body_cache_is_bounded_in_bytes():
+    cache = etag_cache.BodyCache(capacity=100, max_bytes=1600)
+    for i in range(20):
+        cache.put(("u", i), "e", b"x" * 100)
+    assert cache.size <= 1600 and cache.get(("u", 0), "e") is None and cache.get(("u", 19), "e")
+
+    cache.put(("u", 19), "e2", b"x" * 101)       # over max_bytes / 16: served, not cached
+    assert cache.get(("u", 19), "e2") is None and cache.size <= 1500
+
+
+def test_history_limit_is_bounded(client):
+    headers = _signup(client, "etag-limit@example.com")
+    assert client.get("/api/history?limit=100000", headers=headers).status_code == 422
+    assert client.get("/api/history?limit=100", headers=headers).status_code == 200
@@ -0,0 +1,24 @@
+"""history_export: CSV cells that look like formulas are neutralized."""
+import csv
+import io
+
+from app.utils import history_export
+from app.utils.helpers import csv_safe
+
+
+def test_csv_safe():
+    for cell in ("=HYPERLINK(\"http://x.xyz\")", "+91 98765 43210", "-2+3", "@SUM(A1)", "\tx", "\rx"):
+        assert csv_safe(cell) == "'" + cell
+    assert csv_safe("Your OTP is 1234") == "Your OTP is 1234"
+    assert csv_safe(0.75) == 0.75 and csv_safe(None) is None
+
+
+def test_exported_cells_are_escaped():
+    row = dict.fromkeys(history_export.COLUMNS, "")
+    row.update(id=1, final_score=0.9, matched_rules=["=cmd"], suspicious_phrases=[],
+               message='=HYPERLINK("http://evil.xyz","Click")')
+    text = b"".join(history_export._csv_lines(iter([row]))).decode()
+    parsed = list(csv.DictReader(io.StringIO(text)))[0]
+    assert parsed["message"] == "'=HYPERLINK(\"http://evil.xyz\",\"Click\")"
+    assert parsed["matched_rules"] == "'=cmd"
+    assert parsed["final_score"] == "0.9"
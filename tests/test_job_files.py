@@ -0,0 +1,21 @@
+"""job_files: uploaded messages round-trip to CSV results without formula injection."""
+import csv
+import io
+
+from app.utils import job_files
+
+
+def test_result_csv_escapes_formulas():
+    rows = [{"seq": 0, "message": "=1+2", "risk_level": "LOW", "final_score": 0.1, "rule_score": 0.0,
+             "ai_score": 0.1, "scam_type": "Legitimate Message", "matched_rules": [],
+             "suspicious_phrases": ["@SUM(A1)"], "error": None}]
+    text = b"".join(job_files.encode_results(rows, "csv")).decode()
+    parsed = list(csv.DictReader(io.StringIO(text)))[0]
+    assert parsed["message"] == "'=1+2"
+    assert parsed["suspicious_phrases"] == "'@SUM(A1)"
+    assert parsed["final_score"] == "0.1"
+
+
+def test_uploaded_csv_messages():
+    upload = io.BytesIO(b"id,message\n1,Your KYC is pending\n2,\n3,  Pay Rs 49 now  \n")
+    assert list(job_files.iter_messages(upload, "batch.csv")) == ["Your KYC is pending", "Pay Rs 49 now"]
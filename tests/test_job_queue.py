@@ -0,0 +1,76 @@
+"""job_queue: chunk leases, resumption after a lost worker, and attempt limits."""
+import pytest
+
+from app.services import job_queue
+
+MESSAGES = [f"message number {i}" for i in range(5)]
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "CHUNK_SIZE", 2)
+    conn = job_queue.connect(str(tmp_path / "jobs.db"))
+    yield conn
+    conn.close()
+
+
+def _results(messages):
+    return [(seq, {"risk_level": "LOW", "final_score": 0.1, "matched_rules": [], "suspicious_phrases": []})
+            for seq, _ in messages]
+
+
+def _expired_claim(conn, worker_id, monkeypatch):
+    # The worker "dies" holding the chunk: its lease is already past when claimed
+    with monkeypatch.context() as m:
+        m.setattr(job_queue, "LEASE_SECONDS", -1)
+        return job_queue.claim(conn, worker_id)
+
+
+def test_chunks_are_leased_once_and_the_job_completes(conn):
+    job_id = job_queue.submit(conn, 1, MESSAGES)
+    assert job_queue.get(conn, job_id)["chunks"] == 3
+
+    claims = [job_queue.claim(conn, f"w{i}") for i in range(3)]
+    assert [(c[0], c[1]) for c in claims] == [(job_id, 0), (job_id, 1), (job_id, 2)]
+    assert [seq for seq, _ in claims[2][2]] == [4]
+    assert job_queue.claim(conn, "w3") is None       # everything leased
+
+    for i, (_, chunk, messages) in enumerate(claims):
+        assert job_queue.complete(conn, f"w{i}", job_id, chunk, _results(messages))
+    job = job_queue.get(conn, job_id)
+    assert (job["status"], job["processed"], job["chunks_done"]) == ("done", 5, 3)
+    assert [r["seq"] for r in job_queue.iter_results(conn, job_id)] == [0, 1, 2, 3, 4]
+
+
+def test_expired_lease_resumes_on_another_worker(conn, monkeypatch):
+    job_id = job_queue.submit(conn, 1, MESSAGES)
+    lost = _expired_claim(conn, "dead", monkeypatch)
+    assert lost[1] == 0
+
+    retry = job_queue.claim(conn, "alive")
+    assert retry[:2] == (job_id, 0) and retry[2] == lost[2]
+    # The dead worker's late commit is discarded; the new lease holder's is kept
+    assert not job_queue.complete(conn, "dead", job_id, 0, _results(lost[2]))
+    assert job_queue.complete(conn, "alive", job_id, 0, _results(retry[2]))
+    assert job_queue.get(conn, job_id)["chunks_done"] == 1
+    assert job_queue.claim(conn, "alive")[1] == 1    # resumes after the committed chunk
+
+
+def test_chunk_that_keeps_expiring_fails_the_job(conn, monkeypatch):
+    monkeypatch.setattr(job_queue, "MAX_ATTEMPTS", 2)
+    job_id = job_queue.submit(conn, 1, MESSAGES)
+    for _ in range(2):
+        assert _expired_claim(conn, "w", monkeypatch)[1] == 0
+    assert job_queue.claim(conn, "w") is None
+    job = job_queue.get(conn, job_id)
+    assert job["status"] == "failed" and "chunk 0" in job["error"]
+
+
+def test_released_and_cancelled_chunks(conn):
+    job_id = job_queue.submit(conn, 1, MESSAGES)
+    _, chunk, _ = job_queue.claim(conn, "w")
+    job_queue.release(conn, "w", job_id, chunk)
+    assert job_queue.claim(conn, "w")[1] == chunk
+    assert job_queue.cancel(conn, job_id)
+    assert job_queue.claim(conn, "w") is None
+    assert not job_queue.complete(conn, "w", job_id, chunk, [])
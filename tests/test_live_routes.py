@@ -0,0 +1,40 @@
+"""/ws/analyze: a failed or rejected submit is an error frame, not a dropped connection."""
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.routes import live_routes
+from app.services import admission, analysis_pipeline
+
+
+def _client(monkeypatch) -> TestClient:
+    monkeypatch.setattr(live_routes, "_authenticated_user_id", lambda token: 1)
+    app = FastAPI()
+    app.include_router(live_routes.router)
+    return TestClient(app)
+
+
+def test_submit_failure_keeps_the_connection(monkeypatch):
+    def fail(message, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(analysis_pipeline, "analyze", fail)
+    with _client(monkeypatch).websocket_connect("/ws/analyze?token=t") as ws:
+        assert ws.receive_json() == {"type": "ready"}
+        ws.send_json({"type": "submit", "seq": 1, "text": "Your KYC is pending, update now"})
+        assert ws.receive_json() == {"type": "error", "seq": 1, "detail": "Analysis failed. Please retry."}
+        ws.send_json({"type": "bogus", "seq": 2})
+        assert ws.receive_json()["seq"] == 2
+    assert admission.stats()["in_flight"] == 0
+
+
+def test_submit_rejected_when_overloaded(monkeypatch):
+    def reject():
+        raise HTTPException(status_code=503, detail="Server is overloaded. Please retry shortly.",
+                            headers={"Retry-After": "3"})
+
+    monkeypatch.setattr(admission._controller, "admit", reject)
+    with _client(monkeypatch).websocket_connect("/ws/analyze?token=t") as ws:
+        ws.receive_json()
+        ws.send_json({"type": "submit", "seq": 5, "text": "Your KYC is pending, update now"})
+        frame = ws.receive_json()
+        assert frame["type"] == "error" and frame["retry_after"] == 3
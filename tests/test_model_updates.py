@@ -0,0 +1,85 @@
+"""model_updates: per-user feedback weights and retries of rejected windows."""
+import json
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.database import models
+from app.services import ml_model, model_updates
+
+HOLDOUT = ["Are we still meeting for lunch tomorrow?", "Your KYC is pending, click http://bit.ly/x to avoid block"]
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'updates.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    model_updates.create(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        models.User(id=1, name="User", email="u@x.com", password_hash="-", role="user"),
+        models.User(id=2, name="Other", email="o@x.com", password_hash="-", role="user"),
+        models.User(id=3, name="Admin", email="a@x.com", password_hash="-", role="admin"),
+    ])
+    session.commit()
+    holdout = (model_updates.featurize(ml_model._pipeline, HOLDOUT), np.array([0, 1]))
+    monkeypatch.setattr(model_updates, "_load_holdout", lambda pipeline: holdout)
+    monkeypatch.setattr(model_updates, "_accepted", lambda before, after: False)
+    monkeypatch.setattr(model_updates, "MAX_PER_USER", 2)
+    monkeypatch.setattr(model_updates, "MAX_RETRIES", 2)
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _feedback(db, user_id, count):
+    db.add_all([
+        models.Feedback(user_id=user_id, analysis_id=db.query(models.Feedback).count() + i + 1,
+                        message=f"Send Rs 5000 to account {i} urgently", is_scam=True)
+        for i in range(count)
+    ])
+    db.commit()
+
+
+def _applied_to(db):
+    return db.execute(text(f"SELECT value FROM {model_updates._META} WHERE key = 'applied_to'")).scalar()
+
+
+def test_each_user_weighs_at_most_the_cap_and_admins_are_exempt():
+    weights = model_updates.feedback_weights([1, 1, 1, 1, 2, 3, 3, 3], [False] * 5 + [True] * 3, cap=2)
+    assert list(weights) == [0.5, 0.5, 0.5, 0.5, 1.0, 1.0, 1.0, 1.0]
+
+
+def test_zero_weight_rows_do_not_move_the_coefficients():
+    X = np.eye(3)
+    coef = np.array([0.1, -0.2, 0.3])
+    fitted = model_updates.partial_fit(coef, np.zeros(3), X, np.array([1, 0, 1]),
+                                       sample_weight=np.array([0.0, 0.0, 1.0]))
+    assert list(fitted[:2]) == [0.1, -0.2]
+    assert fitted[2] > 0.3
+
+
+def test_one_user_alone_cannot_reach_the_minimum(db):
+    _feedback(db, 1, 10)
+    assert model_updates._attempt(db, min_feedback=3) is None      # 10 rows weigh 2
+    _feedback(db, 2, 1)
+    record = model_updates._attempt(db, min_feedback=3)
+    assert record is not None and record.examples == 11
+    assert json.loads(record.report)["window"]["effective_examples"] == 3
+
+
+def test_a_rejected_window_is_retried_with_more_feedback_then_consumed(db):
+    _feedback(db, 3, 3)
+    first = model_updates._attempt(db, min_feedback=3)
+    assert not first.published and _applied_to(db) == 0
+    assert model_updates._attempt(db, min_feedback=3) is None       # nothing new since the rejection
+
+    _feedback(db, 3, 3)
+    second = model_updates._attempt(db, min_feedback=3)
+    assert (second.feedback_from, second.examples) == (0, 6)
+    assert json.loads(second.report)["window"] == {
+        "attempt": 2, "users": 1, "effective_examples": 6, "consumed": True,
+    }
+    assert _applied_to(db) == 6                                      # MAX_RETRIES reached
@@ -0,0 +1,76 @@
+"""ngram_vectorizer: the fast transforms reproduce the fitted sklearn preprocessor exactly."""
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from app.services import ml_model, ngram_vectorizer
+from app.services.features import build_features
+
+CORPUS = [
+    "",
+    "   ",
+    "!!! ???",
+    "a",
+    "the and of to is in it",                                                  # stop words only
+    "Your KYC is pending, update now at http://bit.ly/kyc-update or account blocked",
+    "Dear customer, zxqwv blorptastic your OTP 482913 is flurbix do not share",   # OOV inside n-grams
+    "won won won prize prize lucky winner winner claim now now now",           # repeated n-grams
+    "Hi mom, I lost my phone, this is my new number 9876543210. Send 5000 urgently",
+    "Are we still meeting for lunch tomorrow at 1pm? 🍕🍕",
+    "CBI OFFICER: ARREST WARRANT ISSUED. PAY FINE IMMEDIATELY!!!",
+    "aap ka parcel courier me atka hai, 50 rupaye bhejo https://track.example.in/p?id=1",
+]
+
+
+@pytest.fixture(scope="module")
+def fast():
+    built = ngram_vectorizer.for_pipeline(ml_model._pipeline)
+    assert built is not None, "the served pipeline should be reproducible"
+    return built
+
+
+def _assert_same(actual, expected):
+    expected = expected.tocsr()
+    assert actual.shape == expected.shape
+    assert np.array_equal(actual.indptr, expected.indptr)
+    assert np.array_equal(actual.indices, expected.indices)
+    assert np.array_equal(actual.data, expected.data)
+
+
+def test_text_rows_match_tfidf_transform(fast):
+    tfidf = ml_model._pipeline.steps[0][1].named_transformers_["text"]
+    clean = [build_features(text).clean_text for text in CORPUS]
+    expected = tfidf.transform(clean)
+    expected.sort_indices()
+    _assert_same(fast.text.transform(clean), expected)
+
+
+def test_classifier_input_matches_the_preprocessor(fast):
+    features = [build_features(text) for text in CORPUS]
+    pre = ml_model._pipeline.steps[0][1]
+    expected = pre.transform(ml_model._build_batch_dataframe(features))
+    _assert_same(fast.transform(features), expected)
+
+
+def test_out_of_vocabulary_tokens_break_ngrams(fast):
+    # Every n-gram the fast path emits is one sklearn's analyzer also produced
+    clean = build_features(CORPUS[6]).clean_text
+    tfidf = ml_model._pipeline.steps[0][1].named_transformers_["text"]
+    analyzed = set(tfidf.build_analyzer()(clean))
+    emitted = {fast.text.feature_names[i] for i in fast.text.counts(clean)}
+    assert emitted == analyzed & set(tfidf.vocabulary_)
+
+
+@pytest.mark.parametrize("options", [
+    {"stop_words": "english", "ngram_range": (1, 3), "sublinear_tf": True},
+    {"stop_words": ["your", "is", "now"], "ngram_range": (2, 3), "norm": None},
+    {"stop_words": "english", "ngram_range": (1, 2), "use_idf": False},
+])
+def test_stop_words_and_ngram_ranges_match_sklearn(options):
+    clean = [build_features(text).clean_text for text in CORPUS]
+    tfidf = TfidfVectorizer(**options).fit(clean[5:])
+    fast = ngram_vectorizer.NgramVectorizer(tfidf)
+    held_out = clean + ["zzz unseen tokens the kyc pending update now otp share"]
+    expected = tfidf.transform(held_out)
+    expected.sort_indices()
+    _assert_same(fast.transform(held_out), expected)
@@ -0,0 +1,29 @@
+"""reputation: blocklists load on first lookup, without a startup hook."""
+import threading
+
+from app.services import reputation
+
+
+def test_lookup_loads_lists_on_first_use(tmp_path, monkeypatch):
+    (tmp_path / "domains.txt").write_text("sbi-kyc-update.co\n")
+    (tmp_path / "phones.txt").write_text("+91 98765 43210  # mule\n")
+    monkeypatch.setattr(reputation, "_store", reputation.ReputationStore(str(tmp_path)))
+    monkeypatch.setattr(reputation, "_reloader", threading.Thread(target=lambda: None))
+
+    hits = reputation.lookup({"domains": ["www.sbi-kyc-update.co", "amazon.in"], "phones": ["9876543210"]})
+    assert hits == [{"type": "domain", "value": "www.sbi-kyc-update.co"},
+                    {"type": "phone", "value": "9876543210"}]
+    assert reputation.sizes() == {"domains": 1, "phones": 1, "upi": 0}
+
+
+def test_listed_domain_matches_its_subdomains(tmp_path):
+    (tmp_path / "domains.txt").write_text("sbi-kyc-update.co\nphish.co.in\n")
+    store = reputation.ReputationStore(str(tmp_path))
+    store.reload()
+
+    assert store.is_listed("domains", "login.sbi-kyc-update.co")
+    assert store.is_listed("domains", "a.b.secure.sbi-kyc-update.co")
+    assert store.is_listed("domains", "netbanking.phish.co.in")
+    assert not store.is_listed("domains", "sbi-kyc-update.com")
+    assert not store.is_listed("domains", "other.co.in")          # the suffix itself is not a parent
+    assert not store.is_listed("domains", "notsbi-kyc-update.co")
@@ -0,0 +1,47 @@
+"""search_index.backfill: every analysis older than the index indexed exactly once."""
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.database import search_index
+from app.database.db import Base
+
+
+def _database(tmp_path, analyses: int):
+    engine = create_engine(f"sqlite:///{tmp_path / 'search.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO analyzed_messages (id, user_id, message) VALUES (:id, 1, :message)"),
+            [{"id": i, "message": f"message number {i}"} for i in range(1, analyses + 1)],
+        )
+    assert search_index.create(engine)
+    return engine, sessionmaker(bind=engine)
+
+
+def _indexed(db, q: str) -> int:
+    return db.execute(
+        text("SELECT COUNT(*) FROM message_search WHERE message_search MATCH :q"), {"q": q}
+    ).scalar()
+
+
+def test_last_short_batch_does_not_overlap(tmp_path):
+    # backfill_until = 2500 with batches of 1000: (0, 1000], (1000, 2000], (2000, 2500]
+    engine, Session = _database(tmp_path, 2500)
+    with Session() as db:
+        assert search_index.backfill(db, batch_size=1000) == 2500
+        assert _indexed(db, "body : message") == 2500
+        assert _indexed(db, 'body : "number 1750"') == 1
+        assert db.execute(text(
+            "SELECT value FROM message_search_meta WHERE key = 'backfilled_to'"
+        )).scalar() == 2500
+
+
+def test_rerun_and_rows_after_the_index_are_left_alone(tmp_path):
+    engine, Session = _database(tmp_path, 30)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO analyzed_messages (id, user_id, message) VALUES (31, 1, 'newer')"))
+    with Session() as db:
+        assert search_index.backfill(db, batch_size=7) == 30
+        assert search_index.backfill(db, batch_size=7) == 0
+        assert _indexed(db, "body : message") == 30
+        assert _indexed(db, "body : newer") == 0
@@ -0,0 +1,46 @@
+"""shadow: the candidate is compared with the primary model's own score, at a bounded rate."""
+import asyncio
+import time
+
+from app.services import analysis_pipeline, campaign_index, ml_model, shadow
+
+MESSAGES = [
+    "Your KYC is pending. Update immediately at http://sbi-kyc-update.xyz/verify",
+    "Hi, are we still meeting for lunch tomorrow at 1pm?",
+    "Your courier parcel is held at customs. Pay Rs 49 at bit.ly/parcel-fee",
+]
+
+
+def _wait_for(scorer, scored: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while scorer.summary()["scored"] < scored and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+def test_served_score_is_reused_and_scoring_is_paced(tmp_path, monkeypatch):
+    # The serving model as its own candidate: deltas are only the served score's rounding
+    scorer = shadow.ShadowScorer(ml_model.MODEL_PATH, str(tmp_path / "shadow.db"), 1.0, 10, max_per_second=10)
+    monkeypatch.setattr(shadow, "_scorer", scorer)
+    results = [analysis_pipeline.analyze(m) for m in MESSAGES]
+
+    start = time.monotonic()
+    scorer.start()
+    for message, result in zip(MESSAGES, results):
+        asyncio.run(shadow.enqueue(message, result))
+    _wait_for(scorer, len(MESSAGES))
+    report = shadow.summary()
+
+    assert time.monotonic() - start >= (len(MESSAGES) - 1) / 10
+    assert report["scored"] == report["enqueued"] == report["compared"] == len(MESSAGES)
+    assert report["mean_abs_delta"] < 1e-4
+    assert report["risk_disagreement_rate"] == 0
+    assert report["latency_ms"]["primary"]["p50"] > 0 and report["latency_ms"]["candidate"]["p50"] > 0
+
+
+def test_only_the_primary_models_own_scores_are_compared(monkeypatch):
+    monkeypatch.setattr(campaign_index, "_index", campaign_index.CampaignIndex())
+    result = analysis_pipeline.analyze(MESSAGES[0])
+    assert shadow.comparable(result)
+    assert not shadow.comparable({**result, "campaign_id": "cmp-0123456789ab"})
+    assert not shadow.comparable({**result, "ml": {**result["ml"], "cached": True}})
+    assert not shadow.comparable({**result, "degradation": "rules_only"})
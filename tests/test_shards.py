@@ -0,0 +1,76 @@
+"""shards: user routing and per-shard analysis id allocation."""
+import threading
+
+from sqlalchemy import text
+
+from app.database import shards
+from app.database.db import Base, engine as main_engine
+
+
+def _prepared(shard: int) -> None:
+    Base.metadata.create_all(bind=main_engine)
+    shards.prepare(shard)
+
+
+def _allocate(shard: int) -> int:
+    db = shards.session(shard)
+    try:
+        analysis_id = shards.allocate_id(db, shard)
+        db.commit()
+        return analysis_id
+    finally:
+        db.close()
+
+
+def test_users_route_to_a_stable_shard():
+    assert [shards.shard_of(u, 4) for u in (1, 2, 3, 42)] == [shards.shard_of(u, 4) for u in (1, 2, 3, 42)]
+    assert {shards.shard_of(u, 4) for u in range(200)} == {0, 1, 2, 3}
+    assert shards.shard_url(2).endswith(".shard2.db")
+
+
+def test_ids_come_from_the_shard_range_and_never_repeat():
+    _prepared(3)
+    low = 3 * shards.ID_SPAN
+    first = _allocate(3)
+    assert low < first < low + shards.ID_SPAN
+    assert _allocate(3) == first + 1
+
+    # A row already stored higher in the range (e.g. moved by reshard.py) is stepped over
+    with shards.engine(3).begin() as conn:
+        conn.execute(text("INSERT INTO analyzed_messages (id, user_id, message) VALUES (:id, 1, 'x')"),
+                     {"id": first + 10})
+    assert _allocate(3) == first + 11
+
+    # Deleting the newest rows never makes the counter move backwards
+    with shards.engine(3).begin() as conn:
+        conn.execute(text("DELETE FROM analyzed_messages"))
+    shards.prepare(3)
+    assert _allocate(3) == first + 12
+
+
+def test_concurrent_allocations_are_unique():
+    _prepared(5)
+    allocated, lock = [], threading.Lock()
+
+    def worker():
+        for _ in range(20):
+            analysis_id = _allocate(5)
+            with lock:
+                allocated.append(analysis_id)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(allocated)) == 80
+    assert all(5 * shards.ID_SPAN < i <= 6 * shards.ID_SPAN for i in allocated)
+
+
+def test_shard_zero_starts_above_existing_ids():
+    _prepared(0)
+    with main_engine.begin() as conn:
+        existing = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM analyzed_messages")).scalar()
+        conn.execute(text("INSERT INTO analyzed_messages (id, user_id, message) VALUES (:id, 1, 'x')"),
+                     {"id": existing + 100})
+    assert _allocate(0) == existing + 101
@@ -0,0 +1,82 @@
+"""thread_scoring: thread state shared between workers through THREAD_DB_PATH."""
+import pytest
+
+from app.services import ml_model, thread_scoring
+
+MESSAGES = [
+    "Hi, this is Blue Dart courier regarding your parcel.",
+    "Your parcel is held at customs. Pay Rs 49 fee to release it.",
+    "Pay now at http://bluedart-release.xyz/pay or it will be returned. Share the OTP you receive.",
+]
+
+
+def _stores(tmp_path):
+    path = str(tmp_path / "threads.db")
+    return thread_scoring.ThreadStore(path), thread_scoring.ThreadStore(path)
+
+
+def test_appends_on_any_worker_continue_the_thread(tmp_path):
+    worker_a, worker_b = _stores(tmp_path)
+    thread_id = worker_a.create(7).thread_id
+
+    reference = thread_scoring.ThreadState(7)
+    for i, message in enumerate(MESSAGES):
+        point = (worker_a if i % 2 else worker_b).append(thread_id, 7, message)
+        expected = reference.append(message)
+        assert point["cumulative"]["ai_score"] == expected["cumulative"]["ai_score"]
+        assert point["cumulative"]["matched_rules"] == expected["cumulative"]["matched_rules"]
+
+    state = worker_a.get(thread_id, 7)
+    assert [p["index"] for p in state.trajectory] == [0, 1, 2]
+    assert worker_b.get(thread_id, 8) is None
+    assert worker_b.append(thread_id, 8, "hello") is None
+
+
+def test_thread_rebuilt_after_model_swap(tmp_path, monkeypatch):
+    store, _ = _stores(tmp_path)
+    thread_id = store.create(1).thread_id
+    store.append(thread_id, 1, MESSAGES[0])
+    store.append(thread_id, 1, MESSAGES[1])
+
+    monkeypatch.setattr(ml_model, "MODEL_VERSION", "swapped")
+    rebuilt = store.get(thread_id, 1)
+    fresh = thread_scoring.ThreadState(1)
+    fresh.append(MESSAGES[0])
+    fresh.append(MESSAGES[1])
+    assert rebuilt.vector.counts == fresh.vector.counts
+    assert rebuilt.vector.sq_norm == pytest.approx(fresh.vector.sq_norm)
+
+
+def test_full_and_deleted_threads(tmp_path, monkeypatch):
+    monkeypatch.setattr(thread_scoring, "MAX_MESSAGES", 1)
+    store, other = _stores(tmp_path)
+    thread_id = store.create(1).thread_id
+    store.append(thread_id, 1, MESSAGES[0])
+    with pytest.raises(thread_scoring.ThreadFullError):
+        other.append(thread_id, 1, MESSAGES[1])
+    assert other.delete(thread_id, 1)
+    assert store.get(thread_id, 1) is None
+
+
+def test_append_reads_only_the_aggregates_and_touched_counts(tmp_path):
+    store, _ = _stores(tmp_path)
+    thread_id = store.create(1).thread_id
+    for message in MESSAGES[:2]:
+        store.append(thread_id, 1, message)
+
+    statements = []
+    store.connection().set_trace_callback(statements.append)
+    store.append(thread_id, 1, MESSAGES[2])
+    store.connection().set_trace_callback(None)
+    reads = [sql for sql in statements if sql.lstrip().upper().startswith("SELECT")]
+    assert not any("thread_messages" in sql for sql in reads)
+    assert all("idx IN" in sql for sql in reads if "thread_counts" in sql)
+
+    fresh = thread_scoring.ThreadState(1)
+    for message in MESSAGES:
+        fresh.append(message)
+    stored = dict(store.connection().execute(
+        "SELECT idx, count FROM thread_counts WHERE thread_id = ?", (thread_id,)
+    ).fetchall())
+    assert stored == fresh.vector.counts
+    assert store.get(thread_id, 1).trajectory == fresh.trajectory
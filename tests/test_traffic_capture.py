@@ -0,0 +1,48 @@
+"""traffic_capture: PII masking of captured messages."""
+import pytest
+
+from app.services import traffic_capture
+from app.services.traffic_capture import mask
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("call 9876543210 now", "call 0000000000 now"),
+    ("call 98765 43210 now", "call 00000 00000 now"),
+    ("call 987-654-3210 now", "call 000-000-0000 now"),
+    ("call 09876543210 now", "call 00000000000 now"),
+    ("call +91 98765 43210 now", "call +00 00000 00000 now"),
+    ("call +91-9876543210 now", "call +00-0000000000 now"),
+    ("call 919876543210 now", "call 000000000000 now"),
+])
+def test_phone_numbers_in_common_formats(text, expected):
+    assert mask(text, ["phone"]) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("a/c 123456789 debited", "a/c 000000000 debited"),
+    ("a/c 12345678901234567890123 debited", "a/c 00000000000000000000000 debited"),
+    ("ref 1234 5678 9012 3456 7890", "ref 0000 0000 0000 0000 0000"),
+])
+def test_long_account_numbers(text, expected):
+    assert mask(text, ["account"]) == expected
+
+
+def test_default_mask_covers_every_number_of_nine_digits_or_more():
+    text = ("Hi, I am Ravi. Pay Rs 5000 to a/c 501002345678901234567 IFSC HDFC0001234, "
+            "UPI ravi.k@okaxis, card 4111 1111 1111 1111, aadhaar 2345 6789 0123, "
+            "call 98765 43210 or 09876543210, mail ravi.kumar@example.com, OTP 482913")
+    masked = mask(text, traffic_capture.MASK)
+    assert masked == ("Hi, I am Ravi. Pay Rs 5000 to a/c 000000000000000000000 IFSC HDFC0001234, "
+                      "UPI xxxx.x@okaxis, card 0000 0000 0000 0000, aadhaar 0000 0000 0000, "
+                      "call 00000 00000 or 00000000000, mail xxxx.xxxxx@example.com, OTP 482913")
+    assert len(masked) == len(text)
+
+
+def test_short_numbers_and_words_need_digits():
+    text = "Rs 5000, OTP 482913, PIN 1234, order 2024"
+    assert mask(text, traffic_capture.MASK) == text
+    assert mask(text, traffic_capture.MASK + ["digits"]) == "Rs 0000, OTP 000000, PIN 0000, order 0000"
+
+
+def test_urls_keep_their_host():
+    assert mask("see https://bit.ly/AbC9?x=1 now", ["url"]) == "see https://bit.ly/XxX0?x=0 now"
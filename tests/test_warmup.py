@@ -0,0 +1,54 @@
+"""warmup: a failing warm-up keeps the worker not-ready; a retry can recover it."""
+import pytest
+
+from app.services import analysis_pipeline, warmup
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(warmup, "_state", dict(warmup._state, ready=False, failed=False, attempts=0, error=None))
+    monkeypatch.setattr(warmup, "RETRY_SECONDS", 0)
+    monkeypatch.setattr(warmup, "ATTEMPTS", 2)
+
+
+def test_failed_warmup_stays_not_ready(monkeypatch):
+    def broken(message, live):
+        raise RuntimeError("model artifact is corrupt")
+
+    monkeypatch.setattr(warmup, "_analyze_once", broken)
+    warmup.run(rounds=1)
+    state = warmup.status()
+    assert not warmup.is_ready()
+    assert state["failed"] and state["attempts"] == 2
+    assert state["error"] == "model artifact is corrupt"
+
+
+def test_retry_recovers(monkeypatch):
+    calls = []
+    real = warmup._analyze_once
+
+    def flaky(message, live):
+        calls.append(message)
+        if len(calls) == 1:
+            raise RuntimeError("transient")
+        real(message, live)
+
+    monkeypatch.setattr(warmup, "_analyze_once", flaky)
+    warmup.run(rounds=1)
+    state = warmup.status()
+    assert warmup.is_ready() and not state["failed"]
+    assert state["attempts"] == 2 and state["error"] is None
+
+
+def test_warmup_runs_the_analyze_chain(monkeypatch):
+    tiers = []
+    real = analysis_pipeline.analyze
+
+    def recording(message, features=None, tier="none", explain=True):
+        tiers.append(tier)
+        return real(message, features, tier, explain)
+
+    monkeypatch.setattr(analysis_pipeline, "analyze", recording)
+    warmup.run(rounds=1)
+    assert warmup.is_ready()
+    assert tiers.count("none") == tiers.count("rules_only") == len(warmup.WARMUP_MESSAGES)